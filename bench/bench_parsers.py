@@ -0,0 +1,114 @@
+"""
+Сравнение HTML-бэкендов экстракторов (bs4 vs lxml) на корпусе сохранённых страниц.
+
+    python -m bench.bench_parsers saved_pages/ --repeat 3
+    python -m bench.bench_parsers          # только встроенные крайние случаи (PARITY_PAGES)
+
+Каждый *.html / *.htm в каталоге прогоняется через разбор и все экстракторы
+(ссылки, карточки команды, mailto, дата публикации, футер, текст); печатается время
+по операциям, ускорение относительно bs4 и число страниц с расхождением результатов.
+К корпусу всегда добавляются PARITY_PAGES — на их расхождении скрипт падает (exit 1).
+"""
+import argparse
+import pathlib
+import time
+
+from src.parsing_helpers import PARSER_BACKENDS, parse_page
+from src.enrich_lite import (
+    discover_candidate_urls, count_team_cards, extract_emails,
+    extract_published_date, extract_footer_location,
+)
+
+BASE_URL = "https://example.com/"
+
+OPS = {
+    "parse": None,
+    "links": lambda page: discover_candidate_urls(BASE_URL, page),
+    "team": count_team_cards,
+    "emails": lambda page: sorted(extract_emails(page)),
+    "meta_date": extract_published_date,
+    "footer": extract_footer_location,
+    "text": lambda page: page.text(),
+}
+
+# крайние случаи, на которых бэкенды уже расходились
+PARITY_PAGES = [
+    ("parity:template-subtree",
+     "<html><body><p>CEO team</p><template><p>t@example.com</p><div>hidden <b>deep</b></div></template>"
+     " after <a href='mailto:ceo@example.com'>ceo@example.com</a></body></html>"),
+    ("parity:script-style-tail",
+     "<html><body><script>var a = 'x@example.com';</script>tail one<style>p{}</style> tail two"
+     "<footer>Made in Berlin, Germany</footer></body></html>"),
+]
+
+
+def load_corpus(path: str) -> list[tuple[str, str]]:
+    out = []
+    for p in sorted(pathlib.Path(path).rglob("*")):
+        if p.suffix.lower() in (".html", ".htm") and p.is_file():
+            out.append((p.name, p.read_text(encoding="utf-8", errors="replace")))
+    return out
+
+
+def run_backend(backend: str, corpus: list[tuple[str, str]], repeat: int):
+    timings = {op: 0.0 for op in OPS}
+    results: dict[str, dict[str, object]] = {}
+    for _ in range(repeat):
+        for name, html in corpus:
+            t0 = time.perf_counter()
+            page = parse_page(html, backend)
+            timings["parse"] += time.perf_counter() - t0
+            res = {}
+            for op, fn in OPS.items():
+                if fn is None: continue
+                t0 = time.perf_counter()
+                res[op] = fn(page)
+                timings[op] += time.perf_counter() - t0
+            results[name] = res
+    return timings, results
+
+
+def main(pages: str | None, repeat: int):
+    corpus = load_corpus(pages) if pages else []
+    if pages and not corpus:
+        raise SystemExit(f"Нет *.html в {pages}")
+    corpus += PARITY_PAGES
+    total_kb = sum(len(h.encode("utf-8")) for _, h in corpus) / 1024
+    print(f"Корпус: {len(corpus)} страниц, {total_kb:.0f} KiB, повторов: {repeat}")
+
+    by_backend = {b: run_backend(b, corpus, repeat) for b in PARSER_BACKENDS}
+    ref_t, ref_res = by_backend["bs4"]
+
+    print(f"\n{'op':<10}" + "".join(f"{b + ' ms':>12}" for b in PARSER_BACKENDS) + f"{'speedup':>10}")
+    for op in list(OPS) + ["total"]:
+        row = f"{op:<10}"
+        for b in PARSER_BACKENDS:
+            t = by_backend[b][0]
+            v = sum(t.values()) if op == "total" else t[op]
+            row += f"{v * 1000:>12.1f}"
+        ref = sum(ref_t.values()) if op == "total" else ref_t[op]
+        fast = sum(by_backend["lxml"][0].values()) if op == "total" else by_backend["lxml"][0][op]
+        row += f"{(ref / fast if fast else 0):>9.1f}x"
+        print(row)
+
+    failed = False
+    for b in PARSER_BACKENDS:
+        if b == "bs4": continue
+        res = by_backend[b][1]
+        diff = [n for n in ref_res if ref_res[n] != res.get(n)]
+        print(f"\n{b}: расхождений с bs4 — {len(diff)}" + (f" (напр. {diff[:5]})" if diff else ""))
+        for name, _ in PARITY_PAGES:
+            if ref_res[name] != res[name]:
+                ops = [op for op in ref_res[name] if ref_res[name][op] != res[name][op]]
+                print(f"  {name}: " + "; ".join(f"{op}: bs4={ref_res[name][op]!r} {b}={res[name][op]!r}" for op in ops))
+                failed = True
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Benchmark bs4 vs lxml extractor backends on saved pages")
+    ap.add_argument("pages", nargs="?", help="каталог с сохранёнными *.html (без него — только PARITY_PAGES)")
+    ap.add_argument("--repeat", type=int, default=3)
+    args = ap.parse_args()
+    main(args.pages, args.repeat)
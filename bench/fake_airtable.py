@@ -0,0 +1,246 @@
+"""
+Локальная замена Airtable REST API для бенчмарков.
+
+Поддерживает то, чем пользуются скрипты из src/:
+  GET    /v0/{base}/{table}            — страницы по pageSize (<=100) и offset, fields[] проекция
+  POST   /v0/{base}/{table}            — создание, не больше 10 записей за запрос
+  PATCH  /v0/{base}/{table}            — обновление, не больше 10 записей, 422 UNKNOWN_FIELD_NAME
+  DELETE /v0/{base}/{table}?records[]= — удаление, не больше 10 id
+  GET    /v0/meta/bases/{base}/tables  — схема (опции drawdown_solutions)
+
+Плюс инъекция 429 (случайная доля и/или лимит req/s на базу, как у Airtable) и
+искусственная задержка ответа. Считает запросы и байты по методам.
+
+    python -m bench.fake_airtable --port 8787 --records 1000 --latency-ms 20 --rate-429 0.01
+"""
+import argparse
+import json
+import random
+import threading
+import time
+import urllib.parse
+from collections import Counter, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from bench import fixtures
+
+PAGE_SIZE = 100
+MAX_BATCH = 10
+
+
+class FakeAirtable:
+    def __init__(self, latency_ms: float = 0, rate_429: float = 0.0, rps_limit: float = 0, seed: int = 0):
+        self.latency = latency_ms / 1000.0
+        self.rate_429 = rate_429
+        self.rps_limit = rps_limit
+        self.rnd = random.Random(seed)
+        self.lock = threading.Lock()
+        self.tables: dict[str, dict[str, dict]] = {}
+        self.known_fields: dict[str, set[str]] = {}
+        self._order: dict[str, list[str]] = {}   # кэш порядка id для постраничного GET
+        self.meta = fixtures.schema()
+        self.next_id = 0
+        self.recent: deque[float] = deque()
+        self.stats = Counter()
+        self.server: ThreadingHTTPServer | None = None
+
+    # ---------------- данные ----------------
+    def load(self, table: str, records: list[dict], known_fields: list[str] | None = None):
+        with self.lock:
+            t = {}
+            for rec in records:
+                rid = rec.get("id") or self._new_id()
+                t[rid] = {"id": rid, "createdTime": "2024-01-01T00:00:00.000Z", "fields": dict(rec.get("fields", {}))}
+            self.tables[table] = t
+            self._order.pop(table, None)
+            if known_fields:
+                self.known_fields[table] = set(known_fields)
+
+    def _new_id(self) -> str:
+        self.next_id += 1
+        return f"rec{self.next_id:014d}"
+
+    def ids(self, table: str) -> list[str]:
+        """Под self.lock. Порядок вставки, как у Airtable без sort."""
+        if table not in self._order:
+            self._order[table] = list(self.tables[table])
+        return self._order[table]
+
+    def reset_stats(self):
+        with self.lock:
+            self.stats = Counter()
+
+    # ---------------- сервер ----------------
+    def start(self, host: str = "127.0.0.1", port: int = 0) -> int:
+        fake = self
+
+        class Handler(_Handler):
+            airtable = fake
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self.server.server_address[1]
+
+    def stop(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+
+    def throttled(self) -> bool:
+        now = time.monotonic()
+        with self.lock:
+            if self.rate_429 and self.rnd.random() < self.rate_429:
+                return True
+            if self.rps_limit:
+                while self.recent and now - self.recent[0] > 1.0:
+                    self.recent.popleft()
+                if len(self.recent) >= self.rps_limit:
+                    return True
+                self.recent.append(now)
+        return False
+
+
+class _Handler(BaseHTTPRequestHandler):
+    airtable: FakeAirtable
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, code: int, obj: dict):
+        body = json.dumps(obj).encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        with self.airtable.lock:
+            self.airtable.stats["bytes_out"] += len(body)
+            self.airtable.stats[f"status_{code}"] += 1
+
+    def _body(self) -> dict:
+        n = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(n) if n else b""
+        with self.airtable.lock:
+            self.airtable.stats["bytes_in"] += n
+        return json.loads(raw) if raw else {}
+
+    def _route(self, method: str):
+        at = self.airtable
+        u = urllib.parse.urlsplit(self.path)
+        qs = urllib.parse.parse_qs(u.query)
+        parts = [urllib.parse.unquote(p) for p in u.path.strip("/").split("/")]
+        body = self._body() if method in ("POST", "PATCH") else {}
+        with at.lock:
+            at.stats["requests"] += 1
+            at.stats[f"requests_{method}"] += 1
+        if at.latency:
+            time.sleep(at.latency)
+        if at.throttled():
+            return self._send(429, {"errors": [{"error": "RATE_LIMIT_REACHED"}]})
+        if self.headers.get("Authorization", "").strip() in ("", "Bearer"):
+            return self._send(401, {"error": {"type": "AUTHENTICATION_REQUIRED"}})
+
+        if len(parts) == 5 and parts[1] == "meta" and method == "GET":
+            return self._send(200, at.meta)
+        if len(parts) != 3:
+            return self._send(404, {"error": "NOT_FOUND"})
+        table = parts[2]
+        if table not in at.tables:
+            return self._send(404, {"error": {"type": "TABLE_NOT_FOUND"}})
+        return getattr(self, f"_do_{method.lower()}")(table, qs, body)
+
+    def _do_get(self, table, qs, body):
+        at = self.airtable
+        size = min(int((qs.get("pageSize") or [PAGE_SIZE])[0]), PAGE_SIZE)
+        start = int((qs.get("offset") or ["0"])[0].split("/")[0] or 0)
+        fields = qs.get("fields[]")
+        with at.lock:
+            t = at.tables[table]
+            ids = at.ids(table)
+            recs = [t[rid] for rid in ids[start:start + size] if rid in t]
+            total = len(ids)
+            if fields:
+                recs = [{**r, "fields": {k: v for k, v in r["fields"].items() if k in fields}} for r in recs]
+            else:
+                recs = [{**r, "fields": dict(r["fields"])} for r in recs]
+        out = {"records": recs}
+        if start + size < total:
+            out["offset"] = f"{start + size}/itr"
+        return self._send(200, out)
+
+    def _check_batch(self, table, recs):
+        if len(recs) > MAX_BATCH:
+            return {"error": {"type": "INVALID_RECORDS", "message": f"Too many records: {len(recs)} > {MAX_BATCH}"}}
+        known = self.airtable.known_fields.get(table)
+        if known:
+            for r in recs:
+                for k in (r.get("fields") or {}):
+                    if k not in known:
+                        return {"error": {"type": "UNKNOWN_FIELD_NAME", "message": f'Unknown field name: "{k}"'}}
+        return None
+
+    def _do_post(self, table, qs, body):
+        recs = body.get("records") or []
+        err = self._check_batch(table, recs)
+        if err: return self._send(422, err)
+        out = []
+        with self.airtable.lock:
+            for r in recs:
+                rid = self.airtable._new_id()
+                rec = {"id": rid, "createdTime": "2024-01-01T00:00:00.000Z", "fields": dict(r.get("fields") or {})}
+                self.airtable.tables[table][rid] = rec
+                out.append(rec)
+            self.airtable._order.pop(table, None)
+        return self._send(200, {"records": out})
+
+    def _do_patch(self, table, qs, body):
+        recs = body.get("records") or []
+        err = self._check_batch(table, recs)
+        if err: return self._send(422, err)
+        out = []
+        with self.airtable.lock:
+            t = self.airtable.tables[table]
+            for r in recs:
+                if r.get("id") not in t:
+                    return self._send(422, {"error": {"type": "ROW_DOES_NOT_EXIST", "message": r.get("id")}})
+            for r in recs:
+                t[r["id"]]["fields"].update(r.get("fields") or {})
+                out.append({**t[r["id"]], "fields": dict(t[r["id"]]["fields"])})
+            self.airtable.stats["records_patched"] += len(recs)
+        return self._send(200, {"records": out})
+
+    def _do_delete(self, table, qs, body):
+        ids = qs.get("records[]") or []
+        if len(ids) > MAX_BATCH:
+            return self._send(422, {"error": {"type": "INVALID_RECORDS"}})
+        with self.airtable.lock:
+            for rid in ids:
+                self.airtable.tables[table].pop(rid, None)
+            self.airtable._order.pop(table, None)
+        return self._send(200, {"records": [{"id": rid, "deleted": True} for rid in ids]})
+
+    def do_GET(self): self._route("GET")
+    def do_POST(self): self._route("POST")
+    def do_PATCH(self): self._route("PATCH")
+    def do_DELETE(self): self._route("DELETE")
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Local Airtable stand-in for benchmarks")
+    ap.add_argument("--port", type=int, default=8787)
+    ap.add_argument("--records", type=int, default=1000, help="размер таблицы A (B — столько же)")
+    ap.add_argument("--latency-ms", type=float, default=0)
+    ap.add_argument("--rate-429", type=float, default=0.0, help="доля запросов, получающих 429")
+    ap.add_argument("--rps-limit", type=float, default=0, help="лимит запросов/сек (как 5 rps у Airtable)")
+    args = ap.parse_args()
+    fa = FakeAirtable(args.latency_ms, args.rate_429, args.rps_limit)
+    fa.load("tblA", fixtures.table_a(args.records), fixtures.FIELDS_A)
+    fa.load("tblB", fixtures.table_b(args.records), fixtures.FIELDS_B)
+    port = fa.start(port=args.port)
+    print(f"Fake Airtable on http://127.0.0.1:{port}/v0 (base: any, tables: tblA, tblB)")
+    try:
+        while True: time.sleep(3600)
+    except KeyboardInterrupt:
+        fa.stop()
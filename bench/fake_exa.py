@@ -0,0 +1,158 @@
+"""
+Локальная замена клиента Exa (exa_py.Exa) для src/enrich_exa.py: тот же вызов
+search_and_contents, ответы детерминированно строятся из фикстурных компаний,
+искусственная задержка и счётчик «платных» запросов.
+
+Бенчмарк: наивный путь (как test.py — по запросу на запись, без кеша, по очереди)
+против ExaSource (дедупликация, дисковый кеш, параллельно под лимитом).
+
+    python -m bench.fake_exa --companies 200 --dup-ratio 0.2 --latency-ms 300 --rps 10 --workers 8
+
+Проверка поведения (без замеров, падает на первом расхождении):
+
+    python -m bench.fake_exa --check
+"""
+import argparse
+import os
+import re
+import tempfile
+import threading
+import time
+from types import SimpleNamespace
+
+from bench import fixtures
+
+DOMAIN_RE = re.compile(r"benchco(\d{6})\.com")
+
+
+class FakeExa:
+    def __init__(self, latency_ms: float = 0, seed: int = 0, empty_ratio: float = 0.2):
+        self.latency = latency_ms / 1000.0
+        self.seed = seed
+        self.empty_ratio = empty_ratio
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def search_and_contents(self, query: str, **kw):
+        with self.lock:
+            self.calls += 1
+        if self.latency: time.sleep(self.latency)
+        m = DOMAIN_RE.search(query)
+        if not m:
+            return SimpleNamespace(results=[])
+        c = fixtures.company(int(m.group(1)), self.seed)
+        # чужая компания в выдаче — enrich_exa.relevant должен её отбросить
+        other = fixtures.company(c["i"] + 1, self.seed)
+        results = [SimpleNamespace(url=f"https://news.example.com/{other['domain']}", title=other["name"],
+                                   text=f"{other['name']} is headquartered in Oslo, Norway and has 5000 employees.")]
+        if c["roll"] >= self.empty_ratio:
+            results.append(SimpleNamespace(
+                url=f"https://{c['domain']}/about", title=c["name"],
+                text=(f"{c['name']} is a {c['vertical'].lower()} startup headquartered in {c['city']}, {c['country']}. "
+                      f"The company has {c['employees']} employees. "
+                      f"Last year it raised {c['funding']} in a Series A round led by climate investors.")))
+        return SimpleNamespace(results=results[:kw.get("num_results", 3)])
+
+
+def bench_queries(n: int, dup_ratio: float, seed: int = 0) -> list[tuple[str, str]]:
+    """(имя, сайт) для n записей; доля dup_ratio — повторы уже встреченных компаний (дубли в A)."""
+    out = []
+    for i in range(n):
+        j = i if i < 1 or (i * 7919 % 100) >= dup_ratio * 100 else (i * 31) % i
+        c = fixtures.company(j, seed)
+        out.append((c["name"], f"https://www.{c['domain']}/"))
+    return out
+
+
+def check(seed: int = 0):
+    """Нормализация и дедуп запросов, кеш (в т.ч. пустых ответов), фильтр relevant, отбор is_target."""
+    from src import enrich_exa as exa
+    from src import enrich_lite as site
+
+    c = fixtures.company(1, seed)
+    q = exa.normalize_query(c["name"], f"https://www.{c['domain']}/")
+    assert q == exa.normalize_query(f"  {c['name'].upper()}  ", c["domain"]) == f"{c['name'].lower()} {c['domain']}", q
+    assert exa.normalize_query(c["name"]) == c["name"].lower()
+
+    # relevant: чужая компания из выдачи отбрасывается, своя (по домену) остаётся
+    fake = FakeExa(seed=seed, empty_ratio=0)
+    results = exa.result_dicts(fake.search_and_contents(q, num_results=3))
+    f = {site.FIELD_COMPANY: c["name"], site.FIELD_WEBSITE: c["domain"]}
+    rel = exa.relevant(results, f)
+    assert len(results) == 2 and [r["url"] for r in rel] == [f"https://{c['domain']}/about"], rel
+    found = exa.extract_from_results(rel)
+    assert found[site.FIELD_LOC] == f"{c['city']}, {c['country']}", found
+    # по имени (без сайта) — тоже только своя
+    assert [r["url"] for r in exa.relevant(results, {site.FIELD_COMPANY: c["name"]})] == [f"https://{c['domain']}/about"]
+
+    with tempfile.TemporaryDirectory(prefix="exa_check_") as tmp:
+        cache = exa.ExaCache(os.path.join(tmp, "exa_cache.sqlite"))
+        fake = FakeExa(seed=seed)
+        src = exa.ExaSource(fake, cache, rps=0, workers=4)
+        nodomain = "nobody at all"          # FakeExa отвечает пустой выдачей
+        answers = src.lookup([q, exa.normalize_query(c["name"].upper(), c["domain"]), nodomain, q, ""])
+        assert fake.calls == 2 and src.calls == 2, (fake.calls, src.calls)   # дубли и пустой запрос не платят
+        assert answers[nodomain] == [] and cache.get(nodomain) == []
+        src2 = exa.ExaSource(fake, cache, rps=0)
+        assert src2.lookup([q, nodomain]).keys() == {q, nodomain}
+        assert fake.calls == 2 and src2.cache_hits == 2   # пустой ответ тоже из кеша
+
+        # enrich_records: две записи одной компании — один запрос, обе получают патч
+        recs = [{"id": "rec1", "fields": dict(f)}, {"id": "rec2", "fields": {**f, site.FIELD_WEBSITE: f"https://{c['domain']}"}}]
+        fake = FakeExa(seed=seed, empty_ratio=0)
+        src3 = exa.ExaSource(fake, None, rps=0)
+        hits = exa.enrich_records(recs, src3)
+        assert fake.calls == 1 and [r["id"] for r, _, ins in hits if ins] == ["rec1", "rec2"], hits
+        assert all(p[site.FIELD_SRC] == exa.SOURCE for _, p, _ in hits)
+
+    # is_target(after_site=True): с сайтом — только после краула (есть enrichment_status)
+    name = {site.FIELD_COMPANY: "X"}
+    assert exa.is_target({**name}, after_site=True)
+    assert not exa.is_target({**name, site.FIELD_WEBSITE: "x.com"}, after_site=True)
+    assert exa.is_target({**name, site.FIELD_WEBSITE: "x.com"})
+    assert exa.is_target({**name, site.FIELD_WEBSITE: "x.com", site.FIELD_STAT: "partial"}, after_site=True)
+    assert not exa.is_target({site.FIELD_WEBSITE: "x.com", site.FIELD_STAT: "partial"}, after_site=True)
+    assert not exa.is_target({**name, **{k: "1" for k in exa.EXA_FIELDS}})
+    print("fake_exa check: ok")
+
+
+def main(args):
+    from src import enrich_exa as exa
+
+    rows = bench_queries(args.companies, args.dup_ratio, args.seed)
+
+    naive = FakeExa(args.latency_ms, args.seed)
+    t0 = time.perf_counter()
+    for name, site in rows:
+        exa.result_dicts(naive.search_and_contents(exa.normalize_query(name, site), type="auto", text=True))
+    naive_s = time.perf_counter() - t0
+    print(f"naive:           {naive_s:8.2f} s  paid calls {naive.calls}")
+
+    with tempfile.TemporaryDirectory(prefix="exa_bench_") as tmp:
+        fake = FakeExa(args.latency_ms, args.seed)
+        cache = exa.ExaCache(os.path.join(tmp, "exa_cache.sqlite"))
+        for run in ("cold", "warm"):
+            src = exa.ExaSource(fake, cache, rps=args.rps, workers=args.workers)
+            recs = [{"id": f"rec{i}", "fields": {"Company name": n, "website": s}} for i, (n, s) in enumerate(rows)]
+            t0 = time.perf_counter()
+            hits = exa.enrich_records(recs, src)
+            dt = time.perf_counter() - t0
+            filled = sum(1 for _, _, ins in hits if ins)
+            print(f"batched ({run}):  {dt:8.2f} s  paid calls {src.calls}  cache hits {src.cache_hits}  "
+                  f"records filled {filled}/{len(recs)}")
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Naive vs batched+cached Exa enrichment against a local fake client")
+    ap.add_argument("--companies", type=int, default=200)
+    ap.add_argument("--dup-ratio", type=float, default=0.2, help="доля повторяющихся компаний")
+    ap.add_argument("--latency-ms", type=float, default=300, help="задержка ответа фейкового Exa")
+    ap.add_argument("--rps", type=float, default=10, help="лимит запросов/с для ExaSource")
+    ap.add_argument("--workers", type=int, default=8)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--check", action="store_true", help="проверить поведение ExaSource/relevant/is_target вместо замера")
+    args = ap.parse_args()
+    if args.check:
+        check(args.seed)
+    else:
+        main(args)
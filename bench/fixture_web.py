@@ -0,0 +1,99 @@
+"""
+Фикстурный веб компаний для бенчмарков краулера.
+
+Сервер работает как HTTP-прокси: скрипт запускается с HTTP_PROXY=http://127.0.0.1:PORT
+и SITE_SCHEME=http, и любые запросы к benchcoNNNNNN.com (в т.ч. robots.txt через urllib)
+приходят сюда и рендерятся из bench/fixtures.py без реального DNS.
+
+Часть сайтов намеренно "плохие" (по company["roll"]): отвечают 503, медленные
+или без полезной разметки — чтобы краулер вёл себя как на реальной выборке.
+"""
+import re
+import threading
+import time
+import urllib.parse
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from bench import fixtures
+
+HOST_RE = re.compile(r"^(?:www\.)?benchco(\d{6})\.com$")
+
+
+class FixtureWeb:
+    def __init__(self, seed: int = 0, dead_ratio: float = 0.1, slow_ratio: float = 0.05,
+                 slow_ms: float = 1500, latency_ms: float = 0):
+        self.seed = seed
+        self.dead_ratio = dead_ratio
+        self.slow_ratio = slow_ratio
+        self.slow = slow_ms / 1000.0
+        self.latency = latency_ms / 1000.0
+        self.lock = threading.Lock()
+        self.stats = Counter()
+        self.per_host = Counter()
+        self.server: ThreadingHTTPServer | None = None
+
+    def start(self, host: str = "127.0.0.1", port: int = 0) -> int:
+        web = self
+
+        class Handler(_Handler):
+            fixture = web
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self.server.server_address[1]
+
+    def stop(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+
+    def reset_stats(self):
+        with self.lock:
+            self.stats = Counter()
+            self.per_host = Counter()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    fixture: FixtureWeb
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, code: int, body: str, ctype: str = "text/html; charset=utf-8"):
+        raw = body.encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(raw)))
+        self.end_headers()
+        self.wfile.write(raw)
+        with self.fixture.lock:
+            self.fixture.stats["bytes_out"] += len(raw)
+            self.fixture.stats[f"status_{code}"] += 1
+
+    def do_GET(self):
+        fx = self.fixture
+        u = urllib.parse.urlsplit(self.path)
+        host = (u.hostname or self.headers.get("Host", "").split(":")[0]).lower()
+        with fx.lock:
+            fx.stats["requests"] += 1
+            fx.per_host[host] += 1
+        if fx.latency:
+            time.sleep(fx.latency)
+        m = HOST_RE.match(host)
+        if not m:
+            return self._send(502, "unknown host")
+        c = fixtures.company(int(m.group(1)), fx.seed)
+        if c["roll"] > 1 - fx.dead_ratio:
+            return self._send(503, "down")
+        if c["roll"] > 1 - fx.dead_ratio - fx.slow_ratio:
+            time.sleep(fx.slow)
+        path = u.path or "/"
+        if path == "/robots.txt":
+            return self._send(200, "User-agent: *\nDisallow: /private\n", "text/plain")
+        html = fixtures.render(c, path)
+        if html is None:
+            return self._send(404, "<h1>404</h1>")
+        return self._send(200, html)
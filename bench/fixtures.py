@@ -0,0 +1,152 @@
+"""
+Детерминированные фикстуры для бенчмарков: компании, таблицы A/B, nodes.json и HTML сайтов.
+
+Все данные выводятся из индекса компании и seed, поэтому прогоны воспроизводимы
+и фикстурный веб не хранит страницы — рендерит их по запросу.
+"""
+import hashlib
+import json
+import random
+
+VERTICALS = ["Energy", "Food", "Transport", "Buildings", "Land Use", "Materials", "Oceans"]
+CITIES = [("Berlin", "Germany"), ("Paris", "France"), ("Austin", "United States"),
+          ("Lisbon", "Portugal"), ("Oslo", "Norway"), ("Toronto", "Canada")]
+FIRST = ["Green", "Blue", "Solar", "Carbon", "Terra", "Aqua", "Bio", "Hydro", "Agri", "Eco"]
+LAST = ["Works", "Labs", "Loop", "Grid", "Cycle", "Leaf", "Forge", "Field", "Wave", "Core"]
+
+# поля A, которые знает фейковый Airtable (остальные -> 422 UNKNOWN_FIELD_NAME)
+FIELDS_A = [
+    "Company name", "website", "description", "employees_count", "location", "total_funding",
+    "drawdown_solutions", "email_reasoning", "financials_reasoning", "ceo_email",
+    "linkedin_url", "latest funding type", "keywords matched",
+    "enrichment_sources", "last_enriched_at", "enrichment_status",
+]
+FIELDS_B = ["Company Name", "Description", "Employees", "Location", "Money Raised", "URL",
+            "Vertical", "Email Reasoning", "Financials Reasoning", "CEO Email"]
+
+
+def _rng(seed: int, i: int, salt: str = "") -> random.Random:
+    h = hashlib.sha1(f"{seed}:{i}:{salt}".encode()).digest()
+    return random.Random(int.from_bytes(h[:8], "big"))
+
+
+def company(i: int, seed: int = 0) -> dict:
+    r = _rng(seed, i)
+    name = f"{r.choice(FIRST)}{r.choice(LAST)} {i}"
+    city, country = r.choice(CITIES)
+    return {
+        "i": i,
+        "name": name,
+        "domain": f"benchco{i:06d}.com",
+        "city": city,
+        "country": country,
+        "employees": r.choice([4, 12, 35, 80, 240, 900]),
+        "funding": r.choice(["$1.2m", "€3m", "$15 million", "£600k"]),
+        "vertical": r.choice(VERTICALS),
+        # доля "мёртвых" сайтов и сайтов без полезной разметки управляется в FixtureWeb
+        "roll": r.random(),
+    }
+
+
+def table_a(n: int, seed: int = 0, filled_ratio: float = 0.3) -> list[dict]:
+    out = []
+    for i in range(n):
+        c = company(i, seed)
+        f = {"Company name": c["name"], "website": f"https://www.{c['domain']}/"}
+        if _rng(seed, i, "fa").random() < filled_ratio:
+            f["location"] = f"{c['city']}, {c['country']}"
+            f["employees_count"] = "11-50"
+        out.append({"fields": f})
+    return out
+
+
+def table_b(n: int, seed: int = 0, overlap: float = 0.6) -> list[dict]:
+    """B: часть компаний совпадает с A по ключу, часть — новые (будут созданы в A)."""
+    out = []
+    for i in range(n):
+        j = i if _rng(seed, i, "ov").random() < overlap else n + i
+        c = company(j, seed)
+        out.append({"fields": {
+            "Company Name": c["name"],
+            "Description": f"{c['name']} builds {c['vertical'].lower()} solutions.",
+            "Employees": c["employees"],
+            "Location": f"{c['city']}, {c['country']}",
+            "Money Raised": c["funding"],
+            "URL": f"https://{c['domain']}",
+            "Vertical": c["vertical"],
+            "CEO Email": f"ceo@{c['domain']}",
+        }})
+    return out
+
+
+def nodes_json(n: int, seed: int = 0, coverage: float = 0.5) -> dict:
+    dps = []
+    for i in range(n):
+        if _rng(seed, i, "nd").random() >= coverage: continue
+        c = company(i, seed)
+        dps.append({"attr": {
+            "Name": c["name"],
+            "Website": c["domain"],
+            "Total Funding": c["funding"],
+            "Company Size": c["employees"],
+            "HQ City": c["city"],
+            "LinkedIn": f"https://www.linkedin.com/company/benchco{i:06d}",
+            "Last Funding Type": "Seed",
+            "Keywords": ["climate", c["vertical"].lower()],
+        }})
+    return {"datapoints": dps}
+
+
+def schema() -> dict:
+    def fields(names):
+        out = []
+        for nm in names:
+            if nm == "drawdown_solutions":
+                out.append({"name": nm, "type": "multipleSelects",
+                            "options": {"choices": [{"name": v} for v in VERTICALS]}})
+            else:
+                out.append({"name": nm, "type": "singleLineText"})
+        return out
+    return {"tables": [
+        {"id": "tblA", "name": "Startups", "fields": fields(FIELDS_A)},
+        {"id": "tblB", "name": "Startups Data", "fields": fields(FIELDS_B)},
+    ]}
+
+
+# ----------------------------------------------------------------
+#                         FIXTURE HTML
+# ----------------------------------------------------------------
+def _page(title: str, body: str, head: str = "") -> str:
+    return (f"<!doctype html><html><head><title>{title}</title>{head}</head>"
+            f"<body><nav><a href='/'>Home</a> <a href='/about'>About</a> <a href='/team'>Team</a> "
+            f"<a href='/news/funding'>News</a> <a href='/contact'>Contact</a> <a href='#top'>Top</a></nav>"
+            f"{body}<footer>&copy; 2024 — {{footer}}</footer></body></html>")
+
+
+def render(c: dict, path: str) -> str | None:
+    """HTML страницы фикстурного сайта или None (404)."""
+    loc = f"{c['city']}, {c['country']}"
+    if path in ("/", ""):
+        ld = {"@context": "https://schema.org", "@type": "Organization", "name": c["name"],
+              "address": {"@type": "PostalAddress", "addressLocality": c["city"], "addressCountry": c["country"]}}
+        if c["roll"] < 0.5:
+            ld["numberOfEmployees"] = c["employees"]
+        html = _page(c["name"], f"<main><h1>{c['name']}</h1><p>We work on {c['vertical']}.</p>"
+                                 + "<p>Lorem ipsum dolor sit amet. </p>" * 40 + "</main>",
+                     f"<script type='application/ld+json'>{json.dumps(ld)}</script>")
+        return html.replace("{footer}", loc)
+    if path == "/about":
+        return _page("About", f"<h1>About</h1><p>Founded in {c['city']}.</p>").replace("{footer}", loc)
+    if path == "/team":
+        cards = "".join(f"<div class='team-member'><img src='/p{k}.jpg'><h3>Person {k}</h3></div>"
+                        for k in range(min(c["employees"], 30)))
+        body = (f"<h1>Team</h1><div class='team'>{cards}</div>"
+                f"<p>Our CEO and co-founder: <a href='mailto:ceo@{c['domain']}'>ceo@{c['domain']}</a></p>")
+        return _page("Team", body).replace("{footer}", loc)
+    if path == "/news/funding":
+        body = (f"<article><h1>{c['name']} raised {c['funding']} in seed round</h1>"
+                f"<time datetime='2024-03-01'>March 1</time></article>")
+        return _page("News", body, "<meta property='article:published_time' content='2024-03-01T10:00:00Z'>").replace("{footer}", loc)
+    if path == "/contact":
+        return _page("Contact", f"<p>Write to hello@{c['domain']}</p>").replace("{footer}", loc)
+    return None
@@ -0,0 +1,146 @@
+"""
+Оффлайн-бенчмарк скриптов src/ против локального Airtable и фикстурного веба.
+
+    python -m bench.run_bench --sizes 1000,10000,50000,200000 --scripts main,nodes,lite
+    python -m bench.run_bench --sizes 1000 --latency-ms 30 --rate-429 0.02 --out bench.json
+
+Для каждого размера таблицы и скрипта поднимает свежие данные, запускает скрипт
+отдельным процессом (как в cron) и печатает: время, записей/сек, число запросов
+к Airtable и к сайтам, переданные байты и пиковый RSS процесса.
+"""
+import argparse
+import json
+import os
+import pathlib
+import subprocess
+import sys
+import tempfile
+import time
+
+from bench import fixtures
+from bench.fake_airtable import FakeAirtable
+from bench.fixture_web import FixtureWeb
+
+REPO = pathlib.Path(__file__).resolve().parent.parent
+
+SCRIPTS = {
+    "main": ["-m", "src.main"],
+    "nodes": ["-m", "src.enrich_from_nodes", "--nodes", "{nodes}"],
+    "lite": ["-m", "src.enrich_lite", "--limit", "{limit}"],
+    "pipeline": ["-m", "src.pipeline", "--nodes", "{nodes}", "--crawl-limit", "{limit}"],
+}
+
+
+def run_script(name: str, env: dict, workdir: str, nodes_path: str, limit: int, extra: list[str]) -> dict:
+    argv = [sys.executable] + [a.format(nodes=nodes_path, limit=limit) for a in SCRIPTS[name]] + extra
+    t0 = time.perf_counter()
+    proc = subprocess.Popen(argv, cwd=workdir, env=env, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    out = proc.stdout.read()
+    _, status, usage = os.wait4(proc.pid, 0)
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    wall = time.perf_counter() - t0
+    return {
+        "exit_code": proc.returncode,
+        "wall_s": round(wall, 3),
+        "cpu_s": round(usage.ru_utime + usage.ru_stime, 3),
+        "peak_rss_mb": round(usage.ru_maxrss / 1024, 1),
+        "tail": out.decode("utf-8", "replace").strip().splitlines()[-3:],
+    }
+
+
+def bench_size(n: int, scripts: list[str], args) -> list[dict]:
+    at = FakeAirtable(latency_ms=args.latency_ms, rate_429=args.rate_429, rps_limit=args.rps_limit, seed=args.seed)
+    web = FixtureWeb(seed=args.seed, dead_ratio=args.dead_ratio, latency_ms=args.site_latency_ms)
+    at_port, web_port = at.start(), web.start()
+    rows = []
+    try:
+        with tempfile.TemporaryDirectory(prefix="airtable_bench_") as tmp:
+            nodes_path = os.path.join(tmp, "nodes.json")
+            with open(nodes_path, "w", encoding="utf-8") as f:
+                json.dump(fixtures.nodes_json(n, args.seed), f)
+            env = dict(os.environ)
+            env.update({
+                "PYTHONPATH": str(REPO),
+                "AIRTABLE_TOKEN": "bench",
+                "AIRTABLE_BASE_ID": "appBENCH",
+                "AIRTABLE_API_URL": f"http://127.0.0.1:{at_port}/v0",
+                "TABLE_A": "tblA",
+                "TABLE_B": "tblB",
+                "HTTP_PROXY": f"http://127.0.0.1:{web_port}",
+                "http_proxy": f"http://127.0.0.1:{web_port}",
+                "NO_PROXY": "127.0.0.1,localhost",
+                "no_proxy": "127.0.0.1,localhost",
+                "SITE_SCHEME": "http",
+                "AIRTABLE_RPS": str(args.client_rps),
+            })
+            if args.no_sleep:
+                env["SLEEP_BETWEEN"] = "0"
+            for name in scripts:
+                # каждый скрипт стартует с одинакового состояния базы
+                at.load("tblA", fixtures.table_a(n, args.seed), fixtures.FIELDS_A)
+                at.load("tblB", fixtures.table_b(n, args.seed), fixtures.FIELDS_B)
+                at.reset_stats(); web.reset_stats()
+                res = run_script(name, env, tmp, nodes_path, args.enrich_limit, args.extra.split() if args.extra else [])
+                processed = min(n, args.enrich_limit) if name == "lite" else n
+                row = {
+                    "size": n,
+                    "script": name,
+                    **res,
+                    "records_per_s": round(processed / res["wall_s"], 1) if res["wall_s"] else 0,
+                    "airtable_requests": at.stats["requests"],
+                    "airtable_429": at.stats["status_429"],
+                    "records_patched": at.stats["records_patched"],
+                    "site_requests": web.stats["requests"],
+                    "bytes": at.stats["bytes_in"] + at.stats["bytes_out"] + web.stats["bytes_out"],
+                }
+                rows.append(row)
+                print_row(row)
+    finally:
+        at.stop(); web.stop()
+    return rows
+
+
+HEADER = f"{'size':>7} {'script':<6} {'exit':>4} {'wall s':>8} {'rec/s':>9} {'AT req':>7} {'429':>5} {'site req':>8} {'MiB':>8} {'RSS MB':>7}"
+
+
+def print_row(r: dict):
+    print(f"{r['size']:>7} {r['script']:<6} {r['exit_code']:>4} {r['wall_s']:>8.2f} {r['records_per_s']:>9.1f} "
+          f"{r['airtable_requests']:>7} {r['airtable_429']:>5} {r['site_requests']:>8} "
+          f"{r['bytes'] / 2**20:>8.2f} {r['peak_rss_mb']:>7.1f}")
+    if r["exit_code"] != 0:
+        for line in r["tail"]:
+            print(f"        ! {line}")
+
+
+def main(args):
+    sizes = [int(x) for x in args.sizes.split(",") if x.strip()]
+    scripts = [s.strip() for s in args.scripts.split(",") if s.strip()]
+    unknown = [s for s in scripts if s not in SCRIPTS]
+    if unknown:
+        raise SystemExit(f"Неизвестные скрипты: {unknown} (есть: {', '.join(SCRIPTS)})")
+    print(HEADER)
+    rows = []
+    for n in sizes:
+        rows += bench_size(n, scripts, args)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(rows, f, ensure_ascii=False, indent=2)
+        print(f"\nРезультаты: {args.out}")
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Offline end-to-end benchmark of src/ scripts")
+    ap.add_argument("--sizes", default="1000,10000", help="размеры таблицы A через запятую (1k..200k)")
+    ap.add_argument("--scripts", default="main,nodes,lite", help=f"из: {', '.join(SCRIPTS)}")
+    ap.add_argument("--enrich-limit", type=int, default=50, help="--limit для enrich_lite / --crawl-limit для pipeline")
+    ap.add_argument("--latency-ms", type=float, default=0, help="задержка ответа фейкового Airtable")
+    ap.add_argument("--rate-429", type=float, default=0.0, help="доля случайных 429")
+    ap.add_argument("--rps-limit", type=float, default=0, help="лимит req/s фейкового Airtable (0 — без лимита)")
+    ap.add_argument("--client-rps", type=float, default=0, help="AIRTABLE_RPS клиента (0 — без лимита; боевое значение 5)")
+    ap.add_argument("--site-latency-ms", type=float, default=0, help="задержка фикстурных сайтов")
+    ap.add_argument("--dead-ratio", type=float, default=0.1, help="доля сайтов, отвечающих 503")
+    ap.add_argument("--no-sleep", action="store_true", help="SLEEP_BETWEEN=0 для краулера")
+    ap.add_argument("--extra", default="", help="доп. аргументы для всех скриптов, напр. '--dry-run'")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--out", help="сохранить результаты в JSON")
+    main(ap.parse_args())
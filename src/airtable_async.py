@@ -0,0 +1,185 @@
+"""
+Асинхронный клиент Airtable с теми же операциями, что в src/helpers, — для
+пайплайнов, которые в одном event loop смешивают запросы к Airtable с другим I/O.
+
+    async with AsyncAirtable() as at:
+        A, B = await asyncio.gather(at.list_all(TABLE_A), at.list_all(TABLE_B))
+        await at.batch_update(TABLE_A, updates, drop_unknown=True)
+
+Один клиент — один пул соединений (aiohttp, опциональная зависимость) и один
+лимит запросов в секунду на все корутины. Повторы, 422 UNKNOWN_FIELD_NAME,
+склейка патчей и метрики — общие с синхронными функциями helpers, которые
+остаются для существующих скриптов.
+"""
+import asyncio
+import json
+import time
+import urllib.parse
+from typing import Any, Optional
+
+from src import metrics
+from src.helpers import (
+    RateLimiter, limiter_for, RETRIES, retry_wait, drop_unknown_field, coalesce_updates,
+    options_from_schema, options_from_records, types_from_schema, chunks,
+)
+from src.config import AIRTABLE_API_URL, AIRTABLE_BASE_ID, AIRTABLE_TOKEN, REQ_TIMEOUT
+
+
+class Response:
+    """Прочитанный ответ aiohttp в форме requests.Response (status_code/ok/text/json/headers/content) —
+    чтобы drop_unknown_field, retry_wait и metrics.record_airtable работали без изменений."""
+
+    def __init__(self, status: int, headers, body: bytes):
+        self.status_code = status
+        self.headers = headers
+        self.content = body
+
+    @property
+    def ok(self) -> bool: return self.status_code < 400
+    @property
+    def text(self) -> str: return self.content.decode("utf-8", "replace")
+    def json(self) -> Any: return json.loads(self.content or b"null")
+
+
+class AsyncAirtable:
+    def __init__(self, token: str = AIRTABLE_TOKEN, base_id: str = AIRTABLE_BASE_ID, api_url: str = AIRTABLE_API_URL,
+                 rps: Optional[float] = None, max_connections: int = 10, limiter: Optional[RateLimiter] = None,
+                 session=None):
+        self.token = token
+        self.base_id = base_id
+        self.api_url = api_url
+        # по умолчанию — лимитер базы из helpers: в одном процессе sync- и async-запросы
+        # к одной базе делят её лимит; свой rps/limiter — отдельно от них
+        self.limiter = limiter or (RateLimiter(rps) if rps is not None else limiter_for(base_id))
+        self.max_connections = max_connections
+        self._session = session
+        self._own_session = session is None
+        self._schema: Optional[dict[str, Any]] = None
+
+    async def __aenter__(self):
+        self.session()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    def session(self):
+        if self._session is None:
+            try:
+                import aiohttp
+            except ImportError:
+                raise SystemExit("Асинхронный клиент Airtable требует aiohttp: pip install aiohttp")
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.max_connections),
+                timeout=aiohttp.ClientTimeout(total=REQ_TIMEOUT * 3),
+                headers={"Authorization": f"Bearer {self.token}", "Content-Type": "application/json"},
+            )
+        return self._session
+
+    async def close(self):
+        if self._session is not None and self._own_session:
+            await self._session.close()
+        self._session = None
+
+    def api_root(self) -> str:
+        return f"{self.api_url}/{self.base_id}"
+
+    def table_url(self, table: str) -> str:
+        return f"{self.api_root()}/{urllib.parse.quote(table)}"
+
+    # ------------------------------------------------------------
+    async def retry_request(self, method: str, url: str, **kw) -> Response:
+        """Как helpers.retry_request: лимит запросов, повтор на 429/5xx с Retry-After."""
+        sent = metrics.payload_size(kw)
+        for attempt in range(1, RETRIES + 1):
+            d = self.limiter.reserve()
+            if d > 0: await asyncio.sleep(d)
+            t0 = time.perf_counter()
+            try:
+                async with self.session().request(method, url, **kw) as resp:
+                    r = Response(resp.status, resp.headers, await resp.read())
+            except Exception:
+                metrics.record_airtable(method, url, None, time.perf_counter() - t0, sent)
+                raise
+            metrics.record_airtable(method, url, r, time.perf_counter() - t0, sent)
+            wait = retry_wait(r, attempt)
+            if wait is not None and attempt < RETRIES:
+                metrics.record_retry(method, url, wait)
+                await asyncio.sleep(wait); continue
+            return r
+        return r
+
+    async def list_all(self, table: str, fields: Optional[list[str]] = None,
+                       formula: Optional[str] = None) -> list[dict[str, Any]]:
+        out, offset = [], None
+        params = [("fields[]", f) for f in (fields or [])]
+        if formula: params.append(("filterByFormula", formula))
+        url = self.table_url(table)
+        while True:
+            qs = list(params)
+            if offset: qs.append(("offset", offset))
+            r = await self.retry_request("GET", url, params=qs)
+            if not r.ok:
+                raise RuntimeError(f"GET {url} -> {r.status_code} {r.text}")
+            j = r.json()
+            out += j.get("records", [])
+            offset = j.get("offset")
+            if not offset: break
+        return out
+
+    async def _batch_write(self, method: str, table: str, recs: list[dict[str, Any]], dry=False,
+                           drop_unknown=False) -> list[dict[str, Any]]:
+        out = []
+        idx = 0
+        while idx < len(recs):
+            part = recs[idx: idx+10]
+            if dry: print(f"[DRY] {method} {table}: {len(part)}"); idx += 10; continue
+            r = await self.retry_request(method, self.table_url(table), json={"records": part})
+            if not r.ok:
+                if drop_unknown and drop_unknown_field(r, recs):
+                    if method == "PATCH":
+                        recs[idx:] = [x for x in recs[idx:] if x.get("fields")]
+                    continue
+                raise RuntimeError(f"{method} {table} -> {r.status_code} {r.text}")
+            out += r.json().get("records", [])
+            idx += 10
+        return out
+
+    async def batch_create(self, table: str, recs: list[dict[str, Any]], dry=False, drop_unknown=False) -> list[dict[str, Any]]:
+        return await self._batch_write("POST", table, recs, dry=dry, drop_unknown=drop_unknown)
+
+    async def batch_update(self, table: str, recs: list[dict[str, Any]], dry=False, drop_unknown=False,
+                           current: Optional[dict[str, dict[str, Any]]] = None,
+                           types: Optional[dict[str, str]] = None) -> list[dict[str, Any]]:
+        if types is None: types = await self.field_types(table)
+        return await self._batch_write("PATCH", table, coalesce_updates(recs, current, types), dry=dry, drop_unknown=drop_unknown)
+
+    async def batch_delete(self, table: str, ids: list[str], dry=False):
+        for part in chunks(ids, 10):
+            if dry: print(f"[DRY] DELETE {table}: {len(part)}"); continue
+            r = await self.retry_request("DELETE", self.table_url(table), params=[("records[]", rid) for rid in part])
+            if not r.ok: raise RuntimeError(f"DELETE {table} -> {r.status_code} {r.text}")
+
+    async def get_base_schema(self, refresh: bool = False) -> Optional[dict[str, Any]]:
+        if self._schema is not None and not refresh:
+            return self._schema
+        r = await self.retry_request("GET", f"{self.api_url}/meta/bases/{self.base_id}/tables")
+        if not r.ok:
+            return None
+        try:
+            self._schema = r.json()
+        except Exception:
+            return None
+        return self._schema
+
+    async def field_types(self, table: str) -> dict[str, str]:
+        return types_from_schema(await self.get_base_schema(), table)
+
+    async def get_allowed_multiselect_options(self, table: str, field_name: str) -> Optional[set]:
+        opts = options_from_schema(await self.get_base_schema(), table, field_name)
+        if opts is not None:
+            return opts
+        try:
+            return options_from_records(await self.list_all(table), field_name)
+        except Exception:
+            return None
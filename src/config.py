@@ -0,0 +1,61 @@
+import os
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# ----------------------------------------------------------------
+#   Общий конфиг из env. Только stdlib + dotenv: модуль импортируют все
+#   точки входа, поэтому здесь не должно быть тяжёлых зависимостей.
+# ----------------------------------------------------------------
+
+# ================== AIRTABLE ==================
+AIRTABLE_TOKEN   = os.getenv("AIRTABLE_TOKEN", "")
+AIRTABLE_BASE_ID = os.getenv("AIRTABLE_BASE_ID", "")
+AIRTABLE_API_URL = os.getenv("AIRTABLE_API_URL", "https://api.airtable.com/v0")
+AIRTABLE_RPS     = float(os.getenv("AIRTABLE_RPS", "5"))   # лимит Airtable — 5 запросов/с на базу
+
+# Ууказывать ID таблиц (tbl...)
+TABLE_A = os.getenv("TABLE_A")   # Startups
+TABLE_B = os.getenv("TABLE_B")   # Chris | Startups Data
+
+KEY_A = os.getenv("KEY_A", "Company name")
+KEY_B = os.getenv("KEY_B", "Company Name")
+
+# ================== CRAWLER ==================
+USER_AGENT = "Mozilla/5.0 (compatible; StartupEnricher/1.0; +https://example.com/bot-info)"
+REQ_TIMEOUT = 20
+# Таймауты краулера: connect отдельно от read; read ужимается по истории хоста
+# (parsing_helpers.LatencyTracker) и не выходит за бюджет компании.
+CONNECT_TIMEOUT = float(os.getenv("CONNECT_TIMEOUT", "5"))
+READ_TIMEOUT = float(os.getenv("READ_TIMEOUT", str(REQ_TIMEOUT)))
+MIN_READ_TIMEOUT = 3.0
+SLOW_HOST_SECONDS = float(os.getenv("SLOW_HOST_SECONDS", "8"))   # медленнее — сайт не докрауливаем
+SITE_BUDGET = float(os.getenv("SITE_BUDGET", "60"))               # секунд на одну компанию (0 — без лимита)
+# https->http и apex->www параллельно с основным вариантом, когда сайт не отвечает
+SITE_FALLBACK = os.getenv("SITE_FALLBACK", "0").lower() in ("1", "true", "yes")
+SLEEP_BETWEEN = float(os.getenv("SLEEP_BETWEEN", "0.6"))   # секунды между запросами
+SITE_SCHEME = os.getenv("SITE_SCHEME", "https")             # http — для локальных фикстур (bench/)
+
+# HTML-бэкенд экстракторов: bs4 (эталон) или lxml (быстрый путь)
+PARSER_BACKEND = os.getenv("PARSER_BACKEND", "bs4")
+
+# tldextract: по умолчанию только встроенный снапшот public suffix list, без сети.
+# TLDEXTRACT_SUFFIX_URLS (через запятую) включает обновление списка в TLDEXTRACT_CACHE_DIR.
+TLDEXTRACT_CACHE_DIR = os.getenv("TLDEXTRACT_CACHE_DIR", os.path.expanduser("~/.cache/startup-enricher/tldextract"))
+TLDEXTRACT_SUFFIX_URLS = tuple(u.strip() for u in os.getenv("TLDEXTRACT_SUFFIX_URLS", "").split(",") if u.strip())
+
+# Негативный кеш доменов (src/domain_cache.py)
+DOMAIN_CACHE_PATH = os.getenv("DOMAIN_CACHE_PATH", "domain_cache.sqlite")
+
+# Кеш извлечений по отпечаткам страниц (src/page_cache.py)
+PAGE_CACHE_PATH = os.getenv("PAGE_CACHE_PATH", "page_cache.sqlite")
+
+# ================== EXA (src/enrich_exa.py) ==================
+EXA_API_KEY = os.getenv("EXA_API_KEY", "")
+EXA_RPS = float(os.getenv("EXA_RPS", "5"))              # запросов/с к Exa на процесс
+EXA_WORKERS = int(os.getenv("EXA_WORKERS", "4"))        # параллельных запросов
+EXA_RESULTS = int(os.getenv("EXA_RESULTS", "3"))        # результатов на компанию
+EXA_MAX_CHARS = int(os.getenv("EXA_MAX_CHARS", "3000"))  # текста на результат
+EXA_CACHE_PATH = os.getenv("EXA_CACHE_PATH", "exa_cache.sqlite")
+EXA_CACHE_DAYS = float(os.getenv("EXA_CACHE_DAYS", "30"))  # ответы старше — запрашиваются заново
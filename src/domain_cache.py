@@ -0,0 +1,119 @@
+"""
+Негативный кеш доменов: чем закончился последний краул сайта (таймаут, DNS,
+4xx/5xx, запрет robots.txt, «ничего не извлеклось») и когда его стоит
+перепроверить. Интервал растёт экспоненциально с каждой неудачей подряд,
+успешный краул сбрасывает запись.
+
+Кеш смотрят до постановки компании в обработку (enrich_lite, worker,
+pipeline) — безнадёжные домены не съедают MAX_PAGES_PER_SITE × REQ_TIMEOUT.
+
+    python -m src.domain_cache stats --db domain_cache.sqlite
+    python -m src.domain_cache forget example.com --db domain_cache.sqlite
+"""
+import argparse
+import sqlite3
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from src.config import DOMAIN_CACHE_PATH
+
+OK = "ok"
+# исход -> базовый интервал перепроверки (часы); дальше ×2 за каждую неудачу подряд
+RECHECK_HOURS = {
+    "timeout":  12,
+    "connect":  12,
+    "http_5xx": 12,
+    "dns":      24,
+    "http_4xx": 48,     # 403/401 — обычно блок по User-Agent
+    "robots":   24 * 7,
+    "empty":    24 * 7,  # сайт живой, но извлечь нечего
+    "error":    12,
+}
+MAX_RECHECK = timedelta(days=90)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS domains (
+    domain       TEXT PRIMARY KEY,
+    outcome      TEXT NOT NULL,
+    failures     INTEGER NOT NULL,
+    last_checked TEXT NOT NULL,
+    next_check   TEXT NOT NULL
+) WITHOUT ROWID;
+"""
+
+
+def recheck_interval(outcome: str, failures: int) -> timedelta:
+    base = timedelta(hours=RECHECK_HOURS.get(outcome, RECHECK_HOURS["error"]))
+    return min(base * 2 ** max(failures - 1, 0), MAX_RECHECK)
+
+
+class DomainCache:
+    """Потокобезопасная обёртка над SQLite (worker краулит из пула потоков)."""
+
+    def __init__(self, path: str = DOMAIN_CACHE_PATH):
+        self.path = path
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.executescript(SCHEMA)
+        self.lock = threading.Lock()
+
+    def blocked(self, domain: Optional[str], now: Optional[datetime] = None) -> Optional[tuple[str, str]]:
+        """(исход, next_check), если домен ещё рано перепроверять, иначе None."""
+        if not domain: return None
+        now = now or datetime.now(timezone.utc)
+        with self.lock:
+            row = self.db.execute("SELECT outcome, next_check FROM domains WHERE domain=?", (domain,)).fetchone()
+        if row and row[1] > now.isoformat(timespec="seconds"):
+            return row[0], row[1]
+        return None
+
+    def record(self, domain: Optional[str], outcome: str, now: Optional[datetime] = None):
+        if not domain: return
+        now = now or datetime.now(timezone.utc)
+        with self.lock, self.db:
+            if outcome == OK:
+                self.db.execute("DELETE FROM domains WHERE domain=?", (domain,))
+                return
+            row = self.db.execute("SELECT failures FROM domains WHERE domain=?", (domain,)).fetchone()
+            failures = (row[0] if row else 0) + 1
+            nxt = now + recheck_interval(outcome, failures)
+            self.db.execute(
+                "INSERT OR REPLACE INTO domains VALUES (?, ?, ?, ?, ?)",
+                (domain, outcome, failures, now.isoformat(timespec="seconds"), nxt.isoformat(timespec="seconds")))
+
+    def forget(self, domain: str) -> bool:
+        with self.lock, self.db:
+            return self.db.execute("DELETE FROM domains WHERE domain=?", (domain,)).rowcount > 0
+
+    def stats(self) -> dict[str, tuple[int, int]]:
+        """исход -> (доменов всего, из них сейчас заблокировано)."""
+        now = datetime.now(timezone.utc).isoformat(timespec="seconds")
+        with self.lock:
+            rows = self.db.execute(
+                "SELECT outcome, COUNT(*), SUM(next_check > ?) FROM domains GROUP BY outcome ORDER BY 2 DESC", (now,))
+            return {o: (n, blocked or 0) for o, n, blocked in rows}
+
+
+def open_from_args(args) -> Optional[DomainCache]:
+    return None if args.no_domain_cache else DomainCache(args.domain_cache)
+
+def add_cli_args(ap):
+    ap.add_argument("--domain-cache", default=DOMAIN_CACHE_PATH, metavar="DB",
+                    help="SQLite-кеш исходов краула по доменам (пропуск мёртвых/блокирующих сайтов)")
+    ap.add_argument("--no-domain-cache", action="store_true", help="краулить все домены, кеш не читать и не писать")
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Per-domain negative crawl cache")
+    ap.add_argument("cmd", choices=["stats", "forget"])
+    ap.add_argument("domains", nargs="*")
+    ap.add_argument("--db", default=DOMAIN_CACHE_PATH)
+    args = ap.parse_args()
+    cache = DomainCache(args.db)
+    if args.cmd == "stats":
+        for outcome, (n, blocked) in cache.stats().items():
+            print(f"{outcome:<10} {n:>7}  (ждут перепроверки: {blocked})")
+    else:
+        for d in args.domains:
+            print(f"{d}: {'удалён' if cache.forget(d) else 'нет в кеше'}")
@@ -0,0 +1,284 @@
+"""
+Обогащение через Exa (платный поиск) — последним источником: только для компаний,
+у которых location / employees_count / total_funding пусты и после merge, nodes.json
+и краула сайта.
+
+  - запросы строятся из имени и домена, нормализуются и дедуплицируются;
+  - ответы кешируются на диске по нормализованному запросу (EXA_CACHE_PATH,
+    EXA_CACHE_DAYS) — повторный прогон не платит за те же компании;
+  - промахи кеша запрашиваются параллельно (EXA_WORKERS) под общим лимитом EXA_RPS;
+  - из текста результатов теми же регэкспами, что для сайтов, берутся поля;
+    результаты про другие компании (нет ни домена, ни имени) отбрасываются.
+
+    python -m src.enrich_exa --limit 100 [--dry-run] [--mirror mirror.sqlite]
+
+Локальная замена клиента для прогонов без ключа — bench/fake_exa.py.
+"""
+import argparse
+import json
+import re
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Any, Iterable, Optional
+
+from src import metrics, mirror, profiling, reports
+from src import enrich_lite as site
+from src.helpers import RateLimiter, list_all, batch_update
+from src.parsing_helpers import MONEY_RE, ROUND_RE, RAISED_RE, normalize_money, number_or_range, norm_domain
+from src.profiling import phase
+from src.config import (
+    AIRTABLE_TOKEN, AIRTABLE_BASE_ID, TABLE_A,
+    EXA_API_KEY, EXA_RPS, EXA_WORKERS, EXA_RESULTS, EXA_MAX_CHARS, EXA_CACHE_PATH, EXA_CACHE_DAYS,
+)
+
+EXA_FIELDS = [site.FIELD_LOC, site.FIELD_EMP, site.FIELD_FUND]
+SOURCE = "exa"
+
+
+def make_client(api_key: str = EXA_API_KEY):
+    try:
+        from exa_py import Exa
+    except ImportError:
+        raise SystemExit("Exa-источник требует exa_py: pip install exa_py")
+    if not api_key:
+        raise SystemExit("Укажи EXA_API_KEY.")
+    return Exa(api_key)
+
+def normalize_query(company: Any, website: Optional[str] = None) -> str:
+    """Ключ кеша и сам запрос: имя в нижнем регистре без лишних пробелов + зарегистрированный домен."""
+    name = " ".join(str(company or "").lower().split())
+    domain = site.site_domain(website) if website else None
+    return f"{name} {domain}" if name and domain else name
+
+def result_dicts(resp) -> list[dict[str, Any]]:
+    """Ответ exa_py (объекты) или заглушки (dict) -> [{url, title, text}] для кеша."""
+    out = []
+    for r in getattr(resp, "results", None) or (resp.get("results", []) if isinstance(resp, dict) else []):
+        get = r.get if isinstance(r, dict) else (lambda k, r=r: getattr(r, k, None))
+        out.append({"url": get("url") or "", "title": get("title") or "", "text": (get("text") or "")[:EXA_MAX_CHARS]})
+    return out
+
+
+# ----------------------------------------------------------------
+#                          CACHE
+# ----------------------------------------------------------------
+class ExaCache:
+    """Ответы Exa по нормализованному запросу. Пустой ответ тоже кешируется — за него уже заплачено."""
+
+    def __init__(self, path: str = EXA_CACHE_PATH, max_age_days: float = EXA_CACHE_DAYS):
+        self.path = path
+        self.max_age = timedelta(days=max_age_days)
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("CREATE TABLE IF NOT EXISTS answers (query TEXT PRIMARY KEY, results TEXT NOT NULL, "
+                        "fetched_at TEXT NOT NULL) WITHOUT ROWID")
+        self.lock = threading.Lock()
+
+    def get(self, query: str) -> Optional[list[dict[str, Any]]]:
+        oldest = (datetime.now(timezone.utc) - self.max_age).isoformat(timespec="seconds")
+        with self.lock:
+            row = self.db.execute("SELECT results FROM answers WHERE query=? AND fetched_at >= ?", (query, oldest)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put(self, query: str, results: list[dict[str, Any]]):
+        with self.lock, self.db:
+            self.db.execute("INSERT OR REPLACE INTO answers VALUES (?, ?, ?)",
+                            (query, json.dumps(results, ensure_ascii=False),
+                             datetime.now(timezone.utc).isoformat(timespec="seconds")))
+
+
+class ExaSource:
+    """
+    Пакетный поиск: lookup(queries) дедуплицирует запросы, отдаёт закешированное,
+    а промахи запрашивает параллельно (workers) под общим лимитом rps.
+    """
+
+    def __init__(self, client, cache: Optional[ExaCache] = None, rps: float = EXA_RPS,
+                 workers: int = EXA_WORKERS, num_results: int = EXA_RESULTS):
+        self.client = client
+        self.cache = cache
+        self.limiter = RateLimiter(rps)
+        self.workers = max(1, workers)
+        self.num_results = num_results
+        self.calls = 0          # платные запросы за прогон
+        self.cache_hits = 0
+
+    def search(self, query: str) -> list[dict[str, Any]]:
+        self.limiter.wait()
+        with metrics.timer("exa_request_seconds"):
+            try:
+                resp = self.client.search_and_contents(query, type="auto", num_results=self.num_results,
+                                                       text={"max_characters": EXA_MAX_CHARS})
+            except Exception:
+                metrics.inc("exa_requests_total", status="error")
+                raise
+        metrics.inc("exa_requests_total", status="ok")
+        return result_dicts(resp)
+
+    def _search_safe(self, query: str) -> tuple[str, Optional[list[dict[str, Any]]]]:
+        try:
+            return query, self.search(query)
+        except Exception as e:
+            print(f"Exa: {query!r}: {e}")
+            return query, None   # ошибку не кешируем — запрос повторится в следующий прогон
+
+    def lookup(self, queries: Iterable[str]) -> dict[str, list[dict[str, Any]]]:
+        out: dict[str, list[dict[str, Any]]] = {}
+        todo = []
+        for q in dict.fromkeys(q for q in queries if q):
+            hit = self.cache.get(q) if self.cache is not None else None
+            metrics.record_cache("exa", hit is not None)
+            if hit is not None:
+                out[q] = hit
+                self.cache_hits += 1
+            else:
+                todo.append(q)
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="exa") as ex:
+            for q, res in ex.map(self._search_safe, todo):
+                if res is None: continue
+                self.calls += 1
+                out[q] = res
+                if self.cache is not None:
+                    self.cache.put(q, res)
+        return out
+
+
+# ----------------------------------------------------------------
+#                        EXTRACTION
+# ----------------------------------------------------------------
+EMPLOYEES_RE = re.compile(r"\b(\d{1,3}(?:,\d{3})+|\d+)\s*\+?\s*(?:employees|staff|people|team members)\b", re.I)
+HQ_RE = re.compile(r"\b(?:headquartered|based|located)\s+in\s+([A-Z][A-Za-z.\- ]{1,40}?),\s*([A-Z][A-Za-z\- ]{1,40}?)(?=[.;,)\n]|\s+(?:and|with|that|which|since)\b|$)")
+SENTENCE_RE = re.compile(r"(?<=[.!?\n])\s+")
+
+def relevant(results: list[dict[str, Any]], f: dict[str, Any]) -> list[dict[str, Any]]:
+    """Результаты про эту компанию: с её домена или с упоминанием имени."""
+    domain = site.site_domain(f.get(site.FIELD_WEBSITE))
+    name = " ".join(str(f.get(site.FIELD_COMPANY) or "").lower().split())
+    out = []
+    for r in results:
+        host = norm_domain(r.get("url")) or ""
+        if domain and (host == domain or host.endswith("." + domain)):
+            out.append(r)
+        elif name and name in " ".join((r.get("title", "") + " " + r.get("text", "")).lower().split()):
+            out.append(r)
+    return out
+
+def extract_from_results(results: list[dict[str, Any]]) -> dict[str, Any]:
+    """Поля из текстов результатов (первое найденное по порядку выдачи)."""
+    out: dict[str, Any] = {}
+    for r in results:
+        text, url = r.get("text") or "", r.get("url") or ""
+        if site.FIELD_LOC not in out:
+            m = HQ_RE.search(text)
+            if m:
+                out[site.FIELD_LOC] = f"{m.group(1).strip()}, {m.group(2).strip()}"
+        if site.FIELD_EMP not in out:
+            m = EMPLOYEES_RE.search(text)
+            if m:
+                out[site.FIELD_EMP] = number_or_range(m.group(1).replace(",", ""))
+        if site.FIELD_FUND not in out:
+            # сумма — из того же предложения, где раунд/«raised», а не первая попавшаяся в тексте
+            for sent in SENTENCE_RE.split(text):
+                if not (RAISED_RE.search(sent) or ROUND_RE.search(sent)): continue
+                m = MONEY_RE.search(sent)
+                if m:
+                    out[site.FIELD_FUND] = normalize_money(m.groupdict())
+                    out[site.FIELD_FIN_R] = f"{out[site.FIELD_FUND]} via Exa search result {url}"
+                    break
+        if all(k in out for k in EXA_FIELDS): break
+    return out
+
+def is_target(f: dict[str, Any], after_site: bool = False) -> bool:
+    """
+    Есть имя и пусто хотя бы одно из EXA_FIELDS. after_site — у записи с сайтом
+    краул уже был (есть enrichment_status): платный поиск — только после бесплатного.
+    """
+    if not f.get(site.FIELD_COMPANY) or all(f.get(x) for x in EXA_FIELDS):
+        return False
+    return not (after_site and f.get(site.FIELD_WEBSITE) and not f.get(site.FIELD_STAT))
+
+def enrich_records(recs: list, source: ExaSource, counters: Optional[dict[str, int]] = None) -> list[tuple[Any, dict[str, Any], list[str]]]:
+    """(запись, патч, вставленные поля) для записей, по которым есть ответ; один пакетный lookup на все."""
+    queries = {r["id"]: normalize_query(r.get("fields", {}).get(site.FIELD_COMPANY), r.get("fields", {}).get(site.FIELD_WEBSITE))
+               for r in recs}
+    with phase("exa"):
+        answers = source.lookup(queries.values())
+    out = []
+    for r in recs:
+        f = r.get("fields", {})
+        results = answers.get(queries[r["id"]])
+        if results is None: continue
+        patch, inserted = site.site_patch(f, extract_from_results(relevant(results, f)), counters)
+        if inserted:
+            src = f.get(site.FIELD_SRC)
+            patch[site.FIELD_SRC] = f"{src}\n{SOURCE}" if src else SOURCE
+        out.append((r, patch, inserted))
+    return out
+
+
+# ----------------------------------------------------------------
+#                          CLI
+# ----------------------------------------------------------------
+def add_cli_args(ap):
+    ap.add_argument("--exa-cache", default=EXA_CACHE_PATH, metavar="DB", help="SQLite-кеш ответов Exa по запросу")
+    ap.add_argument("--no-exa-cache", action="store_true", help="не читать и не писать кеш Exa")
+
+def source_from_args(args, client=None) -> ExaSource:
+    return ExaSource(client or make_client(), None if args.no_exa_cache else ExaCache(args.exa_cache))
+
+def main(limit: int, dry_run: bool, source: ExaSource, mirror_path: Optional[str] = None,
+         report_formats: Optional[list[str]] = None, after_site: bool = True):
+    if not AIRTABLE_TOKEN or not AIRTABLE_BASE_ID:
+        raise SystemExit("Set AIRTABLE_TOKEN and AIRTABLE_BASE_ID")
+
+    db = mirror.open_db(mirror_path) if mirror_path else None
+    with phase("load A"):
+        if db is not None:
+            recs = mirror.candidates(db, TABLE_A, EXA_FIELDS, require=[site.FIELD_COMPANY])
+        else:
+            recs = list_all(TABLE_A, fields=site.NEED_FIELDS)
+    targets = [r for r in recs if is_target(r.get("fields", {}), after_site)][:limit]
+    print(f"→ Exa targets: {len(targets)} (fields still empty{' after site crawl' if after_site else ''})")
+
+    counters = {k: 0 for k in EXA_FIELDS}
+    updates = []
+    report = reports.ReportSink(f"exa_report_{datetime.now(timezone.utc):%Y%m%d_%H%M%S}", site.REPORT_FIELDS,
+                                report_formats or ["csv", "jsonl"], flush_every=50)
+    with report:
+        for r, patch, inserted in enrich_records(targets, source, counters):
+            if patch:
+                updates.append({"id": r["id"], "fields": patch})
+            if inserted:
+                report.write(site.report_row(r["id"], r.get("fields", {}), patch, inserted))
+    print(f"→ Exa: paid queries {source.calls}, cache hits {source.cache_hits}, records to update {len(updates)}")
+
+    if updates:
+        with phase("write"):
+            batch_update(TABLE_A, updates, dry=dry_run, drop_unknown=True,
+                         current={r["id"]: r.get("fields", {}) for r in targets})
+        if db is not None and not dry_run:
+            mirror.apply_updates(db, TABLE_A, updates)
+    for k in EXA_FIELDS:
+        print(f"- inserted {k}: {counters[k]}")
+    if report.paths and report.rows:
+        print(f"Report files: {' and '.join(report.paths)}")
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Exa search enrichment for fields still empty after free sources")
+    ap.add_argument("--limit", type=int, default=50, help="сколько компаний искать за запуск")
+    ap.add_argument("--dry-run", action="store_true")
+    ap.add_argument("--mirror", metavar="DB", help="кандидаты из SQLite-зеркала (python -m src.mirror sync)")
+    ap.add_argument("--include-uncrawled", action="store_true",
+                    help="искать и по компаниям с сайтом, который enrich_lite ещё не краулил")
+    add_cli_args(ap)
+    reports.add_cli_args(ap, default="csv,jsonl")
+    metrics.add_cli_args(ap)
+    profiling.add_cli_args(ap)
+    args = ap.parse_args()
+    metrics.setup_from_args(args)
+    profiling.setup_from_args(args)
+    main(args.limit, args.dry_run, source_from_args(args), mirror_path=args.mirror,
+         report_formats=reports.formats_from_args(args), after_site=not args.include_uncrawled)
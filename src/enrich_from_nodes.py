@@ -2,14 +2,12 @@ import json
 import argparse
 from typing import Any, Dict, Tuple, Optional
 
-from dotenv import load_dotenv
-load_dotenv()
-
-
 from src.helpers import (
-    list_all, batch_update, normalize_key,
+    list_all, batch_update, normalize_key, coerce_value, field_types,
 )
-from src.main import (
+from src import metrics, mirror, profiling, reports
+from src.profiling import phase
+from src.config import (
     AIRTABLE_BASE_ID, AIRTABLE_TOKEN,
     TABLE_A, KEY_A
 )
@@ -37,11 +35,12 @@ def richness_from_node_attr(attr: Dict[str, Any]) -> int:
 
 def extract_values_from_node(attr: Dict[str, Any]) -> Dict[str, Any]:
     """Достаём значения для полей A"""
+    # числа оставляем как есть — к типу поля их приводит node_patch
     total_funding = attr.get("Total Funding")
-    total_funding = str(total_funding) if total_funding not in (None, "") else None
+    total_funding = total_funding if total_funding not in (None, "") else None
 
     employees_count = attr.get("Company Size")
-    employees_count = str(employees_count) if employees_count not in (None, "") else None
+    employees_count = employees_count if employees_count not in (None, "") else None
 
     location = None
     if attr.get("HQ City"):
@@ -119,32 +118,52 @@ def choose_best_node(candidate_a: Optional[Dict], candidate_b: Optional[Dict]) -
     rb = richness_from_node_attr(candidate_b["attr"])
     return candidate_a if ra >= rb else candidate_b
 
-def main(nodes_path: str, dry_run: bool = False):
-    if not AIRTABLE_TOKEN or not AIRTABLE_BASE_ID:
-        raise SystemExit("Укажи AIRTABLE_TOKEN и AIRTABLE_BASE_ID.")
-
-    if not TABLE_A or not KEY_A:
-        raise SystemExit("Укажи TABLE_A и KEY_A.")
-
+def load_nodes(nodes_path: str) -> Tuple[Dict[str, Dict], Dict[str, Dict]]:
     with open(nodes_path, "r", encoding="utf-8") as f:
         nodes = json.load(f)
+    return build_nodes_indexes(nodes)
 
-    by_name, by_site = build_nodes_indexes(nodes)
-    print(f"Индекс по имени: {len(by_name)}, по сайту: {len(by_site)}")
+def needs_fill(fields: Dict[str, Any]) -> bool:
+    return any(is_empty(fields.get(f)) for f in TARGET_FIELDS)
+
+def match_node(fa: Dict[str, Any], by_name: Dict[str, Dict], by_site: Dict[str, Dict]) -> Optional[Dict]:
+    """Узел nodes.json для записи A: по сайту (или ключу-URL) и по имени, берём более богатый."""
+    key_raw = fa.get(KEY_A)
+    site_a = fa.get("website")
+    match_by_site = by_site.get(normalize_key(site_a)) if site_a else None
+
+    match_by_site2 = None
+    if key_raw and isinstance(key_raw, str) and key_raw.strip().lower().startswith(("http://", "https://", "www.")):
+        match_by_site2 = by_site.get(normalize_key(key_raw))
+
+    match_by_name = by_name.get(normalize_key(key_raw)) if key_raw else None
+
+    return choose_best_node(match_by_site or match_by_site2, match_by_name)
+
+def node_patch(fa: Dict[str, Any], node: Dict, types: Optional[Dict[str, str]] = None) -> Tuple[Dict[str, Any], list]:
+    """Только пустые в A поля, значения приведены к типу поля (без схемы — строкой)."""
+    attr = node.get("attr", {})
+    extracted = extract_values_from_node(attr)
+
+    patch = {}
+    filled = []
+
+    for dst_field, val in extracted.items():
+        if is_empty(fa.get(dst_field)) and val not in (None, ""):
+            patch[dst_field] = coerce_value(val, (types or {}).get(dst_field) or "singleLineText")
+            filled.append(dst_field)
+    return patch, filled
 
-    print(f"→ Загружаю A ({TABLE_A}) ...")
-    A = list_all(TABLE_A)
-    print(f"  Получено из A: {len(A)}")
+REPORT_FIELDS = ["record_id", "company", "matched", "filled_fields"]
 
+def build_updates(A: list, by_name: Dict[str, Dict], by_site: Dict[str, Dict],
+                  types: Optional[Dict[str, str]] = None, report=None) -> list:
+    """Патчи для A; строка отчёта по каждой записи-кандидату сразу уходит в report (ReportSink)."""
     to_update = []
-    report_rows = []
+    report = report or reports.NullSink()
 
     # Фильтруем записи в A, где есть хотя бы одно пустое поле из TARGET_FIELDS
-    need_fill = []
-    for rec in A:
-        fields = rec.get("fields", {})
-        if any(is_empty(fields.get(f)) for f in TARGET_FIELDS):
-            need_fill.append(rec)
+    need_fill = [rec for rec in A if needs_fill(rec.get("fields", {}))]
 
     print(f"Нужно дополнить записей: {len(need_fill)}")
 
@@ -153,18 +172,10 @@ def main(nodes_path: str, dry_run: bool = False):
         rid = rec["id"]
         fa = rec.get("fields", {})
         key_raw = fa.get(KEY_A)
-        site_a = fa.get("website")
-        match_by_site = by_site.get(normalize_key(site_a)) if site_a else None
 
-        match_by_site2 = None
-        if key_raw and isinstance(key_raw, str) and key_raw.strip().lower().startswith(("http://", "https://", "www.")):
-            match_by_site2 = by_site.get(normalize_key(key_raw))
-
-        match_by_name = by_name.get(normalize_key(key_raw)) if key_raw else None
-
-        node = choose_best_node(match_by_site or match_by_site2, match_by_name)
+        node = match_node(fa, by_name, by_site)
         if not node:
-            report_rows.append({
+            report.write({
                 "record_id": rid,
                 "company": key_raw,
                 "matched": "no",
@@ -172,43 +183,62 @@ def main(nodes_path: str, dry_run: bool = False):
             })
             continue
 
-        attr = node.get("attr", {})
-        extracted = extract_values_from_node(attr)
-
-        patch = {}
-        filled = []
-
-        for dst_field, val in extracted.items():
-            if is_empty(fa.get(dst_field)) and val not in (None, ""):
-                patch[dst_field] = str(val)
-                filled.append(dst_field)
+        patch, filled = node_patch(fa, node, types)
 
         if patch:
             to_update.append({"id": rid, "fields": patch})
 
-        report_rows.append({
+        report.write({
             "record_id": rid,
             "company": key_raw,
             "matched": "yes",
             "filled_fields": ", ".join(filled) if filled else "",
         })
+    return to_update
 
-    print(f"К обновлению записей: {len(to_update)}")
+def main(nodes_path: str, dry_run: bool = False, mirror_path: Optional[str] = None,
+         report_formats: Optional[list] = None):
+    if not AIRTABLE_TOKEN or not AIRTABLE_BASE_ID:
+        raise SystemExit("Укажи AIRTABLE_TOKEN и AIRTABLE_BASE_ID.")
 
-    if to_update:
-        batch_update(TABLE_A, to_update, dry=dry_run)
+    if not TABLE_A or not KEY_A:
+        raise SystemExit("Укажи TABLE_A и KEY_A.")
+
+    with phase("load nodes"):
+        by_name, by_site = load_nodes(nodes_path)
+    print(f"Индекс по имени: {len(by_name)}, по сайту: {len(by_site)}")
 
+    db = mirror.open_db(mirror_path) if mirror_path else None
+    if db is not None:
+        # только записи с пустыми целевыми полями — запросом к зеркалу
+        with phase("load A"):
+            A = mirror.candidates(db, TABLE_A, TARGET_FIELDS)
+        print(f"  Кандидатов из зеркала {mirror_path}: {len(A)}")
+    else:
+        print(f"→ Загружаю A ({TABLE_A}) ...")
+        with phase("load A"):
+            A = list_all(TABLE_A)
+        print(f"  Получено из A: {len(A)}")
+
+    with phase("schema fetch"):
+        types = mirror.field_types(db, TABLE_A) if db is not None else field_types(TABLE_A)
+    report = reports.ReportSink("nodes_fill_report", REPORT_FIELDS, report_formats or ["csv"], flush_every=500)
     try:
-        import csv
-        report_path = "nodes_fill_report.csv"
-        with open(report_path, "w", newline="", encoding="utf-8") as f:
-            w = csv.DictWriter(f, fieldnames=["record_id", "company", "matched", "filled_fields"])
-            w.writeheader()
-            for row in report_rows:
-                w.writerow(row)
-        print(f"Отчёт: {report_path} (строк: {len(report_rows)})")
-    except Exception as e:
-        print(f"Не удалось записать отчёт CSV: {e}")
+        with phase("match"):
+            to_update = build_updates(A, by_name, by_site, types, report)
+    finally:
+        with phase("report"):
+            report.close()
+    print(f"Отчёт: {', '.join(report.paths)} (строк: {report.rows})")
+
+    print(f"К обновлению записей: {len(to_update)}")
+
+    with phase("write"):
+        if to_update:
+            batch_update(TABLE_A, to_update, dry=dry_run, types=types,
+                         current={r["id"]: r.get("fields", {}) for r in A})
+    if db is not None and to_update and not dry_run:
+        mirror.apply_updates(db, TABLE_A, to_update)
 
     print("Готово.")
 
@@ -216,5 +246,11 @@ if __name__ == "__main__":
     ap = argparse.ArgumentParser(description="Enrich Airtable A from json (total_funding, employees_count, location, linkedin_url)")
     ap.add_argument("--nodes", required=True, help="Путь к json")
     ap.add_argument("--dry-run", action="store_true")
+    ap.add_argument("--mirror", metavar="DB", help="брать кандидатов из SQLite-зеркала (python -m src.mirror sync)")
+    reports.add_cli_args(ap)
+    metrics.add_cli_args(ap)
+    profiling.add_cli_args(ap)
     args = ap.parse_args()
-    main(args.nodes, dry_run=args.dry_run)
+    metrics.setup_from_args(args)
+    profiling.setup_from_args(args)
+    main(args.nodes, dry_run=args.dry_run, mirror_path=args.mirror, report_formats=reports.formats_from_args(args))
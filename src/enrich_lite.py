@@ -1,16 +1,15 @@
-import os, time, argparse, json, csv, urllib.parse, tldextract, itertools
-from bs4 import BeautifulSoup
-from dotenv import load_dotenv
-from dateutil import parser as dtp
+import time, argparse, urllib.parse, itertools
 from datetime import datetime, timezone
 from src.parsing_helpers import *
+from src import metrics, mirror, profiling, reports, domain_cache, page_cache as pagecache, shard as sharding
+from src.helpers import list_all, batch_update
+from src.profiling import phase
 
-load_dotenv()
-
-# ----------------- ENV / CONFIG -----------------
-AIRTABLE_TOKEN   = os.getenv("AIRTABLE_TOKEN", "")
-AIRTABLE_BASE_ID = os.getenv("AIRTABLE_BASE_ID", "")
-TABLE_A          = os.getenv("TABLE_A",)  # ID/имя Startups
+# ----------------- ENV / CONFIG (src/config.py) -----------------
+from src.config import (
+    AIRTABLE_TOKEN, AIRTABLE_BASE_ID, TABLE_A,
+    SLEEP_BETWEEN, SITE_SCHEME, PARSER_BACKEND, SITE_BUDGET, SITE_FALLBACK,
+)
 
 # Поля в Airtable
 FIELD_COMPANY = "Company name"
@@ -27,10 +26,6 @@ FIELD_SRC   = "enrichment_sources"
 FIELD_TS    = "last_enriched_at"
 FIELD_STAT  = "enrichment_status"            # success / partial / skipped / error
 
-USER_AGENT = "Mozilla/5.0 (compatible; StartupEnricher/1.0; +https://example.com/bot-info)"
-REQ_TIMEOUT = 20
-SLEEP_BETWEEN = 0.6   # секунды между запросами
-
 # Сколько страниц максимум с домена смотреть (чтобы не краулить слишком глубоко)
 MAX_PAGES_PER_SITE = 12
 
@@ -45,62 +40,18 @@ FUNDING_KEYWORDS = [
 ]
 EMAIL_NEAR_TITLES = ["ceo", "chief executive", "founder", "co-founder", "owner", "managing director"]
 
-# ----------------------------------------------------------------
-#                     AIRTABLE HELPERS
-# ----------------------------------------------------------------
-def api_root() -> str: return f"https://api.airtable.com/v0/{AIRTABLE_BASE_ID}"
-def headers() -> dict[str,str]: return {"Authorization": f"Bearer {AIRTABLE_TOKEN}", "Content-Type":"application/json"}
-
-def list_all(table: str, fields: Optional[list[str]] = None) -> list[dict[str, Any]]:
-    out, offset = [], None
-    params = []
-    if fields:
-        for f in fields: params.append(("fields[]", f))
-    while True:
-        qs = list(params)
-        if offset: qs.append(("offset", offset))
-        url = f"{api_root()}/{urllib.parse.quote(table)}"
-        r = requests.get(url, headers=headers(), params=qs, timeout=REQ_TIMEOUT)
-        if not r.ok:
-            raise RuntimeError(f"GET {url} -> {r.status_code} {r.text}")
-        j = r.json()
-        out += j.get("records", [])
-        offset = j.get("offset")
-        if not offset: break
-    return out
-
-def batch_update_safe(table: str, records: list[dict[str,Any]]):
-    """
-    Надёжный PATCH: на 422 UNKNOWN_FIELD_NAME вытаскиваем имя поля из сообщения,
-    выкидываем его из всех записей и повторяем.
-    """
-    idx = 0
-    while idx < len(records):
-        part = records[idx: idx+10]
-        url = f"{api_root()}/{urllib.parse.quote(table)}"
-        r = requests.patch(url, headers=headers(), json={"records": part}, timeout=REQ_TIMEOUT)
-        if r.ok:
-            idx += 10
-            time.sleep(0.2)
-            continue
-        if r.status_code == 422 and "UNKNOWN_FIELD_NAME" in r.text:
-            m = re.search(r'Unknown field name:\s*"([^"]+)"', r.text)
-            unknown = m.group(1) if m else None
-            if unknown:
-                for rec in records:
-                    if "fields" in rec and unknown in rec["fields"]:
-                        del rec["fields"][unknown]
-                continue
-        raise RuntimeError(f"PATCH {table} -> {r.status_code} {r.text}")
+# Целевые поля (заполняем только пустые) и проекция при загрузке A
+TARGET_FIELDS = [FIELD_LOC, FIELD_FUND, FIELD_EMP, FIELD_EMAIL, FIELD_EMAIL_R, FIELD_FIN_R]
+NEED_FIELDS = [FIELD_COMPANY, FIELD_WEBSITE] + TARGET_FIELDS + [FIELD_SRC, FIELD_TS, FIELD_STAT]
 
 # ----------------------------------------------------------------
 #                       EXTRACTORS
 # ----------------------------------------------------------------
-def discover_candidate_urls(base: str, html: str) -> list[str]:
-    soup = BeautifulSoup(html, "lxml")
+@metrics.extractor
+def discover_candidate_urls(base: str, page) -> list[str]:
     links = []
-    for a in soup.find_all("a", href=True):
-        href = a["href"].strip()
+    for href in page.hrefs():
+        href = href.strip()
         if href.startswith("#"): continue
         abs_url = urllib.parse.urljoin(base, href)
         if not abs_url.startswith(("http://", "https://")): continue
@@ -113,6 +64,7 @@ def discover_candidate_urls(base: str, html: str) -> list[str]:
             out.append(u); seen.add(u)
     return out[:MAX_PAGES_PER_SITE-1]  # -1 потому что главную тоже смотрим
 
+@metrics.extractor
 def extract_location_from_jsonld(jsonlds: list[dict[str,Any]]) -> Optional[str]:
     for obj in jsonlds:
         t = obj.get("@type")
@@ -127,6 +79,7 @@ def extract_location_from_jsonld(jsonlds: list[dict[str,Any]]) -> Optional[str]:
                 if loc: return loc
     return None
 
+@metrics.extractor
 def extract_employees_from_jsonld(jsonlds: list[dict[str,Any]]) -> Optional[str]:
     for obj in jsonlds:
         n = obj.get("numberOfEmployees")
@@ -135,163 +88,225 @@ def extract_employees_from_jsonld(jsonlds: list[dict[str,Any]]) -> Optional[str]
             if rng: return rng
     return None
 
-def count_team_cards(soup: BeautifulSoup) -> Optional[str]:
-    cand = soup.select('[class*="team"], [class*="member"], [class*="person"], [class*="staff"], [id*="team"]')
-    items = []
-    for el in cand:
-        if el.find(["img","figure"]) or el.find(re.compile("^h[1-6]$")):
-            items.append(el)
-    items = items[:200]
-    if len(items) >= 2:
-        return number_or_range(len(items))
+@metrics.extractor
+def count_team_cards(page) -> Optional[str]:
+    n = page.team_cards()
+    if n >= 2:
+        return number_or_range(n)
     return None
 
-def extract_emails(soup: BeautifulSoup) -> list[str]:
+def extract_emails(page) -> list[str]:
     emails = set()
-    for a in soup.find_all("a", href=True):
-        href = a["href"]
+    for href in page.hrefs():
         if href.lower().startswith("mailto:"):
             em = href.split("mailto:",1)[1].split("?")[0]
             if EMAIL_RE.match(em): emails.add(em)
-    for text in soup.stripped_strings:
+    for text in page.strings():
         m = EMAIL_RE.search(text)
         if m: emails.add(m.group(0))
     return list(emails)
 
-def find_ceo_email(soup: BeautifulSoup, domain: str) -> Optional[str]:
-    page_text = soup.get_text(" ", strip=True).lower()
+@metrics.extractor
+def find_ceo_email(page, domain: str) -> Optional[str]:
+    page_text = page.text().lower()
     if any(k in page_text for k in EMAIL_NEAR_TITLES):
-        emails = extract_emails(soup)
+        emails = extract_emails(page)
         emails = [e for e in emails if e.lower().endswith("@"+domain)]
         if emails:
             return emails[0]
     return None
 
-def extract_funding_from_article(html: str, url: str) -> Optional[tuple[str,str]]:
-    soup = BeautifulSoup(html, "lxml")
-    text = soup.get_text(" ", strip=True)
+@metrics.extractor
+def extract_published_date(page) -> Optional[str]:
+    from dateutil import parser as dtp
+    for attr in ["article:published_time","og:published_time","article:modified_time","og:updated_time","date"]:
+        content = page.meta_content(attr)
+        if content:
+            try:
+                return dtp.parse(content).date().isoformat()
+            except Exception:
+                pass
+    dt_attr = page.time_datetime()
+    if dt_attr:
+        try:
+            return dtp.parse(dt_attr).date().isoformat()
+        except Exception:
+            pass
+    return None
+
+@metrics.extractor
+def extract_footer_location(page) -> Optional[str]:
+    txt = page.footer_text()
+    if txt:
+        m = re.search(r"([A-Z][A-Za-z\-\s]+),\s*([A-Z][A-Za-z\-\s]+)$", txt)
+        if m:
+            return f"{m.group(1).strip()}, {m.group(2).strip()}"
+    return None
+
+@metrics.extractor
+def extract_funding_from_article(page, url: str) -> Optional[tuple[str,str]]:
+    text = page.text()
     if not (RAISED_RE.search(text) or ROUND_RE.search(text)):
         return None
     m = MONEY_RE.search(text)
     if not m: return None
     amount = normalize_money(m.groupdict())
-    dt = None
-    for attr in ["article:published_time","og:published_time","article:modified_time","og:updated_time","date"]:
-        tag = soup.find("meta", attrs={"property": attr}) or soup.find("meta", attrs={"name": attr})
-        if tag and tag.get("content"):
-            try:
-                dt = dtp.parse(tag["content"]).date().isoformat()
-                break
-            except Exception:
-                pass
-    if not dt:
-        t = soup.find("time")
-        if t and t.get("datetime"):
-            try:
-                dt = dtp.parse(t["datetime"]).date().isoformat()
-            except Exception:
-                pass
+    dt = extract_published_date(page)
     reasoning = f"{amount} via site article {('(' + dt + ')') if dt else ''} {url}"
     return amount, reasoning
 
 # ----------------------------------------------------------------
 #                      ENRICH ONE COMPANY
 # ----------------------------------------------------------------
-def enrich_from_site(website: str) -> dict[str, Any]:
+def site_domain(website: Optional[str]) -> Optional[str]:
+    """Зарегистрированный домен сайта компании — ключ краула, кеша доменов и шардов."""
+    if not website: return None
+    return registered_domain(website if website.startswith("http") else "https://" + website) or None
+
+def enrich_from_site(website: str, parser: Optional[str] = None, page_cache=None) -> dict[str, Any]:
+    return crawl_site(website, parser, page_cache)[0]
+
+# Поднять при любом изменении экстракторов ниже — факты из кеша страниц (src/page_cache.py) станут недействительны
+FACTS_VERSION = "1"
+NEWS_SLUGS = ["news","press","blog","stories","updates","media"]
+TEAM_SLUGS = ["team","people","leadership"]
+
+def home_facts(html: str, base: str, parser: str, domain: str) -> dict[str, Any]:
+    """Всё, что краул берёт с главной, — независимо от уже найденного (кешируется по отпечатку)."""
+    jsonlds = extract_jsonld(html, base)
+    with phase("parse"):
+        page = parse_page(html, parser)
+    return {
+        "jsonld_location": extract_location_from_jsonld(jsonlds),
+        "jsonld_employees": extract_employees_from_jsonld(jsonlds),
+        "candidates": discover_candidate_urls(base, page),
+        "team_count": count_team_cards(page),
+        "ceo_email": find_ceo_email(page, domain),
+        "footer_location": extract_footer_location(page),
+    }
+
+def candidate_facts(html: str, base: str, parser: str, domain: str, url: str) -> dict[str, Any]:
+    """То же для страницы-кандидата: локация, сотрудники, email, финансирование (для новостных url)."""
+    with phase("parse"):
+        page = parse_page(html, parser)
+    jsonlds = extract_jsonld(html, base)
+    ceo = find_ceo_email(page, domain)
+    if not ceo and any(sl in url.lower() for sl in TEAM_SLUGS):
+        emails = [e for e in extract_emails(page) if e.lower().endswith("@"+domain)]
+        if len(emails) == 1:
+            ceo = emails[0]
+    hit = extract_funding_from_article(page, url) if any(k in url.lower() for k in NEWS_SLUGS) else None
+    return {
+        "location": extract_location_from_jsonld(jsonlds),
+        "employees": extract_employees_from_jsonld(jsonlds) or count_team_cards(page),
+        "ceo_email": ceo,
+        "funding": list(hit) if hit else None,
+    }
+
+def page_facts(page_cache, url: str, html: str, base: str, parser: str, extract) -> tuple[dict[str, Any], bool]:
+    """
+    (факты страницы, взяты из кеша). Без page_cache или при новом отпечатке — extract().
+    Бэкенд в отпечатке: bs4 и lxml не обязаны извлекать одинаково, их факты не смешиваем.
+    """
+    if page_cache is None:
+        return extract(), False
+    fp = pagecache.fingerprint(html, FACTS_VERSION, parser, base)
+    facts = page_cache.get(url, fp)
+    metrics.record_cache("page", facts is not None)
+    if facts is not None:
+        return facts, True
+    facts = extract()
+    page_cache.put(url, fp, facts)
+    return facts, False
+
+def crawl_site(website: str, parser: Optional[str] = None, page_cache=None) -> tuple[dict[str, Any], str, bool]:
+    """
+    (найденное, исход краула, сайт не изменился). Исход — для кеша доменов: ok, empty
+    (сайт живой, извлечь нечего), robots, либо исход запроса robots.txt/главной (timeout,
+    dns, connect, http_4xx, http_5xx, error). С page_cache (PageCache) страницы с прежним
+    отпечатком не разбираются; «не изменился» — все скачанные страницы взяты из кеша.
+    """
+    parser = parser or PARSER_BACKEND
     out: dict[str, Any] = {}
     sources: list[str] = []
-    if not website:
-        return out
-
-    url0 = website if website.startswith("http") else "https://" + website
-    domain = tldextract.extract(url0).registered_domain
+    domain = site_domain(website)
     if not domain:
-        return out
-    home = f"https://{domain}/"
-
-    rp = robotparser.RobotFileParser()
-    try:
-        rp.set_url(f"https://{domain}/robots.txt"); rp.read()
-    except Exception:
-        pass
-
+        return out, "error", False
+    # общий бюджет на компанию: запросы не ждут дольше, чем осталось до deadline
+    deadline = time.monotonic() + SITE_BUDGET if SITE_BUDGET > 0 else None
+
+    # robots.txt решает и какой origin живой: с SITE_FALLBACK варианты (www, http) идут параллельно
+    origin, (rp, outcome) = first_ok(lambda o: load_robots(make_session(), f"{o}/robots.txt", deadline),
+                                     site_origins(domain, SITE_SCHEME, SITE_FALLBACK))
+    if outcome != "ok":
+        return out, outcome, False
+    home = f"{origin}/"
     sess = make_session()
 
-    # 1) Главная
-    if can_fetch(rp, home):
-        html, base = fetch(sess, home); time.sleep(SLEEP_BETWEEN)
-    else:
-        html, base = None, None
+    # 1) Главная (без неё кандидатов нет — дальше не идём)
+    if not can_fetch(rp, home):
+        return out, "robots", False
+    html, base, outcome = fetch_page(sess, home, deadline); time.sleep(SLEEP_BETWEEN)
+    if outcome != "ok":
+        return out, outcome, False
 
     candidates = []
+    unchanged = page_cache is not None
     if html and base:
-        jsonlds = extract_jsonld(html, base)
-        loc = extract_location_from_jsonld(jsonlds)
-        if loc:
-            out.setdefault("location", loc)
+        facts, cached = page_facts(page_cache, home, html, base, parser,
+                                   lambda: home_facts(html, base, parser, domain))
+        unchanged &= cached
+        if facts["jsonld_location"]:
+            out.setdefault("location", facts["jsonld_location"])
             sources.append("site:jsonld")
-        emp = extract_employees_from_jsonld(jsonlds)
-        if emp:
-            out.setdefault("employees_count", emp)
+        if facts["jsonld_employees"]:
+            out.setdefault("employees_count", facts["jsonld_employees"])
             sources.append("site:jsonld")
 
-        candidates = discover_candidate_urls(base, html)
+        candidates = facts["candidates"]
 
-        soup = BeautifulSoup(html, "lxml")
-        emp2 = count_team_cards(soup)
-        if emp2 and "employees_count" not in out:
-            out["employees_count"] = emp2
+        if facts["team_count"] and "employees_count" not in out:
+            out["employees_count"] = facts["team_count"]
             sources.append("site:team-count")
 
-        ceo = find_ceo_email(soup, domain)
-        if ceo:
-            out["ceo_email"] = ceo
+        if facts["ceo_email"]:
+            out["ceo_email"] = facts["ceo_email"]
             out["email_reasoning"] = f"Found mailto near CEO/Founder on homepage {home}"
             sources.append("site:homepage-mailto")
 
-        if "location" not in out:
-            footer = soup.find("footer")
-            if footer:
-                txt = footer.get_text(" ", strip=True)
-                m = re.search(r"([A-Z][A-Za-z\-\s]+),\s*([A-Z][A-Za-z\-\s]+)$", txt)
-                if m:
-                    out["location"] = f"{m.group(1).strip()}, {m.group(2).strip()}"
-                    sources.append("site:footer")
+        if "location" not in out and facts["footer_location"]:
+            out["location"] = facts["footer_location"]
+            sources.append("site:footer")
 
     # 2) Страницы-кандидаты
     for url in itertools.islice(candidates, 0, MAX_PAGES_PER_SITE-1):
+        if deadline is not None and time.monotonic() >= deadline:
+            metrics.inc("site_budget_exhausted")
+            break
+        if latency.is_slow(norm_domain(url)):
+            metrics.inc("site_slow_host_abandoned")
+            break
         if not can_fetch(rp, url): continue
-        html, base = fetch(sess, url); time.sleep(SLEEP_BETWEEN)
+        html, base, _ = fetch_page(sess, url, deadline); time.sleep(SLEEP_BETWEEN)
         if not html or not base: continue
-        soup = BeautifulSoup(html, "lxml")
-        jsonlds = extract_jsonld(html, base)
-
-        if "location" not in out:
-            loc = extract_location_from_jsonld(jsonlds)
-            if loc:
-                out["location"] = loc
-
-        if "employees_count" not in out:
-            emp = extract_employees_from_jsonld(jsonlds) or count_team_cards(soup)
-            if emp:
-                out["employees_count"] = emp
-
-        if FIELD_EMAIL and "ceo_email" not in out:
-            ceo = find_ceo_email(soup, domain)
-            if not ceo and any(sl in url.lower() for sl in ["team","people","leadership"]):
-                emails = [e for e in extract_emails(soup) if e.lower().endswith("@"+domain)]
-                if len(emails) == 1:
-                    ceo = emails[0]
-            if ceo:
-                out["ceo_email"] = ceo
-                out.setdefault("email_reasoning", f"Found corporate email on {url}")
-
-        if "total_funding" not in out and any(k in url.lower() for k in ["news","press","blog","stories","updates","media"]):
-            hit = extract_funding_from_article(html, url)
-            if hit:
-                amount, finr = hit
-                out["total_funding"] = amount
-                out.setdefault("financials_reasoning", finr)
+        facts, cached = page_facts(page_cache, url, html, base, parser,
+                                   lambda: candidate_facts(html, base, parser, domain, url))
+        unchanged &= cached
+
+        if "location" not in out and facts["location"]:
+            out["location"] = facts["location"]
+
+        if "employees_count" not in out and facts["employees"]:
+            out["employees_count"] = facts["employees"]
+
+        if FIELD_EMAIL and "ceo_email" not in out and facts["ceo_email"]:
+            out["ceo_email"] = facts["ceo_email"]
+            out.setdefault("email_reasoning", f"Found corporate email on {url}")
+
+        if "total_funding" not in out and facts["funding"]:
+            amount, finr = facts["funding"]
+            out["total_funding"] = amount
+            out.setdefault("financials_reasoning", finr)
 
         if all(k in out for k in ["location","employees_count","total_funding","ceo_email"]):
             break
@@ -302,96 +317,168 @@ def enrich_from_site(website: str) -> dict[str, Any]:
     if "total_funding" in out and "financials_reasoning" not in out:
         out["financials_reasoning"] = f"{out['total_funding']} (from site)"
     if "ceo_email" in out and "email_reasoning" not in out:
-        out["email_reasoning"] = f"Found mailto on site"
-
-    return out
+        out["email_reasoning"] = "Found mailto on site"
+
+    return out, "ok" if out else "empty", unchanged
+
+def site_patch(f: dict[str, Any], found: dict[str, Any], counters: Optional[dict[str, int]] = None) -> tuple[dict[str, Any], list[str]]:
+    """Патч из найденного на сайте: только в пустые поля + служебные TS/STAT."""
+    patch: dict[str,Any] = {}
+    inserted_fields: list[str] = []
+
+    # пишем только в пустые
+    for key in [FIELD_LOC, FIELD_FUND, FIELD_EMP, FIELD_EMAIL, FIELD_EMAIL_R, FIELD_FIN_R, FIELD_SRC]:
+        if not key: continue
+        if key in found:
+            cur = f.get(key)
+            empty = (cur is None) or (cur == "") or (isinstance(cur, list) and len(cur) == 0)
+            if empty:
+                patch[key] = found[key]
+                if counters is not None and key in counters:
+                    counters[key] += 1
+                if key in TARGET_FIELDS:
+                    inserted_fields.append(key)
+
+    if patch:
+        patch.setdefault(FIELD_TS, datetime.now(timezone.utc).isoformat())
+        patch.setdefault(FIELD_STAT, "partial" if len(inserted_fields) < 3 else "success")
+    return patch, inserted_fields
+
+def outcome_status(outcome: str) -> str:
+    """Значение enrichment_status для неудачного краула."""
+    if outcome == "robots": return "skipped: robots.txt"
+    if outcome == "empty": return "skipped: nothing extractable"
+    return f"error: {outcome}"
+
+def enrich_record(f: dict[str, Any], parser: Optional[str] = None, counters: Optional[dict[str, int]] = None,
+                  cache=None, page_cache=None) -> tuple[dict[str, Any], list[str]]:
+    """
+    Патч записи и вставленные целевые поля. Если с сайта ничего не взяли — патч только
+    со статусом исхода (error: timeout, skipped: robots.txt, ...); исход пишется в cache (DomainCache).
+    Сайт, ни одна страница которого не изменилась (page_cache), без новых полей не даёт
+    никакого патча — статус и last_enriched_at остаются от прошлого прогона.
+    """
+    try:
+        with metrics.timer("enrich_site_seconds"), phase("crawl"):
+            found, outcome, unchanged = crawl_site(f.get(FIELD_WEBSITE), parser=parser, page_cache=page_cache)
+    except Exception as e:
+        print(f"  ! {f.get(FIELD_WEBSITE)}: краул упал: {e!r}")
+        found, outcome, unchanged = {}, "error", False
+    metrics.inc("site_crawl_outcomes", outcome=outcome)
+    if cache is not None:
+        cache.record(site_domain(f.get(FIELD_WEBSITE)), outcome)
+    patch, inserted_fields = site_patch(f, found, counters)
+    if unchanged:
+        metrics.inc("site_unchanged")
+        if not inserted_fields:
+            return {}, []
+    if not patch and outcome != "ok":
+        patch = {FIELD_STAT: outcome_status(outcome)}
+    return patch, inserted_fields
+
+def schedulable(targets: list[dict[str, Any]], cache) -> tuple[list[dict[str, Any]], int]:
+    """Отсекает записи, чей домен в кеше ждёт перепроверки: (к краулу, пропущено)."""
+    if cache is None: return targets, 0
+    live = [r for r in targets if not cache.blocked(site_domain(r.get("fields", {}).get(FIELD_WEBSITE)))]
+    return live, len(targets) - len(live)
+
+def is_target(f: dict[str, Any]) -> bool:
+    """Есть сайт и хотя бы одно пустое целевое поле."""
+    return bool(f.get(FIELD_WEBSITE)) and any(not f.get(x) for x in TARGET_FIELDS)
+
+REPORT_FIELDS = ["record_id","company","website","inserted_fields",FIELD_STAT,FIELD_LOC,FIELD_EMP,FIELD_FUND,FIELD_EMAIL,FIELD_EMAIL_R,FIELD_FIN_R]
+
+def shard_key(r: dict[str, Any], by: str = "domain") -> str:
+    """Ключ шардирования: зарегистрированный домен сайта (как в enrich_from_site), иначе id записи."""
+    if by == "domain":
+        domain = site_domain(r.get("fields", {}).get(FIELD_WEBSITE))
+        if domain: return domain
+    return r["id"]
+
+def report_row(rid: str, f: dict[str, Any], patch: dict[str, Any], inserted_fields: list[str]) -> dict[str, Any]:
+    # строка отчёта на каждый отправляемый патч (без вставленных полей — только статус исхода краула)
+    return {
+        "record_id": rid,
+        "company": f.get(FIELD_COMPANY) or "",
+        "website": f.get(FIELD_WEBSITE) or "",
+        "inserted_fields": ", ".join(inserted_fields) if inserted_fields else "",
+        FIELD_STAT: patch.get(FIELD_STAT, ""),
+        FIELD_LOC: patch.get(FIELD_LOC, ""),
+        FIELD_EMP: patch.get(FIELD_EMP, ""),
+        FIELD_FUND: patch.get(FIELD_FUND, ""),
+        FIELD_EMAIL: patch.get(FIELD_EMAIL, ""),
+        FIELD_EMAIL_R: patch.get(FIELD_EMAIL_R, ""),
+        FIELD_FIN_R: patch.get(FIELD_FIN_R, "")
+    }
 
 # ----------------------------------------------------------------
 #                         MAIN LOGIC
 # ----------------------------------------------------------------
-def main(limit: int, dry_run: bool):
+def main(limit: int, dry_run: bool, parser: Optional[str] = None, mirror_path: Optional[str] = None,
+         report_formats: Optional[list[str]] = None, shard: Optional[tuple[int, int]] = None, shard_by: str = "domain",
+         cache=None, page_cache=None):
     if not AIRTABLE_TOKEN or not AIRTABLE_BASE_ID:
         raise SystemExit("Set AIRTABLE_TOKEN and AIRTABLE_BASE_ID")
 
     run_ts = datetime.now(timezone.utc).strftime("%Y%m%d_%H%M%S")
-    report_csv = f"enrichment_report_{run_ts}.csv"
-    report_jsonl = f"enrichment_report_{run_ts}.jsonl"
-
-    target_fields = [FIELD_LOC, FIELD_FUND, FIELD_EMP, FIELD_EMAIL, FIELD_EMAIL_R, FIELD_FIN_R]
-    need_fields = [FIELD_COMPANY, FIELD_WEBSITE] + target_fields + [FIELD_SRC, FIELD_TS, FIELD_STAT]
-    recs = list_all(TABLE_A, fields=need_fields)
-    print(f"→ Loaded records from A: {len(recs)}")
-
-    # кандидаты с пустыми целевыми полями
-    targets = []
-    for r in recs:
-        f = r.get("fields", {})
-        if any(not f.get(x) for x in target_fields):
-            if f.get(FIELD_WEBSITE):
-                targets.append(r)
-    print(f"→ To enrich: {len(targets)} (have website)")
+    # у каждого шарда свой отчёт-журнал; свести: python -m src.reports merge enrichment_report_*_shard*.jsonl
+    report_base = f"enrichment_report_{run_ts}{sharding.tag(shard)}"
+
+    target_fields = TARGET_FIELDS
+    db = mirror.open_db(mirror_path) if mirror_path else None
+    if db is not None:
+        # кандидаты — индексным запросом по флагам пустоты в зеркале
+        with phase("load A"):
+            targets = mirror.candidates(db, TABLE_A, TARGET_FIELDS, require=[FIELD_WEBSITE])
+        print(f"→ Loaded candidates from mirror {mirror_path}")
+    else:
+        with phase("load A"):
+            recs = list_all(TABLE_A, fields=NEED_FIELDS)
+        print(f"→ Loaded records from A: {len(recs)}")
+
+        # кандидаты с пустыми целевыми полями
+        targets = [r for r in recs if is_target(r.get("fields", {}))]
+    if shard is not None:
+        targets = [r for r in targets if sharding.in_shard(shard_key(r, shard_by), shard)]
+        print(f"→ Shard {shard[0]}/{shard[1]} by {shard_by}")
+    # домены, которые ещё рано перепроверять (мёртвые, блокирующие, пустые), не тратят --limit
+    targets, n_cached = schedulable(targets, cache)
+    print(f"→ To enrich: {len(targets)} (have website) | skipped by domain cache: {n_cached}")
 
     updates: list[dict[str,Any]] = []
-    report_rows: list[dict[str, Any]] = []
-    skipped = 0
+    preview: list[dict[str, Any]] = []
+    skipped = status_only = 0
 
     field_insert_counters = {k: 0 for k in target_fields}
 
-    for r in targets[:limit]:
-        f = r.get("fields", {})
-        site = f.get(FIELD_WEBSITE)
-        name = f.get(FIELD_COMPANY)
-        rid = r["id"]
-
-        try:
-            found = enrich_from_site(site)
-        except Exception as e:
-            found = {}
-
-        patch: dict[str,Any] = {}
-        inserted_fields: list[str] = []
-
-        # пишем только в пустые
-        for key in [FIELD_LOC, FIELD_FUND, FIELD_EMP, FIELD_EMAIL, FIELD_EMAIL_R, FIELD_FIN_R, FIELD_SRC]:
-            if not key: continue
-            if key in found:
-                cur = f.get(key)
-                empty = (cur is None) or (cur == "") or (isinstance(cur, list) and len(cur) == 0)
-                if empty:
-                    patch[key] = found[key]
-                    if key in field_insert_counters:
-                        field_insert_counters[key] += 1
-                    if key in target_fields:
-                        inserted_fields.append(key)
-
-        if patch:
-            patch.setdefault(FIELD_TS, datetime.now(timezone.utc).isoformat())
-            patch.setdefault(FIELD_STAT, "partial" if len(inserted_fields) < 3 else "success")
-            updates.append({"id": rid, "fields": patch})
-
-            # строка отчёта (только то, что реально вставляется)
-            row = {
-                "record_id": rid,
-                "company": name or "",
-                "website": site or "",
-                "inserted_fields": ", ".join(inserted_fields) if inserted_fields else "",
-                FIELD_LOC: patch.get(FIELD_LOC, ""),
-                FIELD_EMP: patch.get(FIELD_EMP, ""),
-                FIELD_FUND: patch.get(FIELD_FUND, ""),
-                FIELD_EMAIL: patch.get(FIELD_EMAIL, ""),
-                FIELD_EMAIL_R: patch.get(FIELD_EMAIL_R, ""),
-                FIELD_FIN_R: patch.get(FIELD_FIN_R, "")
-            }
-            report_rows.append(row)
-        else:
-            skipped += 1
-
-        time.sleep(0.2)  # общий rate-limit
-
-    print(f"→ Will update: {len(updates)} | skipped (nothing new): {skipped}")
+    # отчёт пишется по мере обогащения — прерванный прогон оставляет всё, что успел
+    report = reports.ReportSink(report_base, REPORT_FIELDS, report_formats or ["csv", "jsonl"], flush_every=10)
+    try:
+        for r in targets[:limit]:
+            f = r.get("fields", {})
+            rid = r["id"]
+
+            patch, inserted_fields = enrich_record(f, parser=parser, counters=field_insert_counters, cache=cache,
+                                                   page_cache=page_cache)
+
+            if patch:
+                updates.append({"id": rid, "fields": patch})
+                row = report_row(rid, f, patch, inserted_fields)
+                report.write(row)
+                if inserted_fields:
+                    if len(preview) < 5: preview.append(row)
+                else:
+                    # патч без вставленных полей — только enrichment_status с исходом краула
+                    status_only += 1
+            else:
+                skipped += 1
+    finally:
+        with phase("report"):
+            report.close(drop_empty=True)
+
+    print(f"→ Will update: {len(updates)} (status only: {status_only}) | skipped (nothing new): {skipped}")
 
     # Печатаем превью отчёта (до отправки)
-    preview = report_rows[:5]
     if preview:
         print("\nPreview of inserted data (first 5):")
         for row in preview:
@@ -399,47 +486,39 @@ def main(limit: int, dry_run: bool):
 
     # Отправляем изменени
     if not dry_run and updates:
-        batch_update_safe(TABLE_A, updates)
+        with phase("write"):
+            batch_update(TABLE_A, updates, drop_unknown=True, current={r["id"]: r.get("fields", {}) for r in targets[:limit]})
+        if db is not None:
+            mirror.apply_updates(db, TABLE_A, updates)
         print("Updated in Airtable.")
     elif dry_run:
         print("DRY-RUN only. No changes sent.")
 
-    #Сохраняем отчёт
-    if report_rows:
-        # CSV
-        csv_fields = ["record_id","company","website","inserted_fields",FIELD_LOC,FIELD_EMP,FIELD_FUND,FIELD_EMAIL,FIELD_EMAIL_R,FIELD_FIN_R]
-        try:
-            with open(report_csv, "w", newline="", encoding="utf-8") as f:
-                w = csv.DictWriter(f, fieldnames=csv_fields)
-                w.writeheader()
-                for row in report_rows:
-                    w.writerow(row)
-            print(f"CSV report saved: {report_csv}")
-        except Exception as e:
-            print(f"Failed to write CSV report: {e}")
-
-        # JSONL
-        try:
-            with open(report_jsonl, "w", encoding="utf-8") as f:
-                for row in report_rows:
-                    f.write(json.dumps(row, ensure_ascii=False) + "\n")
-            print(f"JSONL report saved: {report_jsonl}")
-        except Exception as e:
-            print(f"Failed to write JSONL report: {e}")
-
     # Финальная сводка
     print("\n==== SUMMARY ====")
-    print(f"Updated records: {len(updates)}")
+    print(f"Updated records: {len(updates)} (status only, crawl outcome: {status_only})")
     for k in target_fields:
         print(f"- inserted {k}: {field_insert_counters[k]}")
     print(f"Skipped (nothing to insert): {skipped}")
-    if report_rows:
-        print(f"Report files: {report_csv} and {report_jsonl}")
+    if report.paths:
+        print(f"Report files: {' and '.join(report.paths)}")
     print("=================\n")
 
 if __name__ == "__main__":
     ap = argparse.ArgumentParser(description="Lite enrichment from company websites (no paid APIs) with reporting")
     ap.add_argument("--limit", type=int, default=10, help="сколько компаний обрабатывать за один запуск")
     ap.add_argument("--dry-run", action="store_true")
+    ap.add_argument("--parser", choices=PARSER_BACKENDS, default=PARSER_BACKEND, help="HTML backend for extractors")
+    ap.add_argument("--mirror", metavar="DB", help="select candidates from the SQLite mirror (python -m src.mirror sync)")
+    reports.add_cli_args(ap, default="csv,jsonl")
+    sharding.add_cli_args(ap)
+    domain_cache.add_cli_args(ap)
+    pagecache.add_cli_args(ap)
+    metrics.add_cli_args(ap)
+    profiling.add_cli_args(ap)
     args = ap.parse_args()
-    main(limit=args.limit, dry_run=args.dry_run)
+    metrics.setup_from_args(args)
+    profiling.setup_from_args(args)
+    main(limit=args.limit, dry_run=args.dry_run, parser=args.parser, mirror_path=args.mirror,
+         report_formats=reports.formats_from_args(args), shard=sharding.parse_shard(args.shard), shard_by=args.shard_by,
+         cache=domain_cache.open_from_args(args), page_cache=pagecache.open_from_args(args))
@@ -1,23 +1,114 @@
+import contextvars
+import re
+import threading
 import time
 import urllib.parse
 import requests
+from contextlib import contextmanager
 from typing import Any
 
-from src.main import AIRTABLE_BASE_ID, AIRTABLE_TOKEN
+from src import metrics
+from src.config import AIRTABLE_API_URL, AIRTABLE_BASE_ID, AIRTABLE_TOKEN, AIRTABLE_RPS
 
+RETRIES, BASE_WAIT = 6, 0.6
+
+
+# База текущего задания. По умолчанию AIRTABLE_BASE_ID; src.jobs гоняет несколько
+# баз в одном процессе — каждое задание в своём потоке внутри use_base(...).
+_base_id: contextvars.ContextVar[str | None] = contextvars.ContextVar("airtable_base_id", default=None)
+
+def base_id() -> str:
+    return _base_id.get() or AIRTABLE_BASE_ID
+
+@contextmanager
+def use_base(bid: str):
+    token = _base_id.set(bid)
+    try:
+        yield
+    finally:
+        _base_id.reset(token)
 
 def api_root() -> str:
-    return f"https://api.airtable.com/v0/{AIRTABLE_BASE_ID}"
+    return f"{AIRTABLE_API_URL}/{base_id()}"
 
 def headers() -> dict[str, str]:
     return {"Authorization": f"Bearer {AIRTABLE_TOKEN}", "Content-Type": "application/json"}
 
+
+class RateLimiter:
+    """
+    Равномерный лимит запросов в секунду (Airtable: 5 req/s на базу). Общий для
+    потоков; reserve() занимает слот и возвращает, сколько ждать — так им же
+    пользуется асинхронный клиент (asyncio.sleep вместо time.sleep).
+    """
+
+    def __init__(self, rps: float):
+        self.interval = 1.0 / rps if rps > 0 else 0.0
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        if not self.interval: return 0.0
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next)
+            self._next = slot + self.interval
+            return slot - now
+
+    def wait(self):
+        d = self.reserve()
+        if d > 0: time.sleep(d)
+
+_limiters: dict[str, RateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+def limiter_for(bid: str) -> RateLimiter:
+    """Лимитер базы (лимит Airtable — на базу): один на процесс для всех потоков и клиентов."""
+    with _limiters_lock:
+        if bid not in _limiters:
+            _limiters[bid] = RateLimiter(AIRTABLE_RPS)
+        return _limiters[bid]
+
+def set_rps(bid: str, rps: float) -> RateLimiter:
+    """Явный лимит базы (rps задания в src.jobs) вместо AIRTABLE_RPS — до начала запросов к ней."""
+    with _limiters_lock:
+        _limiters[bid] = RateLimiter(rps)
+        return _limiters[bid]
+
+_session = None
+_session_lock = threading.Lock()
+
+def http() -> requests.Session:
+    """Общая сессия (keep-alive, пул соединений) для всех запросов к Airtable из всех потоков."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            from requests.adapters import HTTPAdapter
+            _session = requests.Session()
+            _session.mount("https://", HTTPAdapter(pool_maxsize=32))
+            _session.mount("http://", HTTPAdapter(pool_maxsize=32))
+        return _session
+
+def retry_wait(r, attempt: int) -> float | None:
+    """Сколько ждать перед повтором (429 / 5xx, с учётом Retry-After) или None — не повторять."""
+    if r.status_code == 429 or r.status_code >= 500:
+        return float(r.headers.get("Retry-After", BASE_WAIT * attempt))
+    return None
+
 def retry_request(method, url, **kw):
-    retries, base_wait = 6, 0.6
-    for attempt in range(1, retries + 1):
-        r = requests.request(method, url, headers=headers(), **kw)
-        if r.status_code in (429,) or r.status_code >= 500:
-            wait = float(r.headers.get("Retry-After", base_wait * attempt))
+    lim = limiter_for(base_id())
+    for attempt in range(1, RETRIES + 1):
+        lim.wait()
+        t0 = time.perf_counter()
+        try:
+            r = http().request(method, url, headers=headers(), **kw)
+        except Exception:
+            metrics.record_airtable(method, url, None, time.perf_counter() - t0, metrics.payload_size(kw))
+            raise
+        metrics.record_airtable(method, url, r, time.perf_counter() - t0, metrics.payload_size(kw))
+        wait = retry_wait(r, attempt)
+        if wait is not None and attempt < RETRIES:
+            metrics.record_retry(method, url, wait)
             time.sleep(wait); continue
         return r
     return r
@@ -76,6 +167,121 @@ def sanitize_option_label(s: str) -> str:
     if s.startswith("'") and s.endswith("'"): s = s[1:-1].strip()
     return s
 
+_schema_cache: dict[str,Any] = {}
+
+def get_base_schema(refresh: bool = False) -> dict[str,Any] | None:
+    """Схема базы из meta API (нужен scope schema.bases:read) или None. Успешный ответ кешируется на процесс по base id."""
+    bid = base_id()
+    if bid in _schema_cache and not refresh:
+        return _schema_cache[bid]
+    url = f"{AIRTABLE_API_URL}/meta/bases/{bid}/tables"
+    r = retry_request("GET", url)
+    if not r.ok:
+        return None
+    try:
+        _schema_cache[bid] = r.json()
+    except Exception:
+        return None
+    return _schema_cache[bid]
+
+def options_from_schema(schema: dict[str,Any] | None, table: str, field_name: str) -> set | None:
+    try:
+        for t in (schema or {}).get("tables", []):
+            if t["id"] == table or t["name"] == table:
+                for f in t["fields"]:
+                    if f["name"] == field_name and f.get("type") in ("multipleSelects", "singleSelect"):
+                        choices = f.get("options", {}).get("choices", [])
+                        return {c["name"] for c in choices if "name" in c}
+    except Exception:
+        pass
+    return None
+
+def types_from_schema(schema: dict[str,Any] | None, table: str) -> dict[str,str]:
+    """{имя поля: тип} таблицы из схемы; {} если схемы нет."""
+    for t in (schema or {}).get("tables", []):
+        if t.get("id") == table or t.get("name") == table:
+            return {f["name"]: f.get("type", "") for f in t.get("fields", []) if "name" in f}
+    return {}
+
+def field_types(table: str) -> dict[str,str]:
+    """Типы полей из meta API; без scope schema.bases:read — {} (значения сравниваются без типа)."""
+    return types_from_schema(get_base_schema(), table)
+
+# ----------------------------------------------------------------
+#   Diff перед записью: значения приводятся к типу поля, поля, равные
+#   текущему значению, не отправляются, патчи одной записи склеиваются.
+# ----------------------------------------------------------------
+NUMBER_TYPES = {"number", "currency", "percent", "rating", "duration"}
+TEXT_TYPES = {"singleLineText", "multilineText", "richText", "email", "phoneNumber", "singleSelect"}
+
+def _as_number(v: Any) -> float | int | None:
+    if isinstance(v, bool): return None
+    if isinstance(v, (int, float)): n = v
+    else:
+        s = re.sub(r"[\s,_$€£]", "", str(v))
+        try: n = float(s)
+        except ValueError: return None
+    return int(n) if float(n).is_integer() else n
+
+def coerce_value(v: Any, ftype: str | None = None) -> Any:
+    """Значение в форме, которую ждёт поле данного типа (без типа — как есть)."""
+    if v is None: return None
+    if ftype in NUMBER_TYPES:
+        n = _as_number(v)
+        return n if n is not None else v
+    if ftype == "multipleSelects":
+        return to_multi_select(unwrap_value(v) if isinstance(v, list) and v and isinstance(v[0], dict) else v)
+    if ftype in TEXT_TYPES or ftype == "url":
+        v = unwrap_value(v)
+        if isinstance(v, float) and v.is_integer(): v = int(v)   # 12000000.0 -> "12000000"
+        return str(v).strip() if v is not None else None
+    return v
+
+def normalize_value(v: Any, ftype: str | None = None) -> Any:
+    """Ключ сравнения: одинаковые по смыслу значения дают равные ключи."""
+    v = coerce_value(v, ftype)
+    if v is None or v == "" or v == [] or v == {}: return None
+    if ftype == "multipleSelects" or isinstance(v, list):
+        return tuple(sorted(str(unwrap_value(x)).strip() for x in v))
+    if ftype == "url":
+        return normalize_key(v)
+    if isinstance(v, dict) and "name" in v:
+        v = v["name"]
+    # как число — только числовые поля: '12,5', '+1 555 0100', '$1,000' в тексте — разные строки
+    if ftype in NUMBER_TYPES and not isinstance(v, dict):
+        n = _as_number(v)
+        if n is not None: return n
+    if isinstance(v, str): return " ".join(v.split())
+    if isinstance(v, float) and v.is_integer(): return int(v)
+    return v
+
+def diff_patch(current: dict[str,Any], patch: dict[str,Any], types: dict[str,str] | None = None) -> dict[str,Any]:
+    """Патч без полей, совпадающих с текущими значениями; значения приведены к типу поля."""
+    types = types or {}
+    out = {}
+    for k, v in patch.items():
+        ft = types.get(k)
+        if normalize_value(v, ft) == normalize_value(current.get(k), ft): continue
+        out[k] = coerce_value(v, ft)
+    return out
+
+def coalesce_updates(recs: list[dict[str,Any]], current: dict[str, dict[str,Any]] | None = None,
+                     types: dict[str,str] | None = None) -> list[dict[str,Any]]:
+    """
+    Склеивает патчи по id (поздний выигрывает), выкидывает no-op поля относительно
+    current ({id: fields}) и пустые патчи. Порядок — по первому появлению id.
+    """
+    merged: dict[str, dict[str,Any]] = {}
+    for rec in recs:
+        merged.setdefault(rec["id"], {}).update(rec.get("fields", {}))
+    out = []
+    for rid, fields in merged.items():
+        fields = diff_patch((current or {}).get(rid, {}), fields, types)
+        if fields:
+            out.append({"id": rid, "fields": fields})
+    metrics.inc("airtable_patch_fields_dropped", sum(len(r.get("fields", {})) for r in recs) - sum(len(r["fields"]) for r in out))
+    return out
+
 def get_allowed_multiselect_options(table: str, field_name: str) -> set | None:
     """
     Пытаемся получить список допустимых опций для мультиселекта:
@@ -83,61 +289,92 @@ def get_allowed_multiselect_options(table: str, field_name: str) -> set | None:
     2) если нет прав — соберём из уже существующих данных в A.
     """
     # (1) meta API
-    url = f"https://api.airtable.com/v0/meta/bases/{AIRTABLE_BASE_ID}/tables"
-    r = retry_request("GET", url)
-    if r.ok:
-        try:
-            for t in r.json().get("tables", []):
-                if t["id"] == table or t["name"] == table:
-                    for f in t["fields"]:
-                        if f["name"] == field_name and f.get("type") in ("multipleSelects", "singleSelect"):
-                            choices = f.get("options", {}).get("choices", [])
-                            return {c["name"] for c in choices if "name" in c}
-        except Exception:
-            pass
+    opts = options_from_schema(get_base_schema(), table, field_name)
+    if opts is not None:
+        return opts
     # (2) fallback из данных
-    allowed = set()
     try:
-        for rec in list_all(table):
-            vals = rec.get("fields", {}).get(field_name)
-            if isinstance(vals, list):
-                for v in vals:
-                    if isinstance(v, str):
-                        allowed.add(v)
-                    elif isinstance(v, dict) and "name" in v:
-                        allowed.add(v["name"])
+        return options_from_records(list_all(table), field_name)
     except Exception:
-        pass
+        return None
+
+def options_from_records(recs: list[dict[str,Any]], field_name: str) -> set | None:
+    allowed = set()
+    for rec in recs:
+        vals = rec.get("fields", {}).get(field_name)
+        if isinstance(vals, list):
+            for v in vals:
+                if isinstance(v, str):
+                    allowed.add(v)
+                elif isinstance(v, dict) and "name" in v:
+                    allowed.add(v["name"])
     return allowed or None
 
-def list_all(table: str) -> list[dict[str,Any]]:
-    out, offset = [], None
+def list_all(table: str, fields: list[str] | None = None, formula: str | None = None) -> list[dict[str,Any]]:
+    return list(iter_all(table, fields, formula))
+
+def iter_all(table: str, fields: list[str] | None = None, formula: str | None = None):
+    """Записи таблицы постранично, по мере ответа Airtable (для src.records — без сырой копии всей таблицы)."""
+    offset = None
+    params = [("fields[]", f) for f in (fields or [])]
+    if formula: params.append(("filterByFormula", formula))
     while True:
-        qs = []
+        qs = list(params)
         if offset: qs.append(("offset", offset))
         url = f"{api_root()}/{urllib.parse.quote(table)}"
         r = retry_request("GET", url, params=qs)
         if not r.ok:
             raise RuntimeError(f"GET {url} -> {r.status_code} {r.text}")
         j = r.json()
-        out += j.get("records", [])
+        yield from j.get("records", [])
         offset = j.get("offset")
         if not offset: break
+
+def drop_unknown_field(r, recs: list[dict[str,Any]]) -> str | None:
+    """
+    На 422 UNKNOWN_FIELD_NAME вытаскиваем имя поля из сообщения и выкидываем
+    его из всех записей. Возвращает имя поля.
+    """
+    if r.status_code != 422 or "UNKNOWN_FIELD_NAME" not in r.text:
+        return None
+    m = re.search(r'Unknown field name:\s*"([^"]+)"', r.text)
+    unknown = m.group(1) if m else None
+    if unknown:
+        for rec in recs:
+            if "fields" in rec and unknown in rec["fields"]:
+                del rec["fields"][unknown]
+    return unknown
+
+def _batch_write(method: str, table: str, recs: list[dict[str,Any]], dry=False, drop_unknown=False) -> list[dict[str,Any]]:
+    out = []
+    idx = 0
+    while idx < len(recs):
+        part = recs[idx: idx+10]
+        if dry: print(f"[DRY] {method} {table}: {len(part)}"); idx += 10; continue
+        r = retry_request(method, f"{api_root()}/{urllib.parse.quote(table)}", json={"records": part})
+        if not r.ok:
+            if drop_unknown and drop_unknown_field(r, recs):
+                if method == "PATCH":
+                    # патчи, в которых ничего не осталось, не отправляем — пачки остаются полными
+                    recs[idx:] = [x for x in recs[idx:] if x.get("fields")]
+                continue
+            raise RuntimeError(f"{method} {table} -> {r.status_code} {r.text}")
+        out += r.json().get("records", [])
+        idx += 10
     return out
 
-def batch_create(table: str, recs: list[dict[str,Any]], dry=False):
-    for part in chunks(recs, 10):
-        if dry: print(f"[DRY] POST {table}: {len(part)}"); continue
-        r = retry_request("POST", f"{api_root()}/{urllib.parse.quote(table)}", json={"records": part})
-        if not r.ok: raise RuntimeError(f"POST {table} -> {r.status_code} {r.text}")
-        time.sleep(0.2)
+def batch_create(table: str, recs: list[dict[str,Any]], dry=False, drop_unknown=False) -> list[dict[str,Any]]:
+    """Возвращает созданные записи (с id) — в dry-режиме пустой список."""
+    return _batch_write("POST", table, recs, dry=dry, drop_unknown=drop_unknown)
 
-def batch_update(table: str, recs: list[dict[str,Any]], dry=False):
-    for part in chunks(recs, 10):
-        if dry: print(f"[DRY] PATCH {table}: {len(part)}"); continue
-        r = retry_request("PATCH", f"{api_root()}/{urllib.parse.quote(table)}", json={"records": part})
-        if not r.ok: raise RuntimeError(f"PATCH {table} -> {r.status_code} {r.text}")
-        time.sleep(0.2)
+def batch_update(table: str, recs: list[dict[str,Any]], dry=False, drop_unknown=False,
+                 current: dict[str, dict[str,Any]] | None = None, types: dict[str,str] | None = None) -> list[dict[str,Any]]:
+    """
+    PATCH через coalesce_updates: одна запись на id, без no-op полей, пачки по 10.
+    current — {id: текущие fields} для сравнения; types — типы полей (по умолчанию из meta API).
+    """
+    if types is None: types = field_types(table)
+    return _batch_write("PATCH", table, coalesce_updates(recs, current, types), dry=dry, drop_unknown=drop_unknown)
 
 def batch_delete(table: str, ids: list[str], dry=False):
     for part in chunks(ids, 10):
@@ -146,4 +383,3 @@ def batch_delete(table: str, ids: list[str], dry=False):
         params = [("records[]", rid) for rid in part]
         r = retry_request("DELETE", url, params=params)
         if not r.ok: raise RuntimeError(f"DELETE {table} -> {r.status_code} {r.text}")
-        time.sleep(0.2)
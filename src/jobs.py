@@ -0,0 +1,124 @@
+"""
+Merge B -> A для нескольких баз и пар таблиц из одного файла заданий — параллельно,
+в одном процессе, вместо запуска src.main по процессу на базу.
+
+    python -m src.jobs jobs.yaml [--only climate,food] [--concurrency 4] [--dry-run]
+
+Лимит Airtable — на базу: у каждой базы свой лимитер (helpers.limiter_for, rps задания —
+helpers.set_rps), задания одной базы делят его. Сессия с пулом соединений и кеш схем — общие на процесс.
+Формат файла (YAML или JSON) — jobs.example.yaml: defaults + список jobs.
+Задания читают A/B из Airtable: SQLite-зеркало (src.mirror) синхронизирует только базу
+и ключи из env, поэтому для заданий оно не поддерживается.
+"""
+import argparse
+import json
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any
+
+from src import helpers, metrics, profiling, reports
+from src import main as merge
+from src.config import AIRTABLE_TOKEN
+
+JOB_KEYS = {"name", "base", "table_a", "table_b", "key_a", "key_b",
+            "field_map", "force_string", "multi_select", "rps"}
+REQUIRED = ("base", "table_a", "table_b")
+
+
+def read_spec(path: str) -> dict[str, Any]:
+    with open(path, encoding="utf-8") as f:
+        if path.endswith((".yaml", ".yml")):
+            try:
+                import yaml
+            except ImportError:
+                raise SystemExit("Файл заданий в YAML требует PyYAML: pip install pyyaml (или используйте JSON)")
+            return yaml.safe_load(f) or {}
+        return json.load(f)
+
+def jobs_from_spec(spec: dict[str, Any]) -> list[merge.MergeJob]:
+    """
+    Задания из спеки: каждое — defaults, перекрытые своими ключами. rps — лимит
+    базы (запросов/с); задания одной базы не могут просить разный.
+    """
+    defaults = spec.get("defaults") or {}
+    jobs, names = [], set()
+    rps_by_base: dict[str, float] = {}
+    for i, item in enumerate(spec.get("jobs") or [], 1):
+        cfg = {**defaults, **item}
+        name = str(cfg.get("name") or f"job{i}")
+        unknown = set(cfg) - JOB_KEYS
+        if unknown:
+            raise SystemExit(f"Задание {name}: неизвестные ключи {sorted(unknown)} (есть: {', '.join(sorted(JOB_KEYS))})")
+        missing = [k for k in REQUIRED if not cfg.get(k)]
+        if missing:
+            raise SystemExit(f"Задание {name}: не указаны {', '.join(missing)}")
+        if name in names or name == "default":
+            raise SystemExit(f"Задание {name}: имя должно быть уникальным и не 'default'")
+        names.add(name)
+        kw = {k: cfg[k] for k in ("key_a", "key_b", "field_map", "force_string", "multi_select") if k in cfg}
+        if cfg.get("rps") is not None:
+            kw["rps"] = float(cfg["rps"])
+            if rps_by_base.setdefault(cfg["base"], kw["rps"]) != kw["rps"]:
+                raise SystemExit(f"Задание {name}: rps {kw['rps']:g} для базы {cfg['base']}, "
+                                 f"а другое задание этой базы просит {rps_by_base[cfg['base']]:g}")
+        jobs.append(merge.MergeJob(name=name, base_id=cfg["base"], table_a=cfg["table_a"], table_b=cfg["table_b"], **kw))
+    if not jobs:
+        raise SystemExit("В файле заданий нет jobs")
+    return jobs
+
+def run_all(jobs: list[merge.MergeJob], concurrency: int, dry_run: bool = False,
+            report_formats: list[str] | None = None) -> dict[str, Any]:
+    """Имя задания -> счётчики merge.main или исключение (одно упавшее задание не останавливает остальные)."""
+    results: dict[str, Any] = {}
+    # лимит базы — до первых запросов: лимитер по умолчанию (AIRTABLE_RPS) заменяется заданным
+    for job in jobs:
+        if job.rps is not None:
+            helpers.set_rps(job.base_id, job.rps)
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="job") as ex:
+        futs = {ex.submit(merge.main, dry_run, None, report_formats, job): job for job in jobs}
+        for fut in as_completed(futs):
+            job = futs[fut]
+            try:
+                results[job.name] = fut.result()
+            except (Exception, SystemExit) as e:
+                print(f"{job.tag}ОШИБКА: {e}")
+                results[job.name] = e
+    return results
+
+def print_summary(jobs: list[merge.MergeJob], results: dict[str, Any]):
+    print(f"\n{'job':<20}{'base':<20}{'created':>9}{'updated':>9}{'deleted':>9}")
+    for job in jobs:
+        r = results.get(job.name)
+        if isinstance(r, dict):
+            print(f"{job.name:<20}{job.base_id:<20}{r['created']:>9}{r['updated']:>9}{r['deleted']:>9}")
+        else:
+            print(f"{job.name:<20}{job.base_id:<20}  ошибка: {r}")
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Concurrent merge + dedupe for several Airtable bases from one job file")
+    ap.add_argument("spec", help="файл заданий (.yaml/.yml или .json), см. jobs.example.yaml")
+    ap.add_argument("--only", help="имена заданий через запятую")
+    ap.add_argument("--concurrency", type=int, default=0,
+                    help="сколько заданий одновременно (0 — по числу разных баз, не больше 8)")
+    ap.add_argument("--dry-run", action="store_true")
+    reports.add_cli_args(ap)
+    metrics.add_cli_args(ap)
+    profiling.add_cli_args(ap)
+    args = ap.parse_args()
+    metrics.setup_from_args(args)
+    profiling.setup_from_args(args)
+
+    if not AIRTABLE_TOKEN:
+        raise SystemExit("Укажи AIRTABLE_TOKEN.")
+    jobs = jobs_from_spec(read_spec(args.spec))
+    if args.only:
+        only = {x.strip() for x in args.only.split(",") if x.strip()}
+        jobs = [j for j in jobs if j.name in only]
+        if not jobs:
+            raise SystemExit(f"Нет заданий с именами {sorted(only)}")
+    concurrency = args.concurrency or min(len({j.base_id for j in jobs}), 8)
+    print(f"Заданий: {len(jobs)}, баз: {len({j.base_id for j in jobs})}, параллельно: {concurrency}")
+    results = run_all(jobs, concurrency, dry_run=args.dry_run, report_formats=reports.formats_from_args(args))
+    print_summary(jobs, results)
+    if any(not isinstance(r, dict) for r in results.values()):
+        raise SystemExit(1)
@@ -1,21 +1,14 @@
-import os
 import argparse
+from datetime import datetime, timezone
 from src.helpers import *
+from src import metrics, mirror, profiling, records, reports
+from src.profiling import phase
 
-from dotenv import load_dotenv
-
-load_dotenv()
-
-# ================== CONFIG via env ==================
-AIRTABLE_TOKEN   = os.getenv("AIRTABLE_TOKEN", "")
-AIRTABLE_BASE_ID = os.getenv("AIRTABLE_BASE_ID", "")
-
-# Ууказывать ID таблиц (tbl...)
-TABLE_A = os.getenv("TABLE_A")   # Startups
-TABLE_B = os.getenv("TABLE_B")   # Chris | Startups Data
-
-KEY_A = os.getenv("KEY_A", "Company name")
-KEY_B = os.getenv("KEY_B", "Company Name")
+# ================== CONFIG via env (src/config.py) ==================
+from src.config import (
+    AIRTABLE_TOKEN, AIRTABLE_BASE_ID,
+    TABLE_A, TABLE_B, KEY_A, KEY_B,
+)
 
 # Что переносим из B -> в A
 FIELDS_TO_COPY = [
@@ -52,73 +45,115 @@ FORCE_STRING_FOR: set[str] = {
 # В A это мультиселект
 MULTI_SELECT_DEST: set[str] = {"drawdown_solutions"}
 
-# Глобально накопим неизвестные опции мультиселекта
-UNKNOWN_DRAW_OPTIONS: set[str] = set()
 
-def main(dry_run=False):
-    if not AIRTABLE_TOKEN or not AIRTABLE_BASE_ID:
-        raise SystemExit("Укажи AIRTABLE_TOKEN и AIRTABLE_BASE_ID.")
+class MergeJob:
+    """
+    Одно задание merge B -> A: база, пара таблиц, ключи и маппинг полей.
+    DEFAULT_JOB собирается из env и констант выше; src.jobs строит задания из файла
+    и гоняет их параллельно. Неизвестные опции мультиселектов копятся в самом задании.
+    """
+
+    def __init__(self, name: str = "default", base_id: str = AIRTABLE_BASE_ID,
+                 table_a: str | None = TABLE_A, table_b: str | None = TABLE_B, key_a: str = KEY_A, key_b: str = KEY_B,
+                 field_map: dict[str,str] | None = None, force_string: list[str] | None = None,
+                 multi_select: list[str] | None = None, mirror: str | None = None, rps: float | None = None):
+        self.name = name
+        self.base_id = base_id
+        self.table_a, self.table_b = table_a, table_b
+        self.key_a, self.key_b = key_a, key_b
+        self.fields_to_copy = list(FIELDS_TO_COPY if field_map is None else field_map)
+        self.field_map = dict(FIELD_MAP if field_map is None else field_map)
+        self.force_string = set(FORCE_STRING_FOR if force_string is None else force_string)
+        self.multi_select = set(MULTI_SELECT_DEST if multi_select is None else multi_select)
+        self.mirror = mirror
+        self.rps = rps              # лимит базы, запросов/с (None — AIRTABLE_RPS); ставит src.jobs.run_all
+        # что держим в памяти из B (src.records): ключ и переносимые поля; от A merge
+        # нужна только заполненность полей-назначений — ключ уже в Record.key
+        self.keep_b = [key_b, *self.fields_to_copy]
+        self.unknown_options: dict[str, set[str]] = {d: set() for d in self.multi_select}
+
+    @property
+    def tag(self) -> str:
+        """Префикс строк лога и суффикс файлов: пусто для одиночного запуска."""
+        return "" if self.name == "default" else f"[{self.name}] "
+
+    def source_of(self, dst: str) -> str:
+        return next((s for s, d in self.field_map.items() if d == dst), dst)
+
+DEFAULT_JOB = MergeJob()
+KEEP_B = DEFAULT_JOB.keep_b
+# Глобально накопим неизвестные опции мультиселекта (одиночный запуск)
+UNKNOWN_DRAW_OPTIONS: set[str] = DEFAULT_JOB.unknown_options.setdefault("drawdown_solutions", set())
+
+def allowed_by_dest(allowed_opts, job: MergeJob) -> dict[str, set | None]:
+    """Опции по полю-мультиселекту; одиночный set (как раньше для drawdown_solutions) — на все job.multi_select."""
+    return allowed_opts if isinstance(allowed_opts, dict) else {d: allowed_opts for d in job.multi_select}
 
-    print(f"→ Загружаю A ({TABLE_A}) ...")
-    A = list_all(TABLE_A)
-    print(f"  Получено из A: {len(A)}")
+def build_payload(fb: dict[str,Any], allowed_opts, job: MergeJob = DEFAULT_JOB) -> dict[str,Any]:
+    """Поля записи B, приведённые к полям A (field_map, мультиселекты, строки)."""
+    allowed_opts = allowed_by_dest(allowed_opts, job)
+    payload: dict[str,Any] = {}
+    for src in job.fields_to_copy:
+        if src not in fb or fb[src] in (None, ""):
+            continue
+        dst = job.field_map.get(src, src)
 
-    print(f"→ Загружаю B ({TABLE_B}) ...")
-    B = list_all(TABLE_B)
-    print(f"  Получено из B: {len(B)}")
+        if dst in job.multi_select:
+            base_val = unwrap_value(fb[src])          # строка (или список), напр. из Vertical
+            vals = to_multi_select(base_val) or []
+            vals = [sanitize_option_label(v) for v in vals if v and str(v).strip()]
+            opts = allowed_opts.get(dst)
+            if opts:
+                allowed = [v for v in vals if v in opts]
+                unknown = [v for v in vals if v not in opts]
+                if unknown:
+                    job.unknown_options.setdefault(dst, set()).update(unknown)
+                if not allowed:
+                    continue  # всё неизвестно — пропускаем, чтобы не было 422
+                val = allowed
+            else:
+                continue  # нет списка допустимых — безопаснее пропустить
+        else:
+            val = unwrap_value(fb[src])
+            if val is None:
+                continue
+            if dst in job.force_string:
+                val = str(val)
 
-    # допустимые опции для drawdown_solutions
-    allowed_draw_opts = get_allowed_multiselect_options(TABLE_A, "drawdown_solutions")
-    if not allowed_draw_opts:
-        print("Не удалось определить разрешённые опции drawdown_solutions — значения Vertical будут пропущены, чтобы не словить 422.")
+        payload[dst] = val
+    return payload
 
+def merge_pairs(A: list[dict[str,Any]], B: list[dict[str,Any]], job: MergeJob = DEFAULT_JOB):
+    """(запись B, первая запись A с тем же ключом или None); B без ключа пропускаем."""
     # индекс по ключу в A
-    by_key_a: dict[str, list[dict[str,Any]]] = {}
-    for r in A:
-        k = normalize_key(r.get("fields", {}).get(KEY_A))
+    by_key_a = records.first_by_key(A, job.key_a)
+    for rb in B:
+        k = records.key_of(rb, job.key_b)
         if not k: continue
-        by_key_a.setdefault(k, []).append(r)
+        yield rb, by_key_a.get(k)
+
+# отчёт merge/dedup (src.main и src.pipeline)
+REPORT_FIELDS = ["stage", "action", "record_id", "company", "fields", "note"]
 
+def build_merge(A: list[dict[str,Any]], B: list[dict[str,Any]], allowed_opts, pairs=None,
+                report=None, job: MergeJob = DEFAULT_JOB) -> tuple[list, list]:
+    """
+    B -> A: (to_create, to_update). В существующие записи пишем только пустые поля.
+    allowed_opts — {поле-мультиселект: опции} или один set (см. allowed_by_dest).
+    pairs — готовые пары (B, A) например из mirror.merge_pairs; иначе строим индекс по A.
+    report — ReportSink, по строке на каждое создание/обновление.
+    """
     to_create, to_update = [], []
+    report = report or reports.NullSink()
+    allowed_opts = allowed_by_dest(allowed_opts, job)
 
-    for rb in B:
+    for rb, tgt in (pairs if pairs is not None else merge_pairs(A, B, job)):
         fb = rb.get("fields", {})
-        key_b_raw = fb.get(KEY_B)
-        k = normalize_key(key_b_raw)
-        if not k: continue
-
-        payload: dict[str,Any] = {}
-        for src in FIELDS_TO_COPY:
-            if src not in fb or fb[src] in (None, ""):
-                continue
-            dst = FIELD_MAP.get(src, src)
-
-            if dst in MULTI_SELECT_DEST:
-                base_val = unwrap_value(fb[src])          # строка (или список) из Vertical
-                vals = to_multi_select(base_val) or []
-                vals = [sanitize_option_label(v) for v in vals if v and str(v).strip()]
-                if allowed_draw_opts:
-                    allowed = [v for v in vals if v in allowed_draw_opts]
-                    unknown = [v for v in vals if v not in allowed_draw_opts]
-                    if unknown:
-                        UNKNOWN_DRAW_OPTIONS.update(unknown)
-                    if not allowed:
-                        continue  # всё неизвестно — пропускаем, чтобы не было 422
-                    val = allowed
-                else:
-                    continue  # нет списка допустимых — безопаснее пропустить
-            else:
-                val = unwrap_value(fb[src])
-                if val is None:
-                    continue
-                if dst in FORCE_STRING_FOR:
-                    val = str(val)
+        key_b_raw = fb.get(job.key_b)
 
-            payload[dst] = val
+        payload = build_payload(fb, allowed_opts, job)
 
-        matches = by_key_a.get(k)
-        if matches:
-            tgt = matches[0]
+        if tgt:
             fa = tgt.get("fields", {})
             patch = {}
             for dst, v in payload.items():
@@ -128,48 +163,138 @@ def main(dry_run=False):
                     patch[dst] = v
             if patch:
                 to_update.append({"id": tgt["id"], "fields": patch})
+                report.write({"stage": "merge", "action": "update", "record_id": tgt["id"],
+                              "company": key_b_raw, "fields": ", ".join(patch)})
         else:
-            new_fields = {KEY_A: key_b_raw}
+            new_fields = {job.key_a: key_b_raw}
             new_fields.update(payload)
             to_create.append({"fields": new_fields})
+            report.write({"stage": "merge", "action": "create", "record_id": "",
+                          "company": key_b_raw, "fields": ", ".join(new_fields)})
+    return to_create, to_update
 
-    print(f"Будет создано: {len(to_create)}, обновлено: {len(to_update)}")
-    if to_create: batch_create(TABLE_A, to_create, dry=dry_run)
-    if to_update: batch_update(TABLE_A, to_update, dry=dry_run)
-
-    # дедуп по ключу
-    print("Дедуп в A ...")
-    A2 = list_all(TABLE_A)
-    buckets: dict[str, list[dict[str,Any]]] = {}
-    for r in A2:
-        k = normalize_key(r.get("fields", {}).get(KEY_A))
-        if not k: continue
-        buckets.setdefault(k, []).append(r)
-
+def find_duplicates(recs: list[dict[str,Any]], report=None, job: MergeJob = DEFAULT_JOB) -> list[str]:
+    """id лишних записей: в каждой группе по ключу оставляем самую заполненную."""
     to_del = []
-    for k, arr in buckets.items():
-        if len(arr) <= 1: continue
-        arr_sorted = sorted(arr, key=lambda rec: count_filled(rec.get("fields", {})), reverse=True)
+    for arr in records.duplicate_groups(recs, job.key_a):
+        arr_sorted = sorted(arr, key=records.filled_of, reverse=True)
         to_del += [rec["id"] for rec in arr_sorted[1:]]
+        if report is not None:
+            for rec in arr_sorted[1:]:
+                report.write({"stage": "dedup", "action": "delete", "record_id": rec["id"],
+                              "company": rec.get("fields", {}).get(job.key_a), "note": f"duplicate of {arr_sorted[0]['id']}"})
+    return to_del
 
-    print(f"Дубликатов к удалению: {len(to_del)}")
-    if to_del: batch_delete(TABLE_A, to_del, dry=dry_run)
-
+def save_missing_options(job: MergeJob = DEFAULT_JOB):
     # Отчёт по неизвестным опциям мультиселекта
-    if UNKNOWN_DRAW_OPTIONS:
-        try:
-            with open("missing_drawdown_options.txt", "w", encoding="utf-8") as f:
-                for x in sorted(UNKNOWN_DRAW_OPTIONS):
-                    f.write(f"{x}\n")
-            print(f"В поле drawdown_solutions отсутствуют {len(UNKNOWN_DRAW_OPTIONS)} опций (из Vertical).")
-            print("Список сохранён в missing_drawdown_options.txt — добавьте их в настройках поля и перезапустите скрипт.")
-        except Exception:
-            print(f"Отсутствующие опции (первые 20): {list(sorted(UNKNOWN_DRAW_OPTIONS))[:20]}")
-
-    print("Готово")
+    unknown = {d: opts for d, opts in sorted(job.unknown_options.items()) if opts}
+    if not unknown: return
+    path = "missing_drawdown_options.txt" if job.name == "default" else f"missing_options_{job.name}.txt"
+    try:
+        with open(path, "w", encoding="utf-8") as f:
+            for dst, opts in unknown.items():
+                for x in sorted(opts):
+                    f.write(f"{x}\n" if len(unknown) == 1 else f"{dst}: {x}\n")
+        for dst, opts in unknown.items():
+            print(f"{job.tag}В поле {dst} отсутствуют {len(opts)} опций (из {job.source_of(dst)}).")
+        print(f"{job.tag}Список сохранён в {path} — добавьте их в настройках поля и перезапустите скрипт.")
+    except Exception:
+        for dst, opts in unknown.items():
+            print(f"{job.tag}Отсутствующие опции {dst} (первые 20): {list(sorted(opts))[:20]}")
+
+def main(dry_run=False, mirror_path=None, report_formats=None, job: MergeJob = DEFAULT_JOB) -> dict[str,int]:
+    if not AIRTABLE_TOKEN or not job.base_id:
+        raise SystemExit("Укажи AIRTABLE_TOKEN и AIRTABLE_BASE_ID.")
+
+    suffix = "" if job.name == "default" else f"_{job.name}"
+    report = reports.ReportSink(f"merge_report{suffix}_{datetime.now(timezone.utc):%Y%m%d_%H%M%S}", REPORT_FIELDS,
+                                report_formats or ["csv"], flush_every=500)
+    try:
+        with use_base(job.base_id):
+            stats = run(dry_run, mirror_path, report, job)
+    finally:
+        with phase("report"):
+            report.close(drop_empty=True)
+            save_missing_options(job)
+    if report.paths:
+        print(f"{job.tag}Отчёт merge/dedup: {', '.join(report.paths)} (строк: {report.rows})")
+    print(f"{job.tag}Готово")
+    return stats
+
+def run(dry_run, mirror_path, report, job: MergeJob = DEFAULT_JOB) -> dict[str,int]:
+    tag = job.tag
+
+    # --mirror: A/B, схема, пары merge и дедуп — из локального SQLite-зеркала (src/mirror.py)
+    db = mirror.open_db(mirror_path) if mirror_path else None
+
+    if db is None:
+        print(f"{tag}→ Загружаю A ({job.table_a}) ...")
+        with phase("load A"):
+            A = records.load(job.table_a, job.key_a, keep=[], flags=job.field_map.values())
+        print(f"{tag}  Получено из A: {len(A)}")
+
+        print(f"{tag}→ Загружаю B ({job.table_b}) ...")
+        with phase("load B"):
+            B = records.load(job.table_b, job.key_b, keep=job.keep_b)
+        print(f"{tag}  Получено из B: {len(B)}")
+
+    # допустимые опции мультиселектов (drawdown_solutions)
+    allowed_opts = {}
+    with phase("schema fetch"):
+        for dst in sorted(job.multi_select):
+            if db is not None:
+                allowed_opts[dst] = mirror.allowed_options(db, job.table_a, dst)
+            else:
+                allowed_opts[dst] = get_allowed_multiselect_options(job.table_a, dst)
+    for dst, opts in allowed_opts.items():
+        if not opts:
+            print(f"{tag}Не удалось определить разрешённые опции {dst} — значения {job.source_of(dst)} будут пропущены, чтобы не словить 422.")
+
+    with phase("merge"):
+        if db is not None:
+            to_create, to_update = build_merge([], [], allowed_opts, pairs=mirror.merge_pairs(db, job.table_a, job.table_b),
+                                               report=report, job=job)
+        else:
+            to_create, to_update = build_merge(A, B, allowed_opts, report=report, job=job)
+            A = B = None   # до перечитывания A для дедупа
+
+    print(f"{tag}Будет создано: {len(to_create)}, обновлено: {len(to_update)}")
+    with phase("write"):
+        created = batch_create(job.table_a, to_create, dry=dry_run) if to_create else []
+        if to_update:
+            batch_update(job.table_a, to_update, dry=dry_run, types=mirror.field_types(db, job.table_a) if db is not None else None)
+    if db is not None and not dry_run:
+        mirror.insert_records(db, job.table_a, created)
+        mirror.apply_updates(db, job.table_a, to_update)
+
+    # дедуп по ключу
+    print(f"{tag}Дедуп в A ...")
+    if db is not None:
+        with phase("dedup"):
+            to_del = mirror.duplicate_ids(db, job.table_a)
+            for rid in to_del:
+                report.write({"stage": "dedup", "action": "delete", "record_id": rid})
+    else:
+        with phase("reload A"):
+            A2 = records.load(job.table_a, job.key_a, keep=[job.key_a])   # дедупу нужны только ключ и filled
+        with phase("dedup"):
+            to_del = find_duplicates(A2, report, job)
+
+    print(f"{tag}Дубликатов к удалению: {len(to_del)}")
+    with phase("write"):
+        if to_del: batch_delete(job.table_a, to_del, dry=dry_run)
+    if db is not None and not dry_run:
+        mirror.delete_ids(db, job.table_a, to_del)
+    return {"created": len(to_create), "updated": len(to_update), "deleted": len(to_del)}
 
 if __name__ == "__main__":
     ap = argparse.ArgumentParser(description="Airtable merge + enrich + dedupe (Vertical -> drawdown_solutions)")
     ap.add_argument("--dry-run", action="store_true")
+    ap.add_argument("--mirror", metavar="DB", help="читать A/B из SQLite-зеркала (python -m src.mirror sync)")
+    reports.add_cli_args(ap)
+    metrics.add_cli_args(ap)
+    profiling.add_cli_args(ap)
     args = ap.parse_args()
-    main(dry_run=args.dry_run)
+    metrics.setup_from_args(args)
+    profiling.setup_from_args(args)
+    main(dry_run=args.dry_run, mirror_path=args.mirror, report_formats=reports.formats_from_args(args))
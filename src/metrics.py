@@ -0,0 +1,262 @@
+import atexit
+import functools
+import json
+import os
+import threading
+import time
+import urllib.parse
+from contextlib import contextmanager
+from typing import Any, Optional
+
+# ----------------------------------------------------------------
+#   Метрики запросов/экстракторов: счётчики и гистограммы с метками.
+#   По умолчанию выключены (ENABLED=False) — хуки почти ничего не стоят.
+# ----------------------------------------------------------------
+ENABLED = False
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 60.0)
+CPU_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+_lock = threading.Lock()
+_counters: dict[tuple[str, tuple], float] = {}
+_hists: dict[tuple[str, tuple], "Histogram"] = {}
+_started = time.time()
+
+
+class Histogram:
+    __slots__ = ("buckets", "counts", "count", "sum", "max")
+
+    def __init__(self, buckets: tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, v: float):
+        i = 0
+        while i < len(self.buckets) and v > self.buckets[i]:
+            i += 1
+        self.counts[i] += 1
+        self.count += 1
+        self.sum += v
+        if v > self.max: self.max = v
+
+    def quantile(self, q: float) -> float:
+        """Оценка квантиля по верхней границе бакета."""
+        if not self.count: return 0.0
+        need, acc = q * self.count, 0
+        for i, c in enumerate(self.counts):
+            acc += c
+            if acc >= need:
+                return min(self.buckets[i], self.max) if i < len(self.buckets) else self.max
+        return self.max
+
+
+def _key(labels: dict[str, Any]) -> tuple:
+    return tuple(sorted((k, str(v)) for k, v in labels.items() if v is not None))
+
+def enable(on: bool = True):
+    global ENABLED
+    ENABLED = on
+
+def reset():
+    global _started
+    with _lock:
+        _counters.clear(); _hists.clear()
+    _started = time.time()
+
+def inc(name: str, n: float = 1, **labels):
+    if not ENABLED: return
+    k = (name, _key(labels))
+    with _lock:
+        _counters[k] = _counters.get(k, 0) + n
+
+def observe(name: str, value: float, buckets: tuple[float, ...] = LATENCY_BUCKETS, **labels):
+    if not ENABLED: return
+    k = (name, _key(labels))
+    with _lock:
+        h = _hists.get(k)
+        if h is None:
+            h = _hists[k] = Histogram(buckets)
+        h.observe(value)
+
+@contextmanager
+def timer(name: str, **labels):
+    if not ENABLED:
+        yield; return
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - t0, **labels)
+
+def extractor(fn):
+    """CPU-время экстрактора (thread_time, т.е. без ожидания сети) в extractor_cpu_seconds."""
+    @functools.wraps(fn)
+    def wrapper(*a, **kw):
+        if not ENABLED:
+            return fn(*a, **kw)
+        t0 = time.thread_time()
+        try:
+            return fn(*a, **kw)
+        finally:
+            observe("extractor_cpu_seconds", time.thread_time() - t0, CPU_BUCKETS, extractor=fn.__name__)
+    return wrapper
+
+
+# ----------------------------------------------------------------
+#                       HTTP HOOKS
+# ----------------------------------------------------------------
+def airtable_endpoint(method: str, url: str) -> str:
+    """'PATCH tblXXX' / 'GET meta/tables' — без base id и record id, чтобы не плодить метки."""
+    path = urllib.parse.urlsplit(url).path.strip("/").split("/")
+    if len(path) >= 2 and path[1] == "meta":
+        return f"{method} meta/{path[-1]}"
+    table = urllib.parse.unquote(path[2]) if len(path) >= 3 else "?"
+    return f"{method} {table}"
+
+def record_airtable(method: str, url: str, r, elapsed: float, sent: int = 0):
+    """Одна попытка запроса к Airtable (r — requests.Response или None при исключении)."""
+    if not ENABLED: return
+    ep = airtable_endpoint(method, url)
+    observe("airtable_request_seconds", elapsed, endpoint=ep)
+    status = r.status_code if r is not None else "error"
+    inc("airtable_requests_total", endpoint=ep, status=status)
+    if status == 429:
+        inc("airtable_429_total", endpoint=ep)
+    inc("airtable_bytes_sent_total", sent, endpoint=ep)
+    if r is not None:
+        inc("airtable_bytes_received_total", len(r.content or b""), endpoint=ep)
+
+def record_retry(method: str, url: str, wait: float):
+    if not ENABLED: return
+    ep = airtable_endpoint(method, url)
+    inc("airtable_retries_total", endpoint=ep)
+    inc("airtable_retry_sleep_seconds_total", wait, endpoint=ep)
+
+def record_fetch(domain: Optional[str], elapsed: float, status: Any, nbytes: int = 0):
+    """Одна загрузка страницы краулером; status — HTTP-код или имя исключения."""
+    if not ENABLED: return
+    observe("crawl_fetch_seconds", elapsed, domain=domain or "?")
+    inc("crawl_requests_total", status=status)
+    inc("crawl_bytes_received_total", nbytes)
+
+def record_cache(cache: str, hit: bool):
+    inc("cache_hits_total" if hit else "cache_misses_total", cache=cache)
+
+def payload_size(kw: dict[str, Any]) -> int:
+    if "json" in kw and kw["json"] is not None:
+        return len(json.dumps(kw["json"]))
+    d = kw.get("data")
+    return len(d) if isinstance(d, (bytes, str)) else 0
+
+
+# ----------------------------------------------------------------
+#                         EXPORT
+# ----------------------------------------------------------------
+def summary() -> dict[str, Any]:
+    with _lock:
+        counters = [(n, dict(l), v) for (n, l), v in _counters.items()]
+        hists = [(n, dict(l), h) for (n, l), h in _hists.items()]
+    out: dict[str, Any] = {"uptime_s": round(time.time() - _started, 3), "counters": {}, "histograms": {}}
+    for n, l, v in sorted(counters, key=lambda x: (x[0], sorted(x[1].items()))):
+        out["counters"].setdefault(n, []).append({"labels": l, "value": round(v, 6)})
+    for n, l, h in sorted(hists, key=lambda x: (x[0], sorted(x[1].items()))):
+        out["histograms"].setdefault(n, []).append({
+            "labels": l, "count": h.count, "sum": round(h.sum, 6),
+            "avg": round(h.sum / h.count, 6) if h.count else 0,
+            "p50": h.quantile(0.5), "p95": h.quantile(0.95), "max": round(h.max, 6),
+        })
+    return out
+
+def _prom_labels(l: dict[str, str], extra: Optional[tuple[str, str]] = None) -> str:
+    items = list(l.items()) + ([extra] if extra else [])
+    if not items: return ""
+    esc = lambda s: str(s).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return "{" + ",".join(f'{k}="{esc(v)}"' for k, v in items) + "}"
+
+def to_prometheus() -> str:
+    with _lock:
+        counters = sorted(((n, dict(l), v) for (n, l), v in _counters.items()), key=lambda x: x[0])
+        hists = sorted(((n, dict(l), h) for (n, l), h in _hists.items()), key=lambda x: x[0])
+    lines, typed = [], set()
+    for n, l, v in counters:
+        if n not in typed:
+            lines.append(f"# TYPE {n} counter"); typed.add(n)
+        lines.append(f"{n}{_prom_labels(l)} {v}")
+    for n, l, h in hists:
+        if n not in typed:
+            lines.append(f"# TYPE {n} histogram"); typed.add(n)
+        acc = 0
+        for b, c in zip(h.buckets, h.counts):
+            acc += c
+            lines.append(f"{n}_bucket{_prom_labels(l, ('le', str(b)))} {acc}")
+        lines.append(f"{n}_bucket{_prom_labels(l, ('le', '+Inf'))} {h.count}")
+        lines.append(f"{n}_sum{_prom_labels(l)} {h.sum}")
+        lines.append(f"{n}_count{_prom_labels(l)} {h.count}")
+    return "\n".join(lines) + "\n"
+
+def write_prometheus(path: str):
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(to_prometheus())
+    os.replace(tmp, path)   # node_exporter textfile collector не увидит полузаписанный файл
+
+def serve_prometheus(port: int, host: str = "127.0.0.1"):
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args): pass
+        def do_GET(self):
+            body = to_prometheus().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+    srv = ThreadingHTTPServer((host, port), Handler)
+    srv.daemon_threads = True
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    return srv
+
+
+# ----------------------------------------------------------------
+#                          CLI
+# ----------------------------------------------------------------
+def add_cli_args(ap):
+    ap.add_argument("--metrics", nargs="?", const="-", metavar="PATH",
+                    help="JSON-сводка метрик при выходе (в stdout или в PATH)")
+    ap.add_argument("--metrics-prom", metavar="PATH", help="Prometheus textfile, обновляется каждые --metrics-interval сек")
+    ap.add_argument("--metrics-port", type=int, help="отдавать /metrics в формате Prometheus на этом порту")
+    ap.add_argument("--metrics-host", default="127.0.0.1",
+                    help="адрес для --metrics-port (по умолчанию только localhost; 0.0.0.0 — все интерфейсы)")
+    ap.add_argument("--metrics-interval", type=float, default=15.0)
+
+def setup_from_args(args):
+    if not (args.metrics or args.metrics_prom or args.metrics_port):
+        return
+    enable()
+    if args.metrics_port:
+        serve_prometheus(args.metrics_port, args.metrics_host)
+    if args.metrics_prom:
+        def loop():
+            while True:
+                time.sleep(args.metrics_interval)
+                try: write_prometheus(args.metrics_prom)
+                except Exception: pass
+        threading.Thread(target=loop, daemon=True).start()
+
+    def at_exit():
+        if args.metrics_prom:
+            try: write_prometheus(args.metrics_prom)
+            except Exception as e: print(f"Failed to write metrics: {e}")
+        if args.metrics:
+            data = json.dumps(summary(), ensure_ascii=False, indent=2)
+            if args.metrics == "-":
+                print("\n==== METRICS ====\n" + data)
+            else:
+                with open(args.metrics, "w", encoding="utf-8") as f:
+                    f.write(data)
+                print(f"Metrics saved: {args.metrics}")
+    atexit.register(at_exit)
@@ -0,0 +1,284 @@
+"""
+Локальное зеркало таблиц Airtable в SQLite.
+
+Записи хранятся с предвычисленными колонками (нормализованный ключ, домен сайта,
+число заполненных полей) и флагами пустоты по целевым полям — поэтому merge,
+дедуп и выбор кандидатов на обогащение делаются индексными запросами, а
+повторные частичные прогоны не читают базу через API.
+
+    python -m src.mirror sync --db mirror.sqlite            # TABLE_A, TABLE_B и схема
+    python -m src.mirror stats --db mirror.sqlite
+    python -m src.main --mirror mirror.sqlite               # скрипты читают из зеркала
+"""
+import argparse
+import json
+import sqlite3
+from datetime import datetime, timezone
+from typing import Any, Iterable, Iterator, Optional
+
+from src.helpers import list_all, normalize_key, count_filled, get_base_schema, options_from_schema, types_from_schema
+from src.config import AIRTABLE_TOKEN, AIRTABLE_BASE_ID, TABLE_A, TABLE_B, KEY_A, KEY_B
+
+# Поля, для которых храним флаг "пусто" (цели main / enrich_from_nodes / enrich_lite).
+# Для остальных полей candidates() проверяет пустоту по JSON.
+FLAG_FIELDS = (
+    "description", "employees_count", "location", "total_funding", "website",
+    "drawdown_solutions", "email_reasoning", "financials_reasoning", "ceo_email",
+    "linkedin_url", "latest funding type", "keywords matched",
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS records (
+    tbl          TEXT NOT NULL,
+    id           TEXT NOT NULL,
+    pos          INTEGER NOT NULL,          -- порядок выдачи list_all
+    created_time TEXT,
+    fields       TEXT NOT NULL,             -- JSON
+    norm_key     TEXT,                      -- normalize_key(ключевое поле)
+    site_key     TEXT,                      -- normalize_key(website)
+    domain       TEXT,                      -- хост сайта без www
+    filled       INTEGER NOT NULL,          -- count_filled(fields)
+    PRIMARY KEY (tbl, id)
+);
+CREATE INDEX IF NOT EXISTS idx_records_key    ON records(tbl, norm_key, pos);
+CREATE INDEX IF NOT EXISTS idx_records_domain ON records(tbl, domain);
+CREATE INDEX IF NOT EXISTS idx_records_pos    ON records(tbl, pos);
+
+CREATE TABLE IF NOT EXISTS empty_fields (
+    tbl   TEXT NOT NULL,
+    field TEXT NOT NULL,
+    id    TEXT NOT NULL,
+    PRIMARY KEY (tbl, field, id)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS sync_state (
+    tbl       TEXT PRIMARY KEY,
+    key_field TEXT,
+    synced_at TEXT,
+    n         INTEGER
+);
+
+CREATE TABLE IF NOT EXISTS meta (
+    k TEXT PRIMARY KEY,
+    v TEXT
+);
+"""
+
+
+def is_blank(v: Any) -> bool:
+    return v is None or v is False or (isinstance(v, str) and v.strip() == "") or (isinstance(v, (list, dict)) and len(v) == 0)
+
+def open_db(path: str) -> sqlite3.Connection:
+    db = sqlite3.connect(path)
+    db.execute("PRAGMA journal_mode=WAL")
+    db.execute("PRAGMA synchronous=NORMAL")
+    db.executescript(SCHEMA)
+    return db
+
+def _row(tbl: str, rec: dict[str, Any], pos: int, key_field: Optional[str]) -> tuple:
+    f = rec.get("fields", {})
+    site_key = normalize_key(f.get("website")) or None
+    return (
+        tbl, rec["id"], pos, rec.get("createdTime"),
+        json.dumps(f, ensure_ascii=False),
+        normalize_key(f.get(key_field)) or None if key_field else None,
+        site_key,
+        site_key.split("/", 1)[0] if site_key else None,
+        count_filled(f),
+    )
+
+def _flags(tbl: str, rec: dict[str, Any]) -> Iterator[tuple]:
+    f = rec.get("fields", {})
+    for name in FLAG_FIELDS:
+        if is_blank(f.get(name)):
+            yield (tbl, name, rec["id"])
+
+def _key_field(db: sqlite3.Connection, tbl: str) -> Optional[str]:
+    row = db.execute("SELECT key_field FROM sync_state WHERE tbl=?", (tbl,)).fetchone()
+    return row[0] if row else None
+
+
+# ----------------------------------------------------------------
+#                           SYNC
+# ----------------------------------------------------------------
+def store(db: sqlite3.Connection, tbl: str, recs: list[dict[str, Any]], key_field: Optional[str]):
+    """Полная замена таблицы в зеркале одной транзакцией."""
+    with db:
+        db.execute("DELETE FROM records WHERE tbl=?", (tbl,))
+        db.execute("DELETE FROM empty_fields WHERE tbl=?", (tbl,))
+        db.executemany("INSERT INTO records VALUES (?,?,?,?,?,?,?,?,?)",
+                       (_row(tbl, r, i, key_field) for i, r in enumerate(recs)))
+        db.executemany("INSERT INTO empty_fields VALUES (?,?,?)", (x for r in recs for x in _flags(tbl, r)))
+        db.execute("INSERT OR REPLACE INTO sync_state VALUES (?,?,?,?)",
+                   (tbl, key_field, datetime.now(timezone.utc).isoformat(), len(recs)))
+
+def sync(db: sqlite3.Connection, tbl: str, key_field: Optional[str]) -> int:
+    recs = list_all(tbl)
+    store(db, tbl, recs, key_field)
+    return len(recs)
+
+def sync_schema(db: sqlite3.Connection) -> bool:
+    schema = get_base_schema(refresh=True)
+    if schema is None:
+        return False
+    with db:
+        db.execute("INSERT OR REPLACE INTO meta VALUES ('schema', ?)", (json.dumps(schema, ensure_ascii=False),))
+    return True
+
+def field_types(db: sqlite3.Connection, tbl: str) -> dict[str, str]:
+    """Типы полей из сохранённой схемы (для helpers.batch_update без запроса к meta API)."""
+    row = db.execute("SELECT v FROM meta WHERE k='schema'").fetchone()
+    return types_from_schema(json.loads(row[0]), tbl) if row else {}
+
+def allowed_options(db: sqlite3.Connection, tbl: str, field_name: str) -> Optional[set]:
+    """Опции мультиселекта из сохранённой схемы, иначе — из значений в зеркале (как в helpers)."""
+    row = db.execute("SELECT v FROM meta WHERE k='schema'").fetchone()
+    opts = options_from_schema(json.loads(row[0]), tbl, field_name) if row else None
+    if opts is not None:
+        return opts
+    allowed = set()
+    for rec in load(db, tbl):
+        vals = rec["fields"].get(field_name)
+        if isinstance(vals, list):
+            allowed.update(v if isinstance(v, str) else v.get("name") for v in vals if isinstance(v, (str, dict)))
+    allowed.discard(None)
+    return allowed or None
+
+
+# ----------------------------------------------------------------
+#                       WRITE-THROUGH
+# ----------------------------------------------------------------
+def _get(db: sqlite3.Connection, tbl: str, rid: str) -> Optional[dict[str, Any]]:
+    row = db.execute("SELECT id, created_time, fields FROM records WHERE tbl=? AND id=?", (tbl, rid)).fetchone()
+    return {"id": row[0], "createdTime": row[1], "fields": json.loads(row[2])} if row else None
+
+def _put(db: sqlite3.Connection, tbl: str, rec: dict[str, Any], pos: int, key_field: Optional[str]):
+    db.execute("INSERT OR REPLACE INTO records VALUES (?,?,?,?,?,?,?,?,?)", _row(tbl, rec, pos, key_field))
+    db.execute("DELETE FROM empty_fields WHERE tbl=? AND id=?", (tbl, rec["id"]))
+    db.executemany("INSERT INTO empty_fields VALUES (?,?,?)", _flags(tbl, rec))
+
+def apply_updates(db: sqlite3.Connection, tbl: str, updates: list[dict[str, Any]]):
+    """PATCH-и, успешно отправленные в Airtable, — в зеркало."""
+    key_field = _key_field(db, tbl)
+    with db:
+        for u in updates:
+            row = db.execute("SELECT pos FROM records WHERE tbl=? AND id=?", (tbl, u["id"])).fetchone()
+            if row is None: continue
+            rec = _get(db, tbl, u["id"])
+            rec["fields"].update(u.get("fields", {}))
+            _put(db, tbl, rec, row[0], key_field)
+
+def insert_records(db: sqlite3.Connection, tbl: str, recs: list[dict[str, Any]]):
+    """Созданные записи (ответ POST, с id) — в конец таблицы, как их вернёт list_all."""
+    key_field = _key_field(db, tbl)
+    with db:
+        (pos,) = db.execute("SELECT COALESCE(MAX(pos), -1) + 1 FROM records WHERE tbl=?", (tbl,)).fetchone()
+        for i, r in enumerate(recs):
+            _put(db, tbl, r, pos + i, key_field)
+
+def delete_ids(db: sqlite3.Connection, tbl: str, ids: Iterable[str]):
+    with db:
+        for rid in ids:
+            db.execute("DELETE FROM records WHERE tbl=? AND id=?", (tbl, rid))
+            db.execute("DELETE FROM empty_fields WHERE tbl=? AND id=?", (tbl, rid))
+
+
+# ----------------------------------------------------------------
+#                          QUERIES
+# ----------------------------------------------------------------
+def _decode(rows) -> list[dict[str, Any]]:
+    return [{"id": r[0], "createdTime": r[1], "fields": json.loads(r[2])} for r in rows]
+
+def load(db: sqlite3.Connection, tbl: str) -> list[dict[str, Any]]:
+    if db.execute("SELECT 1 FROM sync_state WHERE tbl=?", (tbl,)).fetchone() is None:
+        raise RuntimeError(f"Таблицы {tbl} нет в зеркале — сначала: python -m src.mirror sync")
+    return _decode(db.execute("SELECT id, created_time, fields FROM records WHERE tbl=? ORDER BY pos", (tbl,)))
+
+def merge_pairs(db: sqlite3.Connection, tbl_a: str, tbl_b: str) -> Iterator[tuple[dict[str, Any], Optional[dict[str, Any]]]]:
+    """(запись B, первая запись A с тем же ключом или None) в порядке B. Записи B без ключа пропускаются."""
+    q = """
+    SELECT b.fields, a.id, a.created_time, a.fields
+    FROM records b
+    LEFT JOIN records a ON a.tbl = ? AND a.norm_key = b.norm_key AND a.pos = (
+        SELECT MIN(a2.pos) FROM records a2 WHERE a2.tbl = ? AND a2.norm_key = b.norm_key)
+    WHERE b.tbl = ? AND b.norm_key IS NOT NULL
+    ORDER BY b.pos
+    """
+    for fb, aid, act, fa in db.execute(q, (tbl_a, tbl_a, tbl_b)):
+        a = {"id": aid, "createdTime": act, "fields": json.loads(fa)} if aid else None
+        yield {"fields": json.loads(fb)}, a
+
+def duplicate_ids(db: sqlite3.Connection, tbl: str) -> list[str]:
+    """Как main.find_duplicates: в группе по ключу оставляем самую заполненную (при равенстве — первую)."""
+    q = """
+    SELECT id FROM (
+        SELECT id, ROW_NUMBER() OVER (PARTITION BY norm_key ORDER BY filled DESC, pos) AS rn
+        FROM records
+        WHERE tbl = ? AND norm_key IN (
+            SELECT norm_key FROM records WHERE tbl = ? AND norm_key IS NOT NULL
+            GROUP BY norm_key HAVING COUNT(*) > 1)
+    ) WHERE rn > 1
+    """
+    return [r[0] for r in db.execute(q, (tbl, tbl))]
+
+def candidates(db: sqlite3.Connection, tbl: str, any_empty: Iterable[str],
+               require: Iterable[str] = ()) -> list[dict[str, Any]]:
+    """Записи, где пусто хотя бы одно из any_empty и заполнены все require, в порядке list_all."""
+    any_empty, require = list(any_empty), list(require)
+    if not any_empty:
+        return []
+    flagged = [f for f in any_empty if f in FLAG_FIELDS]
+    if len(flagged) == len(any_empty) and all(f in FLAG_FIELDS for f in require):
+        marks = ",".join("?" * len(flagged))
+        q = f"""
+        SELECT r.id, r.created_time, r.fields FROM records r
+        WHERE r.tbl = ? AND r.id IN (SELECT id FROM empty_fields WHERE tbl = ? AND field IN ({marks}))
+        """
+        params: list[Any] = [tbl, tbl] + flagged
+        for f in require:
+            q += " AND NOT EXISTS (SELECT 1 FROM empty_fields e WHERE e.tbl = r.tbl AND e.field = ? AND e.id = r.id)"
+            params.append(f)
+        q += " ORDER BY r.pos"
+        return _decode(db.execute(q, params))
+    # поле без флага — проверяем по JSON
+    return [r for r in load(db, tbl)
+            if any(is_blank(r["fields"].get(f)) for f in any_empty)
+            and all(not is_blank(r["fields"].get(f)) for f in require)]
+
+def by_domain(db: sqlite3.Connection, tbl: str, domain: str) -> list[dict[str, Any]]:
+    d = normalize_key(domain).split("/", 1)[0]
+    return _decode(db.execute("SELECT id, created_time, fields FROM records WHERE tbl=? AND domain=? ORDER BY pos", (tbl, d)))
+
+
+# ----------------------------------------------------------------
+#                            CLI
+# ----------------------------------------------------------------
+def stats(db: sqlite3.Connection):
+    for tbl, key_field, synced_at, n in db.execute("SELECT tbl, key_field, synced_at, n FROM sync_state ORDER BY tbl"):
+        (cur,) = db.execute("SELECT COUNT(*) FROM records WHERE tbl=?", (tbl,)).fetchone()
+        print(f"{tbl}: {cur} записей (при синке {n}, {synced_at}), ключ: {key_field}")
+        for field, cnt in db.execute("SELECT field, COUNT(*) FROM empty_fields WHERE tbl=? GROUP BY field ORDER BY field", (tbl,)):
+            print(f"  пусто {field}: {cnt}")
+        print(f"  дубликатов к удалению: {len(duplicate_ids(db, tbl))}")
+
+def main(cmd: str, db_path: str, tables: list[str]):
+    db = open_db(db_path)
+    if cmd == "sync":
+        if not AIRTABLE_TOKEN or not AIRTABLE_BASE_ID:
+            raise SystemExit("Укажи AIRTABLE_TOKEN и AIRTABLE_BASE_ID.")
+        keys = {TABLE_A: KEY_A, TABLE_B: KEY_B}
+        for tbl in tables:
+            print(f"→ Синхронизирую {tbl} ...")
+            print(f"  записей: {sync(db, tbl, keys.get(tbl))}")
+        print("  схема: " + ("сохранена" if sync_schema(db) else "нет доступа к meta API"))
+    stats(db)
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="SQLite mirror of Airtable tables")
+    ap.add_argument("cmd", choices=["sync", "stats"])
+    ap.add_argument("--db", default="mirror.sqlite")
+    ap.add_argument("--tables", help="через запятую (по умолчанию TABLE_A,TABLE_B)")
+    args = ap.parse_args()
+    tables = [t.strip() for t in args.tables.split(",")] if args.tables else [t for t in (TABLE_A, TABLE_B) if t]
+    main(args.cmd, args.db, tables)
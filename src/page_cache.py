@@ -0,0 +1,115 @@
+"""
+Кеш извлечений по страницам: отпечаток нормализованного HTML и то, что из
+страницы извлекли экстракторы (локация, сотрудники, email, финансирование,
+ссылки-кандидаты). Повторный краул страницы с тем же отпечатком не парсит её
+заново — факты берутся из кеша; компания, у которой не изменилась ни одна
+страница, не даёт нового патча (см. enrich_lite.crawl_site).
+
+Нормализация убирает то, что меняется от запроса к запросу без изменения
+содержимого: комментарии, <script> (кроме JSON-LD), <style>, nonce и
+csrf-токены, пробелы (между тегами — целиком).
+
+    python -m src.page_cache stats --db page_cache.sqlite
+    python -m src.page_cache forget example.com --db page_cache.sqlite
+"""
+import argparse
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+from datetime import datetime, timezone
+from typing import Any, Optional
+
+from src.config import PAGE_CACHE_PATH
+
+COMMENT_RE = re.compile(r"<!--.*?-->", re.S)
+SCRIPT_RE = re.compile(r"<script\b(?![^>]*application/ld\+json)[^>]*>.*?</script\s*>", re.S | re.I)
+STYLE_RE = re.compile(r"<style\b[^>]*>.*?</style\s*>", re.S | re.I)
+NONCE_RE = re.compile(r"""\snonce=(?:"[^"]*"|'[^']*'|[^\s>]+)""", re.I)
+CSRF_RE = re.compile(r"""<meta\b[^>]*name=["']?csrf[^>]*>""", re.I)
+SPACE_RE = re.compile(r"\s+")
+GAP_RE = re.compile(r">\s+<")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS pages (
+    url         TEXT PRIMARY KEY,
+    fingerprint TEXT NOT NULL,
+    facts       TEXT NOT NULL,
+    checked_at  TEXT NOT NULL
+) WITHOUT ROWID;
+"""
+
+
+def normalize_html(html: str) -> str:
+    for rx in (COMMENT_RE, SCRIPT_RE, STYLE_RE, NONCE_RE, CSRF_RE):
+        html = rx.sub("", html)
+    return SPACE_RE.sub(" ", GAP_RE.sub("><", html)).strip()
+
+def fingerprint(html: str, *salt: str) -> str:
+    """blake2b нормализованного HTML; salt — всё, от чего ещё зависят факты (версия экстракторов, бэкенд, base url)."""
+    h = hashlib.blake2b(digest_size=16)
+    for s in salt:
+        h.update(s.encode("utf-8", "replace") + b"\0")
+    h.update(normalize_html(html).encode("utf-8", "replace"))
+    return h.hexdigest()
+
+
+class PageCache:
+    """Потокобезопасная обёртка над SQLite (worker краулит из пула потоков)."""
+
+    def __init__(self, path: str = PAGE_CACHE_PATH):
+        self.path = path
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.executescript(SCHEMA)
+        self.lock = threading.Lock()
+
+    def get(self, url: str, fp: str) -> Optional[dict[str, Any]]:
+        """Факты страницы, если её отпечаток не изменился, иначе None."""
+        with self.lock:
+            row = self.db.execute("SELECT fingerprint, facts FROM pages WHERE url=?", (url,)).fetchone()
+        if row and row[0] == fp:
+            return json.loads(row[1])
+        return None
+
+    def put(self, url: str, fp: str, facts: dict[str, Any]):
+        now = datetime.now(timezone.utc).isoformat(timespec="seconds")
+        with self.lock, self.db:
+            self.db.execute("INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?)",
+                            (url, fp, json.dumps(facts, ensure_ascii=False), now))
+
+    def forget(self, domain: str) -> int:
+        """Удаляет страницы домена и его поддоменов; сколько удалено."""
+        with self.lock, self.db:
+            return self.db.execute("DELETE FROM pages WHERE url LIKE ? OR url LIKE ?",
+                                   (f"%://{domain}/%", f"%.{domain}/%")).rowcount
+
+    def stats(self) -> tuple[int, Optional[str], Optional[str]]:
+        """(страниц, самая старая проверка, самая свежая)."""
+        with self.lock:
+            return self.db.execute("SELECT COUNT(*), MIN(checked_at), MAX(checked_at) FROM pages").fetchone()
+
+
+def open_from_args(args) -> Optional[PageCache]:
+    return None if args.no_page_cache else PageCache(args.page_cache)
+
+def add_cli_args(ap):
+    ap.add_argument("--page-cache", default=PAGE_CACHE_PATH, metavar="DB",
+                    help="SQLite-кеш извлечений по отпечатку страниц (неизменные страницы не разбираются заново)")
+    ap.add_argument("--no-page-cache", action="store_true", help="разбирать все страницы, кеш не читать и не писать")
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Per-page extraction cache keyed by content fingerprint")
+    ap.add_argument("cmd", choices=["stats", "forget"])
+    ap.add_argument("domains", nargs="*")
+    ap.add_argument("--db", default=PAGE_CACHE_PATH)
+    args = ap.parse_args()
+    cache = PageCache(args.db)
+    if args.cmd == "stats":
+        n, oldest, newest = cache.stats()
+        print(f"страниц: {n}  (проверены с {oldest or '-'} по {newest or '-'})")
+    else:
+        for d in args.domains:
+            print(f"{d}: удалено страниц {cache.forget(d)}")
@@ -1,10 +1,15 @@
-import re, urllib.parse, requests
-from typing import Any, Optional
-from w3lib.html import get_base_url
-import extruct
+import re, time, functools, threading, urllib.parse, requests
+from typing import Any, Iterator, Optional
 from urllib import robotparser
 
-from src.enrich_lite import USER_AGENT, REQ_TIMEOUT
+from src import metrics
+from src.config import (
+    USER_AGENT, CONNECT_TIMEOUT, READ_TIMEOUT, MIN_READ_TIMEOUT, SLOW_HOST_SECONDS,
+    TLDEXTRACT_CACHE_DIR, TLDEXTRACT_SUFFIX_URLS,
+)
+
+# extruct, bs4, lxml, w3lib, tldextract импортируются лениво внутри функций:
+# запуски, которые трогают только Airtable, не должны платить за их загрузку.
 
 
 def make_session() -> requests.Session:
@@ -13,6 +18,15 @@ def make_session() -> requests.Session:
     s.max_redirects = 5
     return s
 
+@functools.lru_cache(maxsize=1)
+def _tld_extractor():
+    import tldextract
+    # suffix_list_urls=() -> встроенный снапшот, никаких сетевых запросов при старте
+    return tldextract.TLDExtract(cache_dir=TLDEXTRACT_CACHE_DIR, suffix_list_urls=TLDEXTRACT_SUFFIX_URLS)
+
+def registered_domain(url: str) -> str:
+    return _tld_extractor()(url).registered_domain
+
 def norm_domain(url: str | None) -> str | None:
     if not url: return None
     u = url.strip()
@@ -31,17 +45,148 @@ def can_fetch(robots: robotparser.RobotFileParser, url: str) -> bool:
     except Exception:
         return True
 
-def fetch(session: requests.Session, url: str) -> tuple[Optional[str], Optional[str]]:
+def classify_error(e: Exception) -> str:
+    """Исход для негативного кеша доменов: timeout / dns / connect / error."""
+    if isinstance(e, requests.exceptions.Timeout):
+        return "timeout"
+    if isinstance(e, requests.exceptions.ConnectionError):
+        msg = str(e)
+        if "NameResolution" in msg or "Name or service not known" in msg or "getaddrinfo" in msg or "nodename nor servname" in msg:
+            return "dns"
+        return "connect"
+    return "error"
+
+class LatencyTracker:
+    """
+    Скользящее среднее (EWMA) времени ответа по хосту. Для хостов с историей
+    read-таймаут ужимается до ~4× их обычной латентности (быстрый сайт, который
+    вдруг завис, не держит нас 20 с); хост, стабильно отвечающий дольше
+    SLOW_HOST_SECONDS, считается медленным — краул его сайта сворачивается.
+    """
+
+    def __init__(self, alpha: float = 0.3):
+        self.alpha = alpha
+        self._lock = threading.Lock()
+        self._hosts: dict[str, list] = {}     # host -> [ewma, samples]
+
+    def observe(self, host: Optional[str], seconds: float):
+        if not host: return
+        with self._lock:
+            h = self._hosts.get(host)
+            if h is None:
+                self._hosts[host] = [seconds, 1]
+            else:
+                h[0] += self.alpha * (seconds - h[0]); h[1] += 1
+
+    def ewma(self, host: Optional[str]) -> Optional[float]:
+        with self._lock:
+            h = self._hosts.get(host or "")
+            return h[0] if h and h[1] >= 2 else None
+
+    def read_timeout(self, host: Optional[str]) -> float:
+        avg = self.ewma(host)
+        if avg is None: return READ_TIMEOUT
+        return min(READ_TIMEOUT, max(MIN_READ_TIMEOUT, 4 * avg + 1))
+
+    def is_slow(self, host: Optional[str]) -> bool:
+        avg = self.ewma(host)
+        return avg is not None and avg > SLOW_HOST_SECONDS
+
+latency = LatencyTracker()
+
+
+def _get(session: requests.Session, url: str, deadline: Optional[float] = None):
+    """
+    GET с раздельными connect/read таймаутами: read — по истории хоста и не дальше
+    deadline (time.monotonic() бюджета компании). (response | None, исход).
+    """
+    host = norm_domain(url)
+    read = latency.read_timeout(host)
+    if deadline is not None:
+        left = deadline - time.monotonic()
+        if left <= 0:
+            metrics.inc("site_budget_exhausted")
+            return None, "timeout"
+        read = min(read, left)
+    t0 = time.perf_counter()
     try:
-        r = session.get(url, timeout=REQ_TIMEOUT)
-        if r.status_code >= 400:
-            return None, None
-        base = get_base_url(r.text, r.url)
-        return r.text, base
-    except Exception:
-        return None, None
+        r = session.get(url, timeout=(min(CONNECT_TIMEOUT, read), read))
+    except Exception as e:
+        elapsed = time.perf_counter() - t0
+        metrics.record_fetch(host, elapsed, type(e).__name__)
+        outcome = classify_error(e)
+        if outcome == "timeout": latency.observe(host, read)   # штраф: таймаут как ответ за read с
+        return None, outcome
+    elapsed = time.perf_counter() - t0
+    metrics.record_fetch(host, elapsed, r.status_code, len(r.content or b""))
+    latency.observe(host, elapsed)
+    return r, "ok"
+
+def fetch_page(session: requests.Session, url: str, deadline: Optional[float] = None) -> tuple[Optional[str], Optional[str], str]:
+    """(html, base_url, исход): исход — ok / http_4xx / http_5xx / timeout / dns / connect / error."""
+    r, outcome = _get(session, url, deadline)
+    if r is None:
+        return None, None, outcome
+    if r.status_code >= 400:
+        return None, None, "http_5xx" if r.status_code >= 500 else "http_4xx"
+    from w3lib.html import get_base_url
+    base = get_base_url(r.text, r.url)
+    return r.text, base, "ok"
+
+def load_robots(session: requests.Session, url: str, deadline: Optional[float] = None) -> tuple[robotparser.RobotFileParser, str]:
+    """
+    robots.txt через нашу сессию (с таймаутами — urllib в RobotFileParser.read ждёт
+    без таймаута). Семантика кодов как у read(): 401/403 — запрещено всё, прочие 4xx —
+    разрешено всё. Исход ok, либо http_5xx / timeout / dns / connect / error — сайт недоступен.
+    """
+    rp = robotparser.RobotFileParser(url)
+    r, outcome = _get(session, url, deadline)
+    if r is None:
+        return rp, outcome
+    if r.status_code in (401, 403):
+        rp.disallow_all = True
+    elif r.status_code >= 500:
+        return rp, "http_5xx"
+    elif r.status_code >= 400:
+        rp.allow_all = True
+    else:
+        rp.parse(r.text.splitlines())
+    return rp, "ok"
+
+def site_origins(domain: str, scheme: str = "https", fallback: bool = False) -> list[str]:
+    """Origin сайта; с fallback — ещё www-вариант и http (для https), основной первым."""
+    hosts = [domain] + ([f"www.{domain}"] if fallback and not domain.startswith("www.") else [])
+    schemes = [scheme] + (["http"] if fallback and scheme == "https" else [])
+    return [f"{sc}://{h}" for sc in schemes for h in hosts]
 
+def first_ok(fn, variants: list):
+    """
+    fn(v) для всех вариантов параллельно -> (вариант, результат) первого, вернувшего
+    исход ok (последний элемент кортежа), иначе первого варианта. Один вариант — без потоков.
+    Проигравшие запросы не отменяются, но ограничены своими таймаутами.
+    """
+    if len(variants) == 1:
+        return variants[0], fn(variants[0])
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+    pool = ThreadPoolExecutor(max_workers=len(variants), thread_name_prefix="hedge")
+    futs = {pool.submit(fn, v): v for v in variants}
+    results = {}
+    try:
+        for fut in as_completed(futs):
+            results[futs[fut]] = res = fut.result()
+            if res[-1] == "ok":
+                return futs[fut], res
+    finally:
+        pool.shutdown(wait=False)
+    return variants[0], results[variants[0]]
+
+def fetch(session: requests.Session, url: str) -> tuple[Optional[str], Optional[str]]:
+    html, base, _ = fetch_page(session, url)
+    return html, base
+
+@metrics.extractor
 def extract_jsonld(html: str, base_url: str) -> list[dict[str, Any]]:
+    import extruct
     try:
         data = extruct.extract(html, base_url=base_url, syntaxes=["json-ld"], errors="ignore")
         return data.get("json-ld", []) or []
@@ -89,4 +234,132 @@ def normalize_money(groups: dict[str,str]) -> str:
     cur = groups.get("cur") or ""
     num = groups.get("num") or ""
     suf = (groups.get("suf") or "").lower()
-    return f"{cur}{num}{(' ' + suf) if suf else ''}"
\ No newline at end of file
+    return f"{cur}{num}{(' ' + suf) if suf else ''}"
+
+
+# ----------------------------------------------------------------
+#                 HTML PAGE BACKENDS (bs4 / lxml)
+# ----------------------------------------------------------------
+# Экстракторы работают с Page, а не с конкретным деревом: "bs4" — эталонный
+# (BeautifulSoup поверх lxml), "lxml" — быстрый путь по сырому lxml-дереву.
+PARSER_BACKENDS = ("bs4", "lxml")
+
+TEAM_CARD_CSS = '[class*="team"], [class*="member"], [class*="person"], [class*="staff"], [id*="team"]'
+TEAM_CARD_XPATH = (
+    "//*[contains(@class,'team') or contains(@class,'member') or contains(@class,'person')"
+    " or contains(@class,'staff') or contains(@id,'team')]"
+)
+TEAM_CARD_CHILD_XPATH = "boolean(.//img or .//figure or .//h1 or .//h2 or .//h3 or .//h4 or .//h5 or .//h6)"
+HEADING_RE = re.compile("^h[1-6]$")
+NON_TEXT_TAGS = {"script", "style", "template"}
+MAX_TEAM_CARDS = 200
+
+
+class Bs4Page:
+    def __init__(self, html: str):
+        from bs4 import BeautifulSoup
+        self.soup = BeautifulSoup(html, "lxml")
+
+    def hrefs(self) -> list[str]:
+        return [a["href"] for a in self.soup.find_all("a", href=True)]
+
+    def team_cards(self) -> int:
+        n = 0
+        for el in self.soup.select(TEAM_CARD_CSS):
+            if el.find(["img", "figure"]) or el.find(HEADING_RE):
+                n += 1
+                if n >= MAX_TEAM_CARDS: break
+        return n
+
+    def strings(self) -> Iterator[str]:
+        return self.soup.stripped_strings
+
+    def text(self) -> str:
+        return self.soup.get_text(" ", strip=True)
+
+    def meta_content(self, attr: str) -> Optional[str]:
+        tag = self.soup.find("meta", attrs={"property": attr}) or self.soup.find("meta", attrs={"name": attr})
+        return tag.get("content") if tag else None
+
+    def time_datetime(self) -> Optional[str]:
+        t = self.soup.find("time")
+        return t.get("datetime") if t else None
+
+    def footer_text(self) -> Optional[str]:
+        footer = self.soup.find("footer")
+        return footer.get_text(" ", strip=True) if footer else None
+
+
+class LxmlPage:
+    def __init__(self, html: str):
+        from lxml import html as lxml_html
+        try:
+            self.root = lxml_html.document_fromstring(html)
+        except ValueError:
+            # строка с <?xml encoding=...?> или пустой документ
+            try:
+                self.root = lxml_html.document_fromstring(html.encode("utf-8"))
+            except Exception:
+                self.root = lxml_html.Element("html")
+        except Exception:
+            self.root = lxml_html.Element("html")
+
+    def hrefs(self) -> list[str]:
+        return [a.get("href") for a in self.root.iter("a") if a.get("href") is not None]
+
+    def team_cards(self) -> int:
+        n = 0
+        for el in self.root.xpath(TEAM_CARD_XPATH):
+            if el.xpath(TEAM_CARD_CHILD_XPATH):
+                n += 1
+                if n >= MAX_TEAM_CARDS: break
+        return n
+
+    @staticmethod
+    def _strings(root) -> Iterator[str]:
+        from lxml import etree
+        # порядок как у bs4.stripped_strings: text на входе в тег, tail на выходе.
+        # Поддерево script/style/template пропускаем целиком (bs4 не отдаёт и текст
+        # вложенных тегов, напр. <template><p>..</p></template>), tail самого тега — отдаём.
+        hidden = 0
+        for event, el in etree.iterwalk(root, events=("start", "end")):
+            skip = isinstance(el.tag, str) and el.tag in NON_TEXT_TAGS
+            if event == "start":
+                if skip:
+                    hidden += 1
+                elif not hidden and isinstance(el.tag, str) and el.text:
+                    s = el.text.strip()
+                    if s: yield s
+                continue
+            if skip:
+                hidden -= 1
+            if not hidden and el is not root and el.tail:
+                s = el.tail.strip()
+                if s: yield s
+
+    def strings(self) -> Iterator[str]:
+        return self._strings(self.root)
+
+    def text(self) -> str:
+        return " ".join(self._strings(self.root))
+
+    def meta_content(self, attr: str) -> Optional[str]:
+        tags = self.root.xpath("//meta[@property=$v][1]", v=attr) or self.root.xpath("//meta[@name=$v][1]", v=attr)
+        return tags[0].get("content") if tags else None
+
+    def time_datetime(self) -> Optional[str]:
+        t = next(self.root.iter("time"), None)
+        return t.get("datetime") if t is not None else None
+
+    def footer_text(self) -> Optional[str]:
+        footer = next(self.root.iter("footer"), None)
+        return " ".join(self._strings(footer)) if footer is not None else None
+
+
+@metrics.extractor
+def parse_page(html: str, backend: str = "bs4"):
+    if backend == "lxml":
+        return LxmlPage(html)
+    if backend == "bs4":
+        return Bs4Page(html)
+    raise ValueError(f"Unknown parser backend: {backend}")
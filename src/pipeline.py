@@ -0,0 +1,245 @@
+"""
+Ночной цикл одной командой: merge B -> A, заполнение из nodes.json, обогащение с сайтов
+и (опционально, платно) через Exa.
+
+В отличие от запуска src.main, src.enrich_from_nodes и src.enrich_lite по очереди:
+  - A читается один раз, все стадии работают с его копией в памяти;
+  - каждая стадия видит поля, уже заполненные предыдущими (сайты краулим
+    только для того, что осталось пустым, Exa спрашиваем после сайтов);
+  - патчи склеиваются по id записи, новые записи создаются уже обогащёнными,
+    дубликаты удаляются без повторного чтения A — одна запись в Airtable на запись.
+
+    python -m src.pipeline --nodes nodes.json --crawl-limit 50 [--exa-limit 20] [--dry-run]
+"""
+import argparse
+from datetime import datetime, timezone
+from typing import Any, Optional
+
+from src.helpers import (
+    iter_all, batch_create, batch_update, batch_delete, diff_patch,
+    get_allowed_multiselect_options, field_types,
+)
+from src import metrics, mirror, profiling, reports, domain_cache, page_cache as pagecache
+from src.profiling import phase
+from src.records import Record, compact, from_raw
+from src.config import AIRTABLE_TOKEN, AIRTABLE_BASE_ID, TABLE_A, TABLE_B, PARSER_BACKEND
+from src import main as merge
+from src import enrich_from_nodes as nodes_fill
+from src import enrich_lite as site
+from src import enrich_exa as exa
+from src.parsing_helpers import PARSER_BACKENDS
+
+NEW_PREFIX = "new:"   # временные id записей, которые ещё предстоит создать
+
+
+def is_new(rid: str) -> bool:
+    return rid.startswith(NEW_PREFIX)
+
+
+class Workset:
+    """Копия A в памяти (src.records.Record) + накопленные изменения (патчи по id, новые записи, удаления)."""
+
+    def __init__(self, records: list[Record], types: Optional[dict[str, str]] = None):
+        self.records = records
+        self.types = types or {}
+        self.by_id = {r["id"]: r for r in records}
+        self.pending: dict[str, dict[str, Any]] = {}
+        self.deleted: set[str] = set()
+        self.patches_seen = 0
+
+    def add_new(self, fields: dict[str, Any]) -> Record:
+        rec = from_raw({"id": f"{NEW_PREFIX}{len(self.records)}", "fields": fields}, merge.KEY_A)
+        self.records.append(rec)
+        self.by_id[rec["id"]] = rec
+        return rec
+
+    def apply(self, rid: str, patch: dict[str, Any]):
+        if rid in self.deleted: return
+        # no-op поля (совпадают с текущим значением с точностью до формата) не копим
+        patch = diff_patch(self.by_id[rid].get("fields", {}), patch, self.types)
+        if not patch: return
+        self.patches_seen += 1
+        self.by_id[rid].update(patch)
+        if not is_new(rid):
+            self.pending.setdefault(rid, {}).update(patch)
+
+    def delete(self, rid: str):
+        self.deleted.add(rid)
+        self.pending.pop(rid, None)
+
+    def live(self) -> list[Record]:
+        return [r for r in self.records if r["id"] not in self.deleted]
+
+    def creates(self) -> list[dict[str, Any]]:
+        return [{"fields": r["fields"]} for r in self.records if is_new(r["id"]) and r["id"] not in self.deleted]
+
+    def updates(self) -> list[dict[str, Any]]:
+        return [{"id": rid, "fields": p} for rid, p in self.pending.items() if p]
+
+    def deletes(self) -> list[str]:
+        return [rid for rid in self.deleted if not is_new(rid)]
+
+
+def stage_merge(ws: Workset, B: list[dict[str, Any]], allowed_draw_opts, report=None) -> tuple[int, int]:
+    to_create, to_update = merge.build_merge(ws.records, B, allowed_draw_opts, report=report)
+    for u in to_update:
+        ws.apply(u["id"], u["fields"])
+    for c in to_create:
+        ws.add_new(c["fields"])
+    return len(to_create), len(to_update)
+
+def stage_dedup(ws: Workset, report=None) -> int:
+    # count_filled видит уже смёрженные поля — как дедуп в src.main после записи
+    to_del = merge.find_duplicates(ws.live(), report)
+    for rid in to_del:
+        ws.delete(rid)
+    return len(to_del)
+
+def stage_nodes(ws: Workset, nodes_path: str, report=None) -> int:
+    report = report or reports.NullSink()
+    by_name, by_site = nodes_fill.load_nodes(nodes_path)
+    print(f"  nodes.json: по имени {len(by_name)}, по сайту {len(by_site)}")
+    filled = 0
+    for rec in ws.live():
+        fa = rec.get("fields", {})
+        if not nodes_fill.needs_fill(fa): continue
+        node = nodes_fill.match_node(fa, by_name, by_site)
+        if not node: continue
+        patch, filled_fields = nodes_fill.node_patch(fa, node, ws.types)
+        if patch:
+            ws.apply(rec["id"], patch)
+            filled += 1
+            report.write({"stage": "nodes", "action": "update", "record_id": rec["id"],
+                          "company": fa.get(merge.KEY_A), "fields": ", ".join(filled_fields)})
+    return filled
+
+def stage_site(ws: Workset, limit: int, parser: Optional[str], report=None, cache=None,
+               page_cache=None) -> tuple[int, int]:
+    report = report or reports.NullSink()
+    targets = [r for r in ws.live() if site.is_target(r.get("fields", {}))]
+    targets, n_cached = site.schedulable(targets, cache)
+    print(f"  Кандидатов для сайтов (после merge и nodes): {len(targets)}, берём {min(limit, len(targets))}"
+          f" (пропущено по кешу доменов: {n_cached})")
+    enriched = 0
+    for rec in targets[:limit]:
+        patch, inserted = site.enrich_record(rec.get("fields", {}), parser=parser, cache=cache, page_cache=page_cache)
+        ws.apply(rec["id"], patch)
+        if inserted:
+            enriched += 1
+            report.write({"stage": "site", "action": "update", "record_id": rec["id"],
+                          "company": rec.get("fields", {}).get(site.FIELD_COMPANY), "fields": ", ".join(inserted)})
+    return enriched, min(limit, len(targets))
+
+def stage_exa(ws: Workset, limit: int, source, report=None) -> tuple[int, int]:
+    report = report or reports.NullSink()
+    # с сайтом — только уже краулённые (в этом прогоне или раньше): платный поиск после бесплатного
+    targets = [r for r in ws.live() if exa.is_target(r.get("fields", {}), after_site=True)][:limit]
+    print(f"  Кандидатов для Exa (пусто после сайтов): {len(targets)}")
+    enriched = 0
+    for rec, patch, inserted in exa.enrich_records(targets, source):
+        ws.apply(rec["id"], patch)
+        if inserted:
+            enriched += 1
+            report.write({"stage": "exa", "action": "update", "record_id": rec["id"],
+                          "company": rec.get("fields", {}).get(site.FIELD_COMPANY), "fields": ", ".join(inserted)})
+    print(f"  Exa: платных запросов {source.calls}, из кеша {source.cache_hits}")
+    return enriched, len(targets)
+
+
+def main(nodes_path: Optional[str], crawl_limit: int, dry_run: bool = False,
+         skip_merge: bool = False, parser: Optional[str] = None, mirror_path: Optional[str] = None,
+         report_formats: Optional[list[str]] = None, cache=None, exa_limit: int = 0, exa_source=None,
+         page_cache=None):
+    if not AIRTABLE_TOKEN or not AIRTABLE_BASE_ID:
+        raise SystemExit("Укажи AIRTABLE_TOKEN и AIRTABLE_BASE_ID.")
+
+    db = mirror.open_db(mirror_path) if mirror_path else None
+    load = (lambda tbl: mirror.load(db, tbl)) if db is not None else iter_all
+
+    with phase("schema fetch"):
+        types = mirror.field_types(db, TABLE_A) if db is not None else field_types(TABLE_A)
+
+    print(f"→ Загружаю A ({TABLE_A}) ...")
+    with phase("load A"):
+        ws = Workset(compact(load(TABLE_A), merge.KEY_A), types)   # все поля: их читают nodes и site
+    print(f"  Получено из A: {len(ws.records)}")
+
+    # строки отчёта пишутся по ходу стадий — прерванный прогон оставляет то, что успел
+    report = reports.ReportSink(f"pipeline_report_{datetime.now(timezone.utc):%Y%m%d_%H%M%S}", merge.REPORT_FIELDS,
+                                report_formats or ["csv"], flush_every=500)
+    with report:
+        if not skip_merge:
+            print(f"→ Загружаю B ({TABLE_B}) ...")
+            with phase("load B"):
+                B = compact(load(TABLE_B), merge.KEY_B, keep=merge.KEEP_B)
+            print(f"  Получено из B: {len(B)}")
+            with phase("schema fetch"):
+                if db is not None:
+                    allowed_draw_opts = mirror.allowed_options(db, TABLE_A, "drawdown_solutions")
+                else:
+                    allowed_draw_opts = get_allowed_multiselect_options(TABLE_A, "drawdown_solutions")
+            with phase("merge"):
+                n_new, n_upd = stage_merge(ws, B, allowed_draw_opts, report)
+            print(f"  merge: новых {n_new}, патчей {n_upd}")
+
+        with phase("dedup"):
+            n_dup = stage_dedup(ws, report)
+        print(f"  dedup: к удалению {n_dup}")
+
+        if nodes_path:
+            with phase("nodes"):
+                n_nodes = stage_nodes(ws, nodes_path, report)
+            print(f"  nodes: дополнено записей {n_nodes}")
+
+        if crawl_limit > 0:
+            # внутри enrich_record — своя фаза "crawl" на каждую запись; одно имя посчитало бы время дважды
+            with phase("site"):
+                n_site, n_crawled = stage_site(ws, crawl_limit, parser, report, cache, page_cache)
+            print(f"  site: обогащено {n_site} из {n_crawled}")
+
+        if exa_limit > 0 and exa_source is not None:
+            # фаза "exa" — внутри enrich_records (пакетный lookup), вторая обёртка посчитала бы его дважды
+            n_exa, n_asked = stage_exa(ws, exa_limit, exa_source, report)
+            print(f"  exa: обогащено {n_exa} из {n_asked}")
+    print(f"  Отчёт: {', '.join(report.paths)} (строк: {report.rows})")
+
+    creates, updates, deletes = ws.creates(), ws.updates(), ws.deletes()
+    print(f"Запись: создать {len(creates)}, обновить {len(updates)} (из {ws.patches_seen} патчей), удалить {len(deletes)}")
+    with phase("write"):
+        created = batch_create(TABLE_A, creates, dry=dry_run, drop_unknown=True) if creates else []
+        if updates: batch_update(TABLE_A, updates, dry=dry_run, drop_unknown=True, types=ws.types)
+        if deletes: batch_delete(TABLE_A, deletes, dry=dry_run)
+    if db is not None and not dry_run:
+        mirror.insert_records(db, TABLE_A, created)
+        mirror.apply_updates(db, TABLE_A, updates)
+        mirror.delete_ids(db, TABLE_A, deletes)
+
+    with phase("report"):
+        merge.save_missing_options()
+
+    print("Готово")
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Nightly pipeline: merge B -> A, nodes.json fill, site enrichment, single write")
+    ap.add_argument("--nodes", help="путь к nodes.json (без него стадия пропускается)")
+    ap.add_argument("--crawl-limit", type=int, default=10, help="сколько компаний обогащать с сайтов (0 — не краулить)")
+    ap.add_argument("--exa-limit", type=int, default=0,
+                    help="сколько компаний, пустых после сайтов, искать через Exa (0 — не искать; платно)")
+    ap.add_argument("--skip-merge", action="store_true", help="не загружать B и не мержить")
+    ap.add_argument("--parser", choices=PARSER_BACKENDS, default=PARSER_BACKEND, help="HTML backend for extractors")
+    ap.add_argument("--dry-run", action="store_true")
+    ap.add_argument("--mirror", metavar="DB", help="читать A/B из SQLite-зеркала и обновлять его после записи")
+    reports.add_cli_args(ap)
+    domain_cache.add_cli_args(ap)
+    pagecache.add_cli_args(ap)
+    exa.add_cli_args(ap)
+    metrics.add_cli_args(ap)
+    profiling.add_cli_args(ap)
+    args = ap.parse_args()
+    metrics.setup_from_args(args)
+    profiling.setup_from_args(args)
+    main(args.nodes, args.crawl_limit, dry_run=args.dry_run, skip_merge=args.skip_merge, parser=args.parser,
+         mirror_path=args.mirror, report_formats=reports.formats_from_args(args), cache=domain_cache.open_from_args(args),
+         exa_limit=args.exa_limit, exa_source=exa.source_from_args(args) if args.exa_limit > 0 else None,
+         page_cache=pagecache.open_from_args(args) if args.crawl_limit > 0 else None)
@@ -0,0 +1,114 @@
+import atexit
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+# ----------------------------------------------------------------
+#   Таймеры фаз (wall + CPU) для --profile. Фазы накапливаются по имени,
+#   вложенные (parse внутри crawl) печатаются с отступом.
+#   Выключено по умолчанию — phase() тогда ничего не замеряет.
+# ----------------------------------------------------------------
+ENABLED = False
+
+_lock = threading.Lock()
+_phases: dict[str, list] = {}          # name -> [wall, cpu, calls, depth]
+_local = threading.local()
+_run_started = time.perf_counter()
+_run_cpu_started = time.process_time()
+
+
+def enable(on: bool = True):
+    global ENABLED, _run_started, _run_cpu_started
+    ENABLED = on
+    _run_started, _run_cpu_started = time.perf_counter(), time.process_time()
+
+@contextmanager
+def phase(name: str):
+    if not ENABLED:
+        yield; return
+    depth = getattr(_local, "depth", 0)
+    _local.depth = depth + 1
+    with _lock:
+        # регистрируем при входе, чтобы родитель печатался раньше вложенных
+        p = _phases.setdefault(name, [0.0, 0.0, 0, depth])
+    # CPU считаем по потоку: фазы из рабочих потоков не должны суммировать чужое время
+    t0, c0 = time.perf_counter(), time.thread_time()
+    try:
+        yield
+    finally:
+        wall, cpu = time.perf_counter() - t0, time.thread_time() - c0
+        _local.depth = depth
+        with _lock:
+            p[0] += wall; p[1] += cpu; p[2] += 1
+
+def phases() -> list[dict]:
+    with _lock:
+        return [{"phase": n, "wall_s": round(v[0], 4), "cpu_s": round(v[1], 4), "calls": v[2], "depth": v[3]}
+                for n, v in _phases.items()]
+
+def report(out=None) -> str:
+    out = out or sys.stdout
+    total_wall = time.perf_counter() - _run_started
+    total_cpu = time.process_time() - _run_cpu_started
+    lines = ["", "==== PROFILE ====", f"{'phase':<24}{'wall s':>10}{'cpu s':>10}{'calls':>8}{'% wall':>8}"]
+    for p in phases():
+        name = "  " * p["depth"] + p["phase"]
+        pct = 100 * p["wall_s"] / total_wall if total_wall else 0
+        lines.append(f"{name:<24}{p['wall_s']:>10.3f}{p['cpu_s']:>10.3f}{p['calls']:>8}{pct:>7.1f}%")
+    lines.append(f"{'TOTAL (process)':<24}{total_wall:>10.3f}{total_cpu:>10.3f}")
+    if tracemalloc.is_tracing():
+        cur, peak = tracemalloc.get_traced_memory()
+        lines.append(f"traced memory: current {cur / 2**20:.1f} MiB, peak {peak / 2**20:.1f} MiB")
+    lines.append("=================")
+    text = "\n".join(lines)
+    print(text, file=out)
+    return text
+
+
+# ----------------------------------------------------------------
+#                          CLI
+# ----------------------------------------------------------------
+def add_cli_args(ap):
+    ap.add_argument("--profile", action="store_true", help="замер wall/CPU по фазам, таблица при выходе")
+    ap.add_argument("--cprofile", metavar="PATH", help="cProfile всего запуска в PATH (.prof, смотреть snakeviz/pstats)")
+    ap.add_argument("--tracemalloc", metavar="PATH", help="tracemalloc: топ аллокаций по строкам в PATH")
+
+def setup_from_args(args):
+    if not (args.profile or args.cprofile or args.tracemalloc):
+        return
+    enable()
+    prof = None
+    if args.cprofile:
+        import cProfile
+        prof = cProfile.Profile()
+        prof.enable()
+    if args.tracemalloc:
+        tracemalloc.start(25)
+
+    def at_exit():
+        if prof is not None:
+            prof.disable()
+        report()
+        if prof is not None:
+            try:
+                import pstats
+                prof.dump_stats(args.cprofile)
+                with open(os.path.splitext(args.cprofile)[0] + ".txt", "w", encoding="utf-8") as f:
+                    pstats.Stats(prof, stream=f).sort_stats("cumulative").print_stats(60)
+                print(f"cProfile saved: {args.cprofile}")
+            except Exception as e:
+                print(f"Failed to write cProfile: {e}")
+        if args.tracemalloc and tracemalloc.is_tracing():
+            try:
+                snap = tracemalloc.take_snapshot()
+                with open(args.tracemalloc, "w", encoding="utf-8") as f:
+                    for st in snap.statistics("lineno")[:50]:
+                        f.write(f"{st}\n")
+                print(f"tracemalloc top saved: {args.tracemalloc}")
+            except Exception as e:
+                print(f"Failed to write tracemalloc: {e}")
+            tracemalloc.stop()
+    atexit.register(at_exit)
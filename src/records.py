@@ -0,0 +1,114 @@
+"""
+Компактные записи Airtable для больших таблиц (A/B на сотни тысяч записей).
+
+Сырой ответ list_all — dict {"id", "createdTime", "fields": {...}} на запись,
+и в каждой странице свои копии строк с именами полей. Здесь запись — объект
+со __slots__: нормализованный ключ и count_filled считаются один раз при
+загрузке, имена полей интернируются, в памяти остаются только нужные поля
+(keep), а от полей, где важна лишь заполненность (flags), — True. Страницы
+конвертируются по мере прихода (helpers.iter_all) — сырая копия всей таблицы
+в памяти не собирается.
+
+Record отвечает на rec["id"], rec["fields"] и rec.get("fields", {}), поэтому код,
+написанный под сырые записи (build_merge, стадии pipeline), работает с ним как есть.
+"""
+import sys
+from typing import Any, Iterable, Iterator, Optional
+
+from src.helpers import iter_all, normalize_key, count_filled
+
+
+class Record:
+    __slots__ = ("id", "fields", "key", "filled")
+
+    def __init__(self, rid: str, fields: dict[str, Any], key: str = "", filled: Optional[int] = None):
+        self.id = rid
+        self.fields = fields
+        self.key = key          # normalize_key поля, по которому запись загружена (KEY_A / KEY_B)
+        self.filled = count_filled(fields) if filled is None else filled   # по всем полям, до проекции
+
+    def __getitem__(self, k: str) -> Any:
+        if k == "id": return self.id
+        if k == "fields": return self.fields
+        raise KeyError(k)
+
+    def get(self, k: str, default: Any = None) -> Any:
+        if k == "id": return self.id
+        if k == "fields": return self.fields
+        return default
+
+    def update(self, patch: dict[str, Any]):
+        """Патч полей с пересчётом filled по изменённым полям (ключ не пересчитываем — его не патчат)."""
+        self.filled += count_filled(patch) - count_filled({k: self.fields.get(k) for k in patch})
+        self.fields.update(patch)
+
+    def to_dict(self) -> dict[str, Any]:
+        return {"id": self.id, "fields": self.fields}
+
+    def __repr__(self):
+        return f"Record({self.id!r}, key={self.key!r}, filled={self.filled})"
+
+
+def from_raw(rec: dict[str, Any], key_field: Optional[str], keep: Optional[set[str]] = None,
+             flags: frozenset[str] = frozenset()) -> Record:
+    f = rec.get("fields") or {}
+    fields = {}
+    for k, v in f.items():
+        if k in flags:
+            if count_filled({k: v}): fields[sys.intern(k)] = True
+        elif keep is None or k in keep:
+            fields[sys.intern(k)] = v
+    return Record(rec["id"], fields, normalize_key(f.get(key_field)) if key_field else "", count_filled(f))
+
+def compact(raw: Iterable[dict[str, Any]], key_field: Optional[str], keep: Optional[Iterable[str]] = None,
+            flags: Iterable[str] = ()) -> list[Record]:
+    keep = {sys.intern(k) for k in keep} if keep is not None else None
+    flags = frozenset(sys.intern(k) for k in flags)
+    return [from_raw(r, key_field, keep, flags) for r in raw]
+
+def load(table: str, key_field: Optional[str], keep: Optional[Iterable[str]] = None,
+         flags: Iterable[str] = ()) -> list[Record]:
+    """
+    Таблица целиком в виде Record. keep — какие поля держать в памяти (None — все),
+    flags — поля, от которых нужно только «заполнено ли» (значение заменяется на
+    True, пустые не хранятся). Запрашиваются всё равно все поля: fields[] с
+    несуществующим именем даёт 422, а filled считается по полной записи.
+    """
+    return compact(iter_all(table), key_field, keep, flags)
+
+
+# ----------------------------------------------------------------
+#   Индексы по ключу. Для dict-записей (зеркало, старые вызовы) ключ и
+#   заполненность считаются на месте, для Record — берутся готовые.
+# ----------------------------------------------------------------
+def key_of(rec, key_field: str) -> str:
+    if isinstance(rec, Record): return rec.key
+    return normalize_key(rec.get("fields", {}).get(key_field))
+
+def filled_of(rec) -> int:
+    if isinstance(rec, Record): return rec.filled
+    return count_filled(rec.get("fields", {}))
+
+def first_by_key(recs: Iterable, key_field: str) -> dict[str, Any]:
+    """ключ -> первая запись с ним (без списков на каждый ключ — дубликаты редки)."""
+    out: dict[str, Any] = {}
+    for r in recs:
+        k = key_of(r, key_field)
+        if k and k not in out:
+            out[k] = r
+    return out
+
+def duplicate_groups(recs: Iterable, key_field: str) -> Iterator[list]:
+    """Группы записей с одинаковым ключом (2+), в порядке первого появления ключа и записей."""
+    first: dict[str, Any] = {}
+    groups: dict[str, list] = {}
+    for r in recs:
+        k = key_of(r, key_field)
+        if not k: continue
+        if k in first:
+            groups.setdefault(k, [first[k]]).append(r)
+        else:
+            first[k] = r
+    for k in first:
+        if k in groups:
+            yield groups[k]
@@ -0,0 +1,190 @@
+import csv
+import json
+import os
+from typing import Any, Optional
+
+# ----------------------------------------------------------------
+#   Потоковые отчёты: строка пишется сразу, как только получена, файлы
+#   сбрасываются на диск каждые flush_every строк и при закрытии — память
+#   не растёт с размером таблицы, прерванный прогон оставляет отчёт до
+#   последней пачки. Форматы: csv, jsonl, parquet (нужен pyarrow).
+# ----------------------------------------------------------------
+FORMATS = ("csv", "jsonl", "parquet")
+PARQUET_ROW_GROUP = 5000
+
+
+class _Csv:
+    def __init__(self, path: str, fields: list[str]):
+        self.f = open(path, "w", newline="", encoding="utf-8")
+        self.w = csv.DictWriter(self.f, fieldnames=fields, extrasaction="ignore")
+        self.w.writeheader()
+
+    def write(self, row: dict[str, Any]): self.w.writerow(row)
+    def flush(self): self.f.flush()
+    def close(self): self.f.close()
+
+
+class _Jsonl:
+    def __init__(self, path: str, fields: list[str]):
+        self.f = open(path, "w", encoding="utf-8")
+
+    def write(self, row: dict[str, Any]): self.f.write(json.dumps(row, ensure_ascii=False) + "\n")
+    def flush(self): self.f.flush()
+    def close(self): self.f.close()
+
+
+class _Parquet:
+    """Колонки — строки (как в CSV). Строки копятся до row group, затем пишутся;
+    файл валиден только после close() — для прерванного прогона смотреть CSV/JSONL."""
+
+    def __init__(self, path: str, fields: list[str]):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise SystemExit("Parquet-отчёт требует pyarrow: pip install pyarrow")
+        self.pa = pa
+        self.fields = fields
+        self.schema = pa.schema([(f, pa.string()) for f in fields])
+        self.w = pq.ParquetWriter(path, self.schema)
+        self.buf: list[dict[str, Any]] = []
+
+    def write(self, row: dict[str, Any]):
+        self.buf.append(row)
+        if len(self.buf) >= PARQUET_ROW_GROUP:
+            self._write_group()
+
+    def _write_group(self):
+        if not self.buf: return
+        cols = {f: [None if r.get(f) is None else str(r.get(f)) for r in self.buf] for f in self.fields}
+        self.w.write_table(self.pa.Table.from_pydict(cols, schema=self.schema))
+        self.buf = []
+
+    def flush(self):
+        pass   # мелкие row group'ы на каждую пачку раздувают файл — пишем по PARQUET_ROW_GROUP
+
+    def close(self):
+        self._write_group()
+        self.w.close()
+
+
+_WRITERS = {"csv": _Csv, "jsonl": _Jsonl, "parquet": _Parquet}
+
+
+class ReportSink:
+    """
+    Отчёт в несколько форматов сразу: base_path + .csv / .jsonl / .parquet.
+
+        with ReportSink("enrichment_report_X", fields, ["csv", "jsonl"]) as rep:
+            rep.write(row)
+    """
+
+    def __init__(self, base_path: str, fields: list[str], formats: Optional[list[str]] = None, flush_every: int = 50):
+        self.fields = fields
+        self.flush_every = flush_every
+        self.rows = 0
+        self.paths: list[str] = []
+        self._writers = []
+        for fmt in formats or ["csv"]:
+            path = f"{base_path}.{fmt}"
+            self._writers.append(_WRITERS[fmt](path, fields))
+            self.paths.append(path)
+
+    def write(self, row: dict[str, Any]):
+        for w in self._writers:
+            w.write(row)
+        self.rows += 1
+        if self.rows % self.flush_every == 0:
+            self.flush()
+
+    def flush(self):
+        for w in self._writers:
+            w.flush()
+
+    def close(self, drop_empty: bool = False):
+        """drop_empty — не оставлять файлы без строк (как раньше, когда отчёт писался только при наличии строк)."""
+        for w in self._writers:
+            try:
+                w.close()
+            except Exception as e:
+                print(f"Failed to close report: {e}")
+        self._writers = []
+        if drop_empty and not self.rows:
+            for p in self.paths:
+                try: os.remove(p)
+                except OSError: pass
+            self.paths = []
+
+    def __enter__(self): return self
+    def __exit__(self, *exc): self.close()
+
+
+class NullSink:
+    """Заглушка для кода, который пишет отчёт только когда его попросили."""
+    rows = 0
+    paths: list[str] = []
+
+    def write(self, row: dict[str, Any]): pass
+    def flush(self): pass
+    def close(self, drop_empty: bool = False): pass
+
+
+def read_rows(path: str):
+    """Строки отчёта из .csv или .jsonl (по расширению)."""
+    with open(path, newline="", encoding="utf-8") as f:
+        if path.endswith(".csv"):
+            yield from csv.DictReader(f)
+        else:
+            for line in f:
+                line = line.strip()
+                if not line: continue
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    pass   # оборванная последняя строка прерванного прогона
+
+def merge_reports(paths: list[str], out_base: str, formats: Optional[list[str]] = None,
+                  key: str = "record_id") -> ReportSink:
+    """
+    Сводит отчёты шардов в один: колонки — объединение в порядке появления,
+    строки с одинаковым key — последняя по порядку paths (перезапуск шарда).
+    """
+    rows: dict[Any, dict[str, Any]] = {}
+    fields: list[str] = []
+    for path in paths:
+        for i, row in enumerate(read_rows(path)):
+            for k in row:
+                if k not in fields: fields.append(k)
+            rows[row.get(key) or (path, i)] = row
+    with ReportSink(out_base, fields, formats or ["csv"]) as sink:
+        for row in rows.values():
+            sink.write(row)
+    return sink
+
+
+# ----------------------------------------------------------------
+#                          CLI
+# ----------------------------------------------------------------
+def add_cli_args(ap, default: str = "csv"):
+    ap.add_argument("--report-format", default=default,
+                    help=f"форматы отчёта через запятую из: {', '.join(FORMATS)} (parquet — нужен pyarrow)")
+
+def formats_from_args(args) -> list[str]:
+    fmts = [x.strip() for x in args.report_format.split(",") if x.strip()]
+    unknown = [x for x in fmts if x not in FORMATS]
+    if unknown:
+        raise SystemExit(f"Неизвестный формат отчёта: {unknown} (есть: {', '.join(FORMATS)})")
+    return fmts
+
+
+if __name__ == "__main__":
+    import argparse
+    ap = argparse.ArgumentParser(description="Merge per-shard reports (CSV/JSONL) into one")
+    ap.add_argument("cmd", choices=["merge"])
+    ap.add_argument("paths", nargs="+", help="отчёты шардов, напр. enrichment_report_*_shard*.jsonl")
+    ap.add_argument("--out", default="enrichment_report_merged", help="имя без расширения")
+    ap.add_argument("--key", default="record_id", help="колонка для дедупликации строк")
+    add_cli_args(ap, default="csv,jsonl")
+    args = ap.parse_args()
+    sink = merge_reports(sorted(args.paths), args.out, formats_from_args(args), key=args.key)
+    print(f"Строк: {sink.rows} из {len(args.paths)} файлов -> {', '.join(sink.paths)}")
@@ -0,0 +1,40 @@
+import hashlib
+from typing import Optional
+
+# ----------------------------------------------------------------
+#   Шардирование работы между хостами: --shard K/N берёт записи, у которых
+#   стабильный хеш ключа (id записи или зарегистрированный домен сайта) даёт
+#   остаток K по модулю N. Хеш не зависит от процесса/PYTHONHASHSEED, поэтому
+#   шарды на разных машинах не пересекаются и вместе покрывают всё.
+# ----------------------------------------------------------------
+SHARD_BY = ("domain", "id")
+
+
+def parse_shard(s: Optional[str]) -> Optional[tuple[int, int]]:
+    """'K/N' -> (K, N), K в 0..N-1. None/'' -> None (без шардирования)."""
+    if not s: return None
+    try:
+        k, n = (int(x) for x in s.split("/", 1))
+    except ValueError:
+        raise SystemExit(f"--shard ждёт K/N, например 0/4; получено {s!r}")
+    if n < 1 or not 0 <= k < n:
+        raise SystemExit(f"--shard {s}: нужно 0 <= K < N")
+    return k, n
+
+def shard_of(key: str, n: int) -> int:
+    h = hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(h, "big") % n
+
+def in_shard(key: str, shard: Optional[tuple[int, int]]) -> bool:
+    if shard is None: return True
+    k, n = shard
+    return shard_of(key, n) == k
+
+def tag(shard: Optional[tuple[int, int]]) -> str:
+    """Суффикс для имён файлов шарда: '_shard0of4' (пусто без шардирования)."""
+    return f"_shard{shard[0]}of{shard[1]}" if shard else ""
+
+def add_cli_args(ap):
+    ap.add_argument("--shard", metavar="K/N", help="обрабатывать только шард K из N (0-based), напр. 0/4")
+    ap.add_argument("--shard-by", choices=SHARD_BY, default="domain",
+                    help="ключ шардирования: domain — все записи одного сайта на одном хосте (вежливость), id — по записи")
@@ -0,0 +1,361 @@
+"""
+Демон обогащения: вместо cron-запуска enrich_lite с --limit постоянно опрашивает A,
+ставит в очередь записи с пустыми целевыми полями, обогащает их в пуле потоков
+и отправляет PATCH пачками по 10, как только пачка набралась.
+
+Очередь и чекпоинт — в SQLite (--queue). Там же лежат готовые, но ещё не
+отправленные патчи, так что после остановки/падения демон продолжает с того же
+места: недописанные патчи дописываются, незавершённые записи краулятся заново.
+Патч, который Airtable отклонил (4xx), помечается failed и не блокирует остальные;
+при сетевых ошибках и 5xx отправка откладывается с растущей паузой.
+
+    python -m src.worker --queue enrich_queue.sqlite --workers 4 --poll-interval 60
+    python -m src.worker enqueue recXXXX recYYYY --queue enrich_queue.sqlite   # поставить вручную
+
+SIGTERM/SIGINT: перестаём брать новые записи, дожидаемся начатых, отправляем
+остаток и выходим. Повторный SIGINT — немедленный выход.
+"""
+import argparse
+import json
+import re
+import signal
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor, Future, wait, FIRST_COMPLETED
+from datetime import datetime, timedelta, timezone
+from typing import Any, Optional
+
+from src.helpers import list_all, batch_update, chunks
+from src import metrics, mirror, profiling, domain_cache, page_cache as pagecache, shard as sharding
+from src.profiling import phase
+from src.config import AIRTABLE_TOKEN, AIRTABLE_BASE_ID, TABLE_A, PARSER_BACKEND
+from src import enrich_lite as site
+from src.parsing_helpers import PARSER_BACKENDS
+
+BATCH = 10              # лимит Airtable на один PATCH
+MAX_BACKOFF = 300       # сек: потолок паузы между попытками отправки после сетевой ошибки / 5xx
+POLL_OVERLAP = 60       # сек: перекрытие окон опроса (расхождение часов, задержка LAST_MODIFIED_TIME)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS queue (
+    id          TEXT PRIMARY KEY,
+    state       TEXT NOT NULL,          -- pending / running / ready / done / failed (Airtable отклонил патч)
+    fields      TEXT,                   -- JSON полей на момент постановки (NULL — догрузить из A)
+    patch       TEXT,                   -- JSON готового патча (state=ready)
+    attempts    INTEGER NOT NULL DEFAULT 0,
+    enqueued_at TEXT NOT NULL,
+    done_at     TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_queue_state ON queue(state, enqueued_at);
+
+CREATE TABLE IF NOT EXISTS state (
+    k TEXT PRIMARY KEY,
+    v TEXT
+);
+"""
+
+
+def now_iso() -> str:
+    return datetime.now(timezone.utc).isoformat(timespec="seconds")
+
+def rejected(e: Exception) -> bool:
+    """Airtable отклонил сам патч (4xx, кроме 429): повтор того же не поможет."""
+    m = re.search(r"-> (\d{3}) ", str(e)) if isinstance(e, RuntimeError) else None
+    return bool(m) and m.group(1).startswith("4") and m.group(1) != "429"
+
+def open_queue(path: str) -> sqlite3.Connection:
+    db = sqlite3.connect(path)
+    db.execute("PRAGMA journal_mode=WAL")
+    db.execute("PRAGMA synchronous=NORMAL")
+    db.executescript(SCHEMA)
+    # записи, которые краулились в момент остановки, начинаем заново
+    db.execute("UPDATE queue SET state='pending' WHERE state='running'")
+    db.commit()
+    return db
+
+def get_state(db: sqlite3.Connection, k: str) -> Optional[str]:
+    row = db.execute("SELECT v FROM state WHERE k=?", (k,)).fetchone()
+    return row[0] if row else None
+
+def set_state(db: sqlite3.Connection, k: str, v: str):
+    db.execute("INSERT INTO state(k, v) VALUES (?, ?) ON CONFLICT(k) DO UPDATE SET v=excluded.v", (k, v))
+
+
+# ----------------------------------------------------------------
+#                          ОЧЕРЕДЬ
+# ----------------------------------------------------------------
+def enqueue(db: sqlite3.Connection, recs: list[dict[str, Any]], recheck_after: timedelta,
+            shard: Optional[tuple[int, int]] = None, shard_by: str = "domain") -> int:
+    """Ставит в очередь записи-цели. Уже стоящим в очереди обновляет поля;
+    обработанные недавно (done_at моложе recheck_after) пропускает — иначе наш же
+    PATCH, поменявший LAST_MODIFIED_TIME, возвращал бы запись в очередь."""
+    fresh = (datetime.now(timezone.utc) - recheck_after).isoformat(timespec="seconds")
+    n = 0
+    for r in recs:
+        f = r.get("fields", {})
+        if not site.is_target(f): continue
+        if shard is not None and not sharding.in_shard(site.shard_key(r, shard_by), shard): continue
+        row = db.execute("SELECT state, done_at FROM queue WHERE id=?", (r["id"],)).fetchone()
+        if row and row[0] in ("running", "ready"): continue
+        if row and row[0] == "done" and row[1] and row[1] > fresh: continue
+        db.execute(
+            "INSERT INTO queue(id, state, fields, enqueued_at) VALUES (?, 'pending', ?, ?) "
+            "ON CONFLICT(id) DO UPDATE SET state='pending', fields=excluded.fields, patch=NULL, "
+            "enqueued_at=CASE WHEN queue.state='pending' THEN queue.enqueued_at ELSE excluded.enqueued_at END",
+            (r["id"], json.dumps(f, ensure_ascii=False), now_iso()))
+        n += 1
+    db.commit()
+    return n
+
+def enqueue_ids(db: sqlite3.Connection, ids: list[str]) -> int:
+    """Ручная постановка по id: поля догрузятся из A при следующем опросе."""
+    for rid in ids:
+        db.execute(
+            "INSERT INTO queue(id, state, enqueued_at) VALUES (?, 'pending', ?) "
+            "ON CONFLICT(id) DO UPDATE SET state='pending', fields=NULL, patch=NULL",
+            (rid, now_iso()))
+    db.commit()
+    return len(ids)
+
+def poll(db: sqlite3.Connection, recheck_after: timedelta,
+         shard: Optional[tuple[int, int]] = None, shard_by: str = "domain") -> int:
+    """Забирает из A записи, изменённые с прошлого опроса (первый раз — все),
+    и записи, поставленные вручную без полей."""
+    since = get_state(db, "polled_until")
+    started = datetime.now(timezone.utc)
+    formula = f"IS_AFTER(LAST_MODIFIED_TIME(), '{since}')" if since else None
+    with phase("poll"):
+        recs = list_all(TABLE_A, fields=site.NEED_FIELDS, formula=formula)
+        bare = [r[0] for r in db.execute("SELECT id FROM queue WHERE state='pending' AND fields IS NULL")]
+        for part in chunks(bare, 50):
+            ids = ",".join(f"RECORD_ID()='{rid}'" for rid in part)
+            recs += list_all(TABLE_A, fields=site.NEED_FIELDS, formula=f"OR({ids})")
+    n = enqueue(db, list({r["id"]: r for r in recs}.values()), recheck_after, shard, shard_by)
+    # поставленные вручную, но уже не цели (удалены / всё заполнено) — из очереди убираем
+    db.executemany("UPDATE queue SET state='done', done_at=? WHERE id=? AND fields IS NULL",
+                   [(now_iso(), rid) for rid in bare])
+    set_state(db, "polled_until", (started - timedelta(seconds=POLL_OVERLAP)).isoformat(timespec="seconds"))
+    db.commit()
+    metrics.inc("worker_polled_records", len(recs))
+    return n
+
+
+# ----------------------------------------------------------------
+#                          ДЕМОН
+# ----------------------------------------------------------------
+class Worker:
+    def __init__(self, db: sqlite3.Connection, workers: int, parser: Optional[str], dry_run: bool,
+                 flush_after: float, mirror_db: Optional[sqlite3.Connection] = None, cache=None, page_cache=None):
+        self.db = db
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="enrich")
+        self.max_inflight = workers * 2
+        self.parser = parser
+        self.dry_run = dry_run
+        self.flush_after = flush_after
+        self.mirror_db = mirror_db
+        self.cache = cache
+        self.page_cache = page_cache
+        self.inflight: dict[Future, str] = {}
+        self.ready_since: Optional[float] = None
+        self.backoff = 0.0
+        self.retry_at = 0.0
+        self.stopping = False
+        self.counters = {k: 0 for k in site.TARGET_FIELDS}
+        self.enriched = self.empty = self.written = self.cached = self.failed = 0
+
+    def stop(self, signum=None, frame=None):
+        if self.stopping and signum == signal.SIGINT:
+            raise KeyboardInterrupt
+        self.stopping = True
+        print("→ Остановка: дожидаюсь начатых записей и отправляю остаток ...")
+
+    def submit(self):
+        free = self.max_inflight - len(self.inflight)
+        if free <= 0 or self.stopping: return
+        rows = self.db.execute(
+            "SELECT id, fields FROM queue WHERE state='pending' AND fields IS NOT NULL "
+            "ORDER BY enqueued_at LIMIT ?", (free,)).fetchall()
+        for rid, fields in rows:
+            f = json.loads(fields)
+            if self.cache is not None and self.cache.blocked(site.site_domain(f.get(site.FIELD_WEBSITE))):
+                # домен ждёт перепроверки — статус записан при прошлом краулe, здесь просто снимаем
+                self.cached += 1
+                self.db.execute("UPDATE queue SET state='done', done_at=? WHERE id=?", (now_iso(), rid))
+                continue
+            self.db.execute("UPDATE queue SET state='running', attempts=attempts+1 WHERE id=?", (rid,))
+            # счётчики полей не передаём в пул: += из потоков теряет инкременты — считаем в collect
+            fut = self.pool.submit(site.enrich_record, f, self.parser, None, self.cache, self.page_cache)
+            self.inflight[fut] = rid
+        self.db.commit()
+
+    def collect(self, timeout: float):
+        if not self.inflight:
+            time.sleep(timeout); return
+        done, _ = wait(list(self.inflight), timeout=timeout, return_when=FIRST_COMPLETED)
+        for fut in done:
+            rid = self.inflight.pop(fut)
+            try:
+                patch, inserted = fut.result()
+            except Exception as e:
+                print(f"  ! {rid}: {e}")
+                patch, inserted = {}, []
+            if inserted: self.enriched += 1
+            else: self.empty += 1
+            for k in inserted:
+                self.counters[k] += 1
+            if patch:
+                self.db.execute("UPDATE queue SET state='ready', patch=? WHERE id=?",
+                                (json.dumps(patch, ensure_ascii=False), rid))
+                if self.ready_since is None: self.ready_since = time.monotonic()
+            else:
+                self.db.execute("UPDATE queue SET state='done', done_at=?, patch=NULL WHERE id=?", (now_iso(), rid))
+        self.db.commit()
+        metrics.inc("worker_enriched_records", len(done))
+
+    def flush(self, force: bool = False):
+        """
+        Отправляет готовые патчи: полными пачками по 10 сразу, хвост — по таймауту или при остановке.
+        Пачку, которую Airtable отклонил (4xx), переотправляет по одной записи — отклонённые
+        помечаются failed; сетевые ошибки и 5xx оставляют строки ready до следующей попытки.
+        """
+        if time.monotonic() < self.retry_at: return
+        n_ready = self.db.execute("SELECT COUNT(*) FROM queue WHERE state='ready'").fetchone()[0]
+        if not n_ready:
+            self.ready_since = None; return
+        aged = self.ready_since is not None and time.monotonic() - self.ready_since >= self.flush_after
+        n = n_ready if (force or aged) else n_ready - n_ready % BATCH
+        if not n: return
+        rows = self.db.execute("SELECT id, patch, fields FROM queue WHERE state='ready' ORDER BY id LIMIT ?", (n,)).fetchall()
+        updates = [{"id": rid, "fields": json.loads(p)} for rid, p, _ in rows]
+        current = {rid: json.loads(f) for rid, _, f in rows if f}
+        try:
+            with phase("write"):
+                batch_update(TABLE_A, updates, dry=self.dry_run, drop_unknown=True, current=current)
+        except Exception as e:
+            if not rejected(e):
+                self.defer(e); return
+            updates = self.send_one_by_one(updates, current)
+        self.backoff = 0.0
+        if self.mirror_db is not None and not self.dry_run:
+            mirror.apply_updates(self.mirror_db, TABLE_A, updates)
+        ts = now_iso()
+        self.db.executemany("UPDATE queue SET state='done', done_at=?, patch=NULL WHERE id=?",
+                            [(ts, u["id"]) for u in updates])
+        self.db.commit()
+        self.written += len(updates)
+        left = self.db.execute("SELECT COUNT(*) FROM queue WHERE state='ready'").fetchone()[0]
+        self.ready_since = time.monotonic() if left else None
+        print(f"  ✓ отправлено {len(updates)} {'(dry-run)' if self.dry_run else ''} | всего {self.written}")
+
+    def send_one_by_one(self, updates: list[dict[str, Any]], current: dict[str, Any]) -> list[dict[str, Any]]:
+        """Отправленные по одной; отклонённые -> failed, на сетевой ошибке / 5xx остаток остаётся ready."""
+        sent = []
+        for u in updates:
+            try:
+                with phase("write"):
+                    batch_update(TABLE_A, [u], drop_unknown=True, current={u["id"]: current.get(u["id"], {})})
+            except Exception as e:
+                if not rejected(e):
+                    self.defer(e)
+                    break
+                print(f"  ! {u['id']}: Airtable отклонил патч: {e}")
+                metrics.inc("worker_patches_rejected")
+                self.failed += 1
+                self.db.execute("UPDATE queue SET state='failed', attempts=attempts+1, done_at=? WHERE id=?",
+                                (now_iso(), u["id"]))
+                continue
+            sent.append(u)
+        self.db.commit()
+        return sent
+
+    def defer(self, e: Exception):
+        """Сеть / 5xx / исчерпанные повторы 429: строки остаются ready, следующая отправка — после паузы."""
+        self.backoff = min(max(self.backoff * 2, 5.0), MAX_BACKOFF)
+        self.retry_at = time.monotonic() + self.backoff
+        metrics.inc("worker_flush_errors")
+        print(f"  ! отправка не удалась ({e}), повтор через {self.backoff:g} c")
+
+    def run(self, poll_interval: float, recheck_after: timedelta, once: bool = False,
+            shard: Optional[tuple[int, int]] = None, shard_by: str = "domain"):
+        next_poll = 0.0
+        # патчи, готовые до прошлой остановки, отправляем первыми
+        self.flush(force=True)
+        while not self.stopping:
+            if time.monotonic() >= next_poll:
+                try:
+                    n = poll(self.db, recheck_after, shard, shard_by)
+                    if n: print(f"→ В очередь: {n} | в работе {len(self.inflight)}")
+                except Exception as e:
+                    print(f"  ! опрос A не удался: {e}")
+                next_poll = time.monotonic() + poll_interval
+            self.submit()
+            self.collect(timeout=1.0)
+            self.flush()
+            if once and not self.inflight and not self.db.execute(
+                    "SELECT 1 FROM queue WHERE state='pending' AND fields IS NOT NULL LIMIT 1").fetchone():
+                break
+        while self.inflight:
+            self.collect(timeout=1.0)
+        self.pool.shutdown(wait=True)
+        self.flush(force=True)
+
+
+def main(queue_path: str, workers: int = 4, poll_interval: float = 60, flush_after: float = 30,
+         recheck_hours: float = 24 * 7, parser: Optional[str] = None, dry_run: bool = False,
+         once: bool = False, mirror_path: Optional[str] = None,
+         shard: Optional[tuple[int, int]] = None, shard_by: str = "domain", cache=None,
+         page_cache=None):
+    if not AIRTABLE_TOKEN or not AIRTABLE_BASE_ID:
+        raise SystemExit("Set AIRTABLE_TOKEN and AIRTABLE_BASE_ID")
+
+    db = open_queue(queue_path)
+    w = Worker(db, workers, parser, dry_run, flush_after,
+               mirror_db=mirror.open_db(mirror_path) if mirror_path else None, cache=cache, page_cache=page_cache)
+    signal.signal(signal.SIGTERM, w.stop)
+    signal.signal(signal.SIGINT, w.stop)
+
+    print(f"→ Worker: {workers} потоков, опрос каждые {poll_interval:g} c, очередь {queue_path}")
+    if shard is not None:
+        print(f"→ Shard {shard[0]}/{shard[1]} by {shard_by}")
+    w.run(poll_interval, timedelta(hours=recheck_hours), once=once, shard=shard, shard_by=shard_by)
+
+    left = dict(db.execute("SELECT state, COUNT(*) FROM queue GROUP BY state").fetchall())
+    print("\n==== SUMMARY ====")
+    print(f"Enriched: {w.enriched} | nothing found: {w.empty} | skipped by domain cache: {w.cached} | "
+          f"written: {w.written} | rejected by Airtable: {w.failed}")
+    for k in site.TARGET_FIELDS:
+        print(f"- inserted {k}: {w.counters[k]}")
+    print(f"Queue: {left}")
+    print("=================\n")
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Enrichment daemon: poll A, enrich continuously, flush PATCHes in batches of 10")
+    ap.add_argument("cmd", nargs="?", choices=["run", "enqueue"], default="run")
+    ap.add_argument("ids", nargs="*", help="id записей для enqueue")
+    ap.add_argument("--queue", default="enrich_queue.sqlite", help="SQLite-файл очереди и чекпоинта")
+    ap.add_argument("--workers", type=int, default=4, help="сколько сайтов краулить одновременно")
+    ap.add_argument("--poll-interval", type=float, default=60, help="сек между опросами A")
+    ap.add_argument("--flush-after", type=float, default=30, help="сек, после которых отправляется неполная пачка")
+    ap.add_argument("--recheck-hours", type=float, default=24 * 7,
+                    help="не брать повторно запись, обработанную менее N часов назад")
+    ap.add_argument("--once", action="store_true", help="один опрос, обработать очередь и выйти (для cron/тестов)")
+    ap.add_argument("--parser", choices=PARSER_BACKENDS, default=PARSER_BACKEND, help="HTML backend for extractors")
+    ap.add_argument("--dry-run", action="store_true")
+    ap.add_argument("--mirror", metavar="DB", help="обновлять SQLite-зеркало после записи")
+    sharding.add_cli_args(ap)
+    domain_cache.add_cli_args(ap)
+    pagecache.add_cli_args(ap)
+    metrics.add_cli_args(ap)
+    profiling.add_cli_args(ap)
+    args = ap.parse_args()
+    if args.cmd == "enqueue":
+        n = enqueue_ids(open_queue(args.queue), args.ids)
+        print(f"Поставлено в очередь: {n}")
+        raise SystemExit(0)
+    metrics.setup_from_args(args)
+    profiling.setup_from_args(args)
+    main(args.queue, workers=args.workers, poll_interval=args.poll_interval, flush_after=args.flush_after,
+         recheck_hours=args.recheck_hours, parser=args.parser, dry_run=args.dry_run, once=args.once,
+         mirror_path=args.mirror, shard=sharding.parse_shard(args.shard), shard_by=args.shard_by,
+         cache=domain_cache.open_from_args(args), page_cache=pagecache.open_from_args(args))